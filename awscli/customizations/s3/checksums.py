@@ -0,0 +1,334 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from collections import deque, OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from six.moves import queue
+
+from awscli.customizations.s3.constants import CHUNKSIZE, MULTI_THRESHOLD, \
+    NUM_HASH_THREADS, MAX_HASH_LOOKAHEAD
+from awscli.customizations.s3.utils import find_chunksize, \
+    calculate_multipart_etag
+
+try:
+    import sqlite3
+except ImportError:
+    # Some python builds do not include sqlite3.
+    sqlite3 = None
+
+
+LOGGER = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+def default_part_size(size):
+    """The part size this command would upload a file of ``size`` with."""
+    if size <= MULTI_THRESHOLD:
+        return None
+    return find_chunksize(size, CHUNKSIZE)
+
+
+def calculate_checksums(filename, part_size=None):
+    """Calculate the ETags a file would have once uploaded, in one pass.
+
+    :returns: A tuple of the md5 hexdigest of the file and, if
+        ``part_size`` is given, the ETag of a multipart upload of the file
+        with parts of that size (otherwise None).
+
+    """
+    md5 = hashlib.md5()
+    part_md5_digests = []
+    part_md5 = None
+    part_remaining = 0
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            md5.update(data)
+            while part_size is not None and data:
+                if part_remaining == 0:
+                    if part_md5 is not None:
+                        part_md5_digests.append(part_md5.digest())
+                    part_md5 = hashlib.md5()
+                    part_remaining = part_size
+                chunk = data[:part_remaining]
+                part_md5.update(chunk)
+                part_remaining -= len(chunk)
+                data = data[len(chunk):]
+    multipart_etag = None
+    if part_size is not None:
+        if part_md5 is not None:
+            part_md5_digests.append(part_md5.digest())
+        multipart_etag = calculate_multipart_etag(part_md5_digests)
+    return md5.hexdigest(), multipart_etag
+
+
+class HashCache(object):
+    """A persistent cache of the checksums of local files.
+
+    Entries are keyed by path and are only used while the inode, size and
+    modification time of the file are unchanged.  Each entry holds the md5
+    of the file and its multipart ETag for each part size it has been
+    calculated for.
+
+    This class is thread safe.
+
+    """
+    DEFAULT_FILENAME = os.path.join('~', '.aws', 's3', 'hash-cache.sqlite')
+
+    def __init__(self, filename=None):
+        if sqlite3 is None:
+            raise ValueError("Caching checksums requires the sqlite3 "
+                             "module, which is not available.")
+        if filename is None:
+            filename = os.path.expanduser(self.DEFAULT_FILENAME)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename,
+                                           check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS checksums ('
+            '  path TEXT PRIMARY KEY, inode INTEGER, size INTEGER,'
+            '  mtime REAL, md5 TEXT, multipart_etags TEXT)')
+        self._connection.commit()
+
+    def get(self, path, stat):
+        """Get the cached checksums of a file.
+
+        :returns: A tuple of the md5 hexdigest and a dictionary of part
+            sizes to multipart ETags, or None if nothing is cached for the
+            file as it is now.
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT inode, size, mtime, md5, multipart_etags '
+                'FROM checksums WHERE path = ?', (path,)).fetchone()
+        if row is None or tuple(row[:3]) != self._stat_key(stat):
+            return None
+        multipart_etags = dict((int(part_size), etag) for part_size, etag
+                               in json.loads(row[4]).items())
+        return row[3], multipart_etags
+
+    def put(self, path, stat, md5_hexdigest, multipart_etags):
+        serialized = json.dumps(dict((str(part_size), etag) for
+                                     part_size, etag in
+                                     multipart_etags.items()))
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?)',
+                (path,) + self._stat_key(stat) + (md5_hexdigest, serialized))
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def _stat_key(self, stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+
+class LocalChecksummer(object):
+    """Calculate the checksums of local files ahead of the comparator.
+
+    ``prefetch`` wraps the source and destination streams of ``FileStat``
+    objects.  Local files that have a file of the same size on the other
+    side are hashed by a pool of threads while the streams are still
+    being listed, up to ``lookahead`` files ahead of the consumer, and
+    are yielded with their md5 hexdigest as their ``etag``.
+
+    Checksums are looked up in and saved to ``hash_cache``, so a file is
+    only read again if it has changed.
+
+    """
+    def __init__(self, hash_cache, num_threads=NUM_HASH_THREADS,
+                 lookahead=MAX_HASH_LOOKAHEAD):
+        self._hash_cache = hash_cache
+        self._lookahead = lookahead
+        # The multipart ETags of the files yielded last.  The comparator
+        # compares each file as soon as it is yielded, so older entries
+        # are dropped.
+        self._multipart_etags = OrderedDict()
+        self._jobs = queue.Queue()
+        self._threads = []
+        for i in range(num_threads):
+            thread = threading.Thread(target=self._run_worker)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def prefetch(self, src_files, dest_files):
+        """Hash the local files the comparator will compare by checksum.
+
+        Both streams must be sorted by compare key.  They are read ahead
+        together, and only the local files whose compare key and size
+        match a file on the other side are hashed.
+
+        :returns: A tuple of iterators over ``src_files`` and
+            ``dest_files``.
+
+        """
+        prefetcher = _MatchingPrefetcher(self, src_files, dest_files,
+                                         self._lookahead)
+        return prefetcher.files(0), prefetcher.files(1)
+
+    def multipart_etag(self, file_stat, part_size):
+        """Get the multipart ETag of a local file for a part size."""
+        multipart_etags = self._multipart_etags.get(file_stat.src, {})
+        if part_size not in multipart_etags:
+            try:
+                stat = os.stat(file_stat.src)
+                md5_hexdigest, multipart_etags[part_size] = \
+                    calculate_checksums(file_stat.src, part_size)
+            except (OSError, IOError) as e:
+                LOGGER.debug("Unable to checksum %s: %s", file_stat.src, e)
+                return None
+            self._remember_multipart_etags(file_stat.src, multipart_etags)
+            self._hash_cache.put(file_stat.src, stat, md5_hexdigest,
+                                 multipart_etags)
+        return multipart_etags[part_size]
+
+    def close(self):
+        for thread in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._hash_cache.close()
+
+    def _start(self, file_stat):
+        job = _HashJob(file_stat)
+        self._jobs.put(job)
+        return job
+
+    def _finish(self, file_stat, job):
+        if job is not None:
+            job.finished.wait()
+            if job.md5_hexdigest is not None:
+                file_stat.etag = job.md5_hexdigest
+                self._remember_multipart_etags(file_stat.src,
+                                               job.multipart_etags)
+        return file_stat
+
+    def _remember_multipart_etags(self, path, multipart_etags):
+        self._multipart_etags.pop(path, None)
+        self._multipart_etags[path] = multipart_etags
+        while len(self._multipart_etags) > self._lookahead:
+            self._multipart_etags.popitem(last=False)
+
+    def _run_worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            try:
+                self._hash(job)
+            except Exception as e:
+                # The file is compared without a checksum instead.
+                LOGGER.debug("Unable to checksum %s: %s",
+                             job.file_stat.src, e)
+            finally:
+                job.finished.set()
+
+    def _hash(self, job):
+        path = job.file_stat.src
+        stat = os.stat(path)
+        cached = self._hash_cache.get(path, stat)
+        if cached is not None:
+            job.md5_hexdigest, job.multipart_etags = cached
+            return
+        part_size = default_part_size(stat.st_size)
+        md5_hexdigest, multipart_etag = calculate_checksums(path, part_size)
+        multipart_etags = {}
+        if part_size is not None:
+            multipart_etags[part_size] = multipart_etag
+        self._hash_cache.put(path, stat, md5_hexdigest, multipart_etags)
+        job.md5_hexdigest = md5_hexdigest
+        job.multipart_etags = multipart_etags
+
+
+class _MatchingPrefetcher(object):
+    """Read the source and destination streams ahead in step.
+
+    Files are read in the same merge order as the comparator reads them,
+    pairing files with the same compare key.  Local files of a pair of
+    the same size are handed to the checksummer as soon as they are read.
+    Side 0 is the source and side 1 the destination.
+
+    """
+    def __init__(self, checksummer, src_files, dest_files, lookahead):
+        self._checksummer = checksummer
+        self._lookahead = lookahead
+        self._streams = [iter(src_files), iter(dest_files)]
+        self._heads = [None, None]
+        self._done = [False, False]
+        self._pending = [deque(), deque()]
+
+    def files(self, side):
+        pending = self._pending[side]
+        while True:
+            while not pending or self._num_pending() < self._lookahead:
+                if not self._read_next():
+                    break
+            if not pending:
+                return
+            yield self._checksummer._finish(*pending.popleft())
+
+    def _num_pending(self):
+        return len(self._pending[0]) + len(self._pending[1])
+
+    def _read_next(self):
+        src_file = self._peek(0)
+        dest_file = self._peek(1)
+        if src_file is None and dest_file is None:
+            return False
+        if dest_file is None or (src_file is not None and
+                                 src_file.compare_key < dest_file.compare_key):
+            self._take(0, matched=False)
+        elif src_file is None or dest_file.compare_key < src_file.compare_key:
+            self._take(1, matched=False)
+        else:
+            matched = src_file.size == dest_file.size
+            self._take(0, matched)
+            self._take(1, matched)
+        return True
+
+    def _peek(self, side):
+        if self._heads[side] is None and not self._done[side]:
+            self._heads[side] = next(self._streams[side], None)
+            if self._heads[side] is None:
+                self._done[side] = True
+        return self._heads[side]
+
+    def _take(self, side, matched):
+        file_stat = self._heads[side]
+        self._heads[side] = None
+        job = None
+        if matched and file_stat.src_type == 'local':
+            job = self._checksummer._start(file_stat)
+        self._pending[side].append((file_stat, job))
+
+
+class _HashJob(object):
+    def __init__(self, file_stat):
+        self.file_stat = file_stat
+        self.md5_hexdigest = None
+        self.multipart_etags = None
+        self.finished = threading.Event()
@@ -13,6 +13,10 @@
 import logging
 from six import advance_iterator
 
+from awscli.customizations.s3.constants import CHUNKSIZE
+from awscli.customizations.s3.utils import find_chunksize, \
+    infer_part_size, is_multipart_etag
+
 
 LOG = logging.getLogger(__name__)
 
@@ -29,7 +33,7 @@ class Comparator(object):
     """
     This class performs all of the comparisons behind the sync operation
     """
-    def __init__(self, params=None):
+    def __init__(self, params=None, checksummer=None):
         self.delete = False
         if 'delete' in params:
             self.delete = params['delete']
@@ -42,6 +46,10 @@ class Comparator(object):
         if 'exact_timestamps' in params:
             self.match_exact_timestamps = params['exact_timestamps']
 
+        # :var checksummer: A ``LocalChecksummer`` if files of the same
+        #     size should be compared by their contents.
+        self.checksummer = checksummer
+
     def call(self, src_files, dest_files):
         """
         This function preforms the actual comparisons.  The parameters it takes
@@ -76,6 +84,9 @@ class Comparator(object):
             dest list is empty add the rest of the file in source list to
             the destionation.
         """
+        if self.checksummer is not None:
+            src_files, dest_files = self.checksummer.prefetch(src_files,
+                                                              dest_files)
         # :var src_done: True if there are no more files from the source left.
         src_done = False
         # :var dest_done: True if there are no more files form the dest left.
@@ -109,9 +120,15 @@ class Comparator(object):
                 if compare_keys == 'equal':
                     same_size = self.compare_size(src_file, dest_file)
                     same_last_modified_time = self.compare_time(src_file, dest_file)
+                    same_checksum = None
+                    if same_size and self.checksummer is not None:
+                        same_checksum = self.compare_checksum(src_file,
+                                                              dest_file)
 
                     if self.compare_on_size_only:
                         should_sync = not same_size
+                    elif same_checksum is not None:
+                        should_sync = not same_checksum
                     else:
                         should_sync = (not same_size) or (not same_last_modified_time)
 
@@ -164,6 +181,41 @@ class Comparator(object):
         """
         return src_file.size == dest_file.size
 
+    def compare_checksum(self, src_file, dest_file):
+        """
+        :returns: True if the files have the same contents, False if they
+            do not, or None if their checksums can not be compared.
+        """
+        if src_file.etag is None or dest_file.etag is None:
+            return None
+        if src_file.src_type == 's3' and dest_file.src_type == 's3':
+            if src_file.etag == dest_file.etag:
+                return True
+            if is_multipart_etag(src_file.etag) or \
+                    is_multipart_etag(dest_file.etag):
+                # The objects may have been uploaded with different parts.
+                return None
+            return False
+        if src_file.src_type == 'local':
+            local_file, remote_file = src_file, dest_file
+        else:
+            local_file, remote_file = dest_file, src_file
+        if not is_multipart_etag(remote_file.etag):
+            # Objects encrypted with SSE-KMS or SSE-C also have ETags that
+            # are not their md5, which makes them look changed.
+            return local_file.etag == remote_file.etag
+        part_size = infer_part_size(remote_file.size, remote_file.etag,
+                                    find_chunksize(remote_file.size,
+                                                   CHUNKSIZE))
+        if part_size is None:
+            return None
+        local_etag = self.checksummer.multipart_etag(local_file, part_size)
+        if local_etag is None or local_etag != remote_file.etag:
+            # The part size is a guess, if it's wrong the ETags don't
+            # match even though the contents do.
+            return None
+        return True
+
     def compare_comp_key(self, src_file, dest_file):
         """
         Determines if the source compare_key is less than, equal to,
@@ -0,0 +1,249 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import bisect
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+THROTTLING_ERROR_CODES = ('SlowDown', 'Throttling', 'ThrottlingException',
+                          'RequestLimitExceeded', 'ServiceUnavailable')
+
+
+def is_throttling_response(http_response, parsed):
+    """Determine if a response indicates that S3 is throttling us."""
+    if http_response is not None and http_response.status_code == 503:
+        return True
+    if parsed:
+        errors = parsed.get('Errors')
+        if isinstance(errors, list):
+            for error in errors:
+                if error.get('Code') in THROTTLING_ERROR_CODES:
+                    return True
+    return False
+
+
+class AdaptiveConcurrencyController(object):
+    """Choose the number of worker threads based on observed performance.
+
+    The controller is fed one sample per HTTP request (latency, bytes
+    transferred and whether the request was throttled).  Every
+    ``SAMPLE_WINDOW`` samples it makes a decision using an additive
+    increase/multiplicative decrease (AIMD) scheme:
+
+        * If any request in the window was throttled (503 SlowDown), or
+          the latency has grown past ``LATENCY_TOLERANCE`` times the
+          best latency seen so far, the concurrency is multiplied by
+          ``DECREASE_FACTOR``.  A large part takes longer than a small
+          request without any congestion, so requests are grouped by
+          size (see ``SIZE_BUCKETS``) and each group is compared to the
+          best average latency seen for that group.
+        * Otherwise, as long as adding threads is still improving
+          throughput, the concurrency is increased by one.
+
+    The target concurrency never leaves the ``[min_threads, max_threads]``
+    range.  Listeners registered with ``add_listener`` are called
+    with the new target whenever it changes.
+
+    This class is thread safe.
+
+    """
+    SAMPLE_WINDOW = 20
+    LATENCY_TOLERANCE = 2.0
+    DECREASE_FACTOR = 0.5
+    # Throughput has to stay within this fraction of the previous window
+    # for an increase to be considered worthwhile.
+    THROUGHPUT_TOLERANCE = 0.95
+    # The upper bounds, in bytes, of the request size groups whose
+    # latencies are compared with each other.
+    SIZE_BUCKETS = (64 * 1024, 1024 * 1024, 8 * 1024 * 1024,
+                    64 * 1024 * 1024)
+
+    def __init__(self, min_threads, max_threads, initial_threads=None,
+                 clock=time.time):
+        if min_threads < 1:
+            raise ValueError("min_threads must be at least 1, got: %s"
+                             % min_threads)
+        if max_threads < min_threads:
+            raise ValueError("max_threads (%s) must be greater than or equal "
+                             "to min_threads (%s)" % (max_threads,
+                                                      min_threads))
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        if initial_threads is None:
+            initial_threads = min_threads
+        self._target = self._clamp(initial_threads)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._listeners = []
+        # The lowest average latency of a window, by size bucket.
+        self._baseline_latencies = {}
+        self._last_throughput = None
+        self._reset_window()
+        self.peak_threads = self._target
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.best_throughput = 0.0
+
+    @property
+    def target(self):
+        with self._lock:
+            return self._target
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def record_request(self, latency, num_bytes=0, throttled=False):
+        new_target = None
+        with self._lock:
+            self.num_requests += 1
+            self._window_requests += 1
+            self._window_latency += latency
+            self._window_bytes += num_bytes
+            bucket = bisect.bisect_left(self.SIZE_BUCKETS, num_bytes)
+            bucket_latency, bucket_requests = self._window_buckets.get(
+                bucket, (0.0, 0))
+            self._window_buckets[bucket] = (bucket_latency + latency,
+                                            bucket_requests + 1)
+            if throttled:
+                self.num_throttled += 1
+                self._window_throttled += 1
+            if self._window_requests >= self.SAMPLE_WINDOW:
+                new_target = self._adjust()
+        if new_target is not None:
+            for listener in self._listeners:
+                listener(new_target)
+
+    def back_off(self):
+        """Cut the concurrency at once, without waiting for a full window.
+
+        This is called when a request is still throttled after botocore
+        has retried it, which means the windows aren't backing off fast
+        enough.
+
+        """
+        with self._lock:
+            current = self._target
+            new_target = self._clamp(int(current * self.DECREASE_FACTOR))
+            self._reset_window()
+            if new_target == current:
+                return
+            LOGGER.debug("Backing off concurrency from %s to %s after a "
+                         "throttled request failed.", current, new_target)
+            self._target = new_target
+        for listener in self._listeners:
+            listener(new_target)
+
+    def _adjust(self):
+        elapsed = max(self._clock() - self._window_start, 1e-6)
+        throughput = self._window_bytes / elapsed
+        latency_ratio = self._latency_ratio()
+        throttled = self._window_throttled
+        self._reset_window()
+        if throughput > self.best_throughput:
+            self.best_throughput = throughput
+        congested = throttled > 0 or latency_ratio > self.LATENCY_TOLERANCE
+        current = self._target
+        if congested:
+            new_target = self._clamp(int(current * self.DECREASE_FACTOR))
+        elif self._last_throughput is None or throughput >= \
+                self._last_throughput * self.THROUGHPUT_TOLERANCE:
+            new_target = self._clamp(current + 1)
+        else:
+            new_target = current
+        self._last_throughput = throughput
+        if new_target == current:
+            return None
+        LOGGER.debug("Adjusting concurrency from %s to %s (throughput: %.0f "
+                     "bytes/s, latency: %.2f times the best, throttled: "
+                     "%s)", current, new_target, throughput, latency_ratio,
+                     throttled)
+        self._target = new_target
+        self.peak_threads = max(self.peak_threads, new_target)
+        return new_target
+
+    def _latency_ratio(self):
+        # The latency of the window over the latency it would have had
+        # if each request took the best average latency of its bucket.
+        expected_latency = 0.0
+        for bucket, (latency, requests) in self._window_buckets.items():
+            average_latency = latency / requests
+            baseline = self._baseline_latencies.get(bucket)
+            if baseline is None or average_latency < baseline:
+                baseline = average_latency
+                self._baseline_latencies[bucket] = baseline
+            expected_latency += baseline * requests
+        if not expected_latency:
+            return 1.0
+        return self._window_latency / expected_latency
+
+    def _reset_window(self):
+        self._window_start = self._clock()
+        self._window_requests = 0
+        self._window_buckets = {}
+        self._window_latency = 0.0
+        self._window_bytes = 0
+        self._window_throttled = 0
+
+    def _clamp(self, value):
+        return max(self.min_threads, min(self.max_threads, value))
+
+    def summary(self):
+        with self._lock:
+            return ("Adaptive concurrency settled on %s thread(s) "
+                    "(peak: %s, range: %s-%s, requests: %s, throttled: %s)"
+                    % (self._target, self.peak_threads, self.min_threads,
+                       self.max_threads, self.num_requests,
+                       self.num_throttled))
+
+
+class RequestMonitor(object):
+    """Feed per request measurements from botocore events to a controller.
+
+    The ``before-call`` event marks the start of an operation, and the
+    ``needs-retry`` event is emitted after every HTTP attempt (including
+    the ones botocore retries internally), which makes it the right place
+    to spot throttled requests.  Both are emitted on the thread that
+    made the request, so the start time is tracked per thread.
+
+    """
+    def __init__(self, controller, clock=time.time):
+        self._controller = controller
+        self._clock = clock
+        self._local = threading.local()
+
+    def on_before_call(self, **kwargs):
+        self._local.start_time = self._clock()
+
+    def on_needs_retry(self, response=None, **kwargs):
+        start_time = getattr(self._local, 'start_time', None)
+        now = self._clock()
+        # Subsequent attempts are measured from the end of this one.
+        self._local.start_time = now
+        if start_time is None or response is None:
+            return
+        http_response, parsed = response
+        num_bytes = self._get_num_bytes(http_response)
+        self._controller.record_request(
+            latency=now - start_time, num_bytes=num_bytes,
+            throttled=is_throttling_response(http_response, parsed))
+
+    def _get_num_bytes(self, http_response):
+        num_bytes = 0
+        request = getattr(http_response, 'request', None)
+        if request is not None:
+            num_bytes += int(request.headers.get('Content-Length', 0) or 0)
+        num_bytes += int(http_response.headers.get('content-length', 0) or 0)
+        return num_bytes
@@ -13,8 +13,59 @@
 MULTI_THRESHOLD = 8 * (1024 ** 2)
 CHUNKSIZE = 7 * (1024 ** 2)
 NUM_THREADS = 10
+# The stack size of worker threads when --max-concurrent-requests runs
+# hundreds of them.  Tasks only make shallow calls, most of the default
+# stack size of a thread goes unused.
+WORKER_THREAD_STACK_SIZE = 512 * 1024
+ADAPTIVE_MIN_THREADS = 2
+ADAPTIVE_MAX_THREADS = 64
 QUEUE_TIMEOUT_WAIT = 0.2
 MAX_PARTS = 950
+# S3 rejects multipart upload parts smaller than this, except the last one.
+MIN_UPLOAD_PART_SIZE = 5 * (1024 ** 2)
 MAX_SINGLE_UPLOAD_SIZE = 5 * (1024 ** 3)
+# S3 to S3 copies up to this size are always made with a single CopyObject
+# request, see scripts/performance/benchmark-copy-strategy.
+MULTIPART_COPY_THRESHOLD = 32 * (1024 ** 2)
 MAX_UPLOAD_SIZE = 5 * (1024 ** 4)
 MAX_QUEUE_SIZE = 1000
+# The most partitions of a bucket listed ahead at the same time.
+MAX_LIST_CONCURRENCY = 10
+# The most files a listing or comparison is allowed to run ahead of the
+# stage that reads it.
+MAX_PREFETCH_SIZE = 1000
+# A sync index older than this many seconds is rebuilt by listing the
+# destination again.
+SYNC_INDEX_MAX_AGE = 7 * 24 * 60 * 60
+# The most keys a single DeleteObjects request can delete.
+DELETE_BATCH_SIZE = 1000
+# Upload bodies up to this size are read into memory so a Content-MD5
+# header can be sent with them.
+MAX_IN_MEMORY_UPLOAD_SIZE = 16 * (1024 ** 2)
+# Resumable downloads are written to the destination plus this suffix
+# and renamed into place once they are complete.
+PARTIAL_DOWNLOAD_SUFFIX = '.s3download'
+# The number of parts of a stdin/stdout stream held in memory at once.
+MAX_STREAM_PARTS_IN_FLIGHT = 10
+# The default number of bytes of transfer buffers held in memory at once.
+MAX_MEMORY = 512 * (1024 ** 2)
+# The part limit of S3, which caps the size of a stream uploaded from stdin.
+MAX_STREAM_UPLOAD_PARTS = 10000
+# The number of threads hashing local files for sync --checksum.
+NUM_HASH_THREADS = 4
+# The most local files hashed ahead of the comparator for sync --checksum.
+MAX_HASH_LOOKAHEAD = 64
+# The most times a task makes a request that fails with a connection,
+# timeout, checksum or throttling error, on top of the retries botocore
+# makes itself.
+RETRY_MAX_ATTEMPTS = 5
+# The seconds a task waits before its first retry, doubled for each one
+# after that up to RETRY_MAX_DELAY, with full jitter.
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 20
+# The retries shared by the tasks of a command.  A retry takes
+# RETRY_COST of them, or THROTTLED_RETRY_COST after S3 throttled the
+# request, and every request that succeeds gives one back.
+RETRY_BUDGET = 500
+RETRY_COST = 5
+THROTTLED_RETRY_COST = 10
@@ -0,0 +1,150 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import logging
+import math
+import threading
+
+from awscli.customizations.s3.constants import MAX_SINGLE_UPLOAD_SIZE
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LatencyModel(object):
+    """Estimate the latency of a request from the bytes it copies.
+
+    The samples are fit to ``latency = overhead + num_bytes / rate`` by
+    least squares.  If the samples are all the same size, the average
+    latency per byte is used instead, and if the latency doesn't grow
+    with the size, the average latency.
+
+    This class is not thread safe.
+
+    """
+    def __init__(self):
+        self.num_samples = 0
+        self._sum_bytes = 0.0
+        self._sum_latency = 0.0
+        self._sum_bytes_squared = 0.0
+        self._sum_bytes_latency = 0.0
+
+    def add(self, num_bytes, latency):
+        self.num_samples += 1
+        self._sum_bytes += num_bytes
+        self._sum_latency += latency
+        self._sum_bytes_squared += float(num_bytes) * num_bytes
+        self._sum_bytes_latency += num_bytes * latency
+
+    def estimate(self, num_bytes):
+        """The estimated latency in seconds, or None without samples."""
+        n = self.num_samples
+        if not n:
+            return None
+        mean_latency = self._sum_latency / n
+        denominator = n * self._sum_bytes_squared - self._sum_bytes ** 2
+        if denominator <= 0:
+            if self._sum_bytes == 0:
+                return mean_latency
+            return self._sum_latency / self._sum_bytes * num_bytes
+        seconds_per_byte = (n * self._sum_bytes_latency -
+                            self._sum_bytes * self._sum_latency) / denominator
+        if seconds_per_byte <= 0:
+            # The latency doesn't grow with the size of the request.
+            return mean_latency
+        overhead = mean_latency - seconds_per_byte * self._sum_bytes / n
+        if overhead < 0:
+            # Fit a line through the origin instead.
+            return self._sum_bytes_latency / self._sum_bytes_squared * \
+                num_bytes
+        return overhead + seconds_per_byte * num_bytes
+
+
+class CopyStrategy(object):
+    """Choose between CopyObject and a multipart copy for S3 to S3 copies.
+
+    Objects of up to ``multipart_threshold`` bytes are copied with a
+    single CopyObject request, and objects larger than
+    ``max_single_copy_size`` (at most the 5 GB CopyObject limit) with an
+    UploadPartCopy request for each part.  In between, whichever is
+    estimated to finish first is chosen.
+
+    Both are server side copies, so the latency of CopyObject and
+    UploadPartCopy requests is estimated by one ``LatencyModel``, fit to
+    the requests made so far.  The model starts out with two samples of
+    the latency expected of S3 (``PRIOR_OVERHEAD`` and ``PRIOR_RATE``),
+    which measured requests soon outweigh.
+
+    A multipart copy is estimated to take as long as its parts take
+    when ``parallelism`` of them are copied at once, plus a request each
+    to create and complete the upload.  When other tasks are waiting for
+    the threads, the parallelism is low, and the copy that takes up the
+    threads for the least time wins, which is usually CopyObject.
+
+    This class is thread safe.
+
+    """
+    # See scripts/performance/benchmark-copy-strategy.
+    PRIOR_OVERHEAD = 0.05
+    PRIOR_RATE = 150 * (1024 ** 2)
+    PRIOR_SIZE = 64 * (1024 ** 2)
+
+    def __init__(self, multipart_threshold, max_single_copy_size=None):
+        if max_single_copy_size is None:
+            max_single_copy_size = MAX_SINGLE_UPLOAD_SIZE
+        self.multipart_threshold = multipart_threshold
+        self.max_single_copy_size = min(max_single_copy_size,
+                                        MAX_SINGLE_UPLOAD_SIZE)
+        self._lock = threading.Lock()
+        self._model = LatencyModel()
+        self._model.add(0, self.PRIOR_OVERHEAD)
+        self._model.add(self.PRIOR_SIZE, self.PRIOR_OVERHEAD +
+                        self.PRIOR_SIZE / float(self.PRIOR_RATE))
+        self.num_single_copies = 0
+        self.num_multipart_copies = 0
+
+    def use_multipart(self, size, chunksize, parallelism):
+        """Whether an object of ``size`` bytes is copied in parts.
+
+        :param parallelism: The number of threads free to copy parts.
+
+        """
+        if size <= self.multipart_threshold:
+            use_multipart = False
+        elif size > self.max_single_copy_size:
+            use_multipart = True
+        else:
+            use_multipart = self._multipart_is_faster(size, chunksize,
+                                                      parallelism)
+        with self._lock:
+            if use_multipart:
+                self.num_multipart_copies += 1
+            else:
+                self.num_single_copies += 1
+        return use_multipart
+
+    def _multipart_is_faster(self, size, chunksize, parallelism):
+        num_parts = int(math.ceil(size / float(chunksize)))
+        rounds = int(math.ceil(num_parts / float(max(parallelism, 1))))
+        with self._lock:
+            single_latency = self._model.estimate(size)
+            multipart_latency = rounds * self._model.estimate(chunksize) + \
+                2 * self._model.estimate(0)
+        LOGGER.debug("Estimated copy of %s bytes: CopyObject %.3fs, "
+                     "%s parts %.3fs.", size, single_latency, num_parts,
+                     multipart_latency)
+        return multipart_latency < single_latency
+
+    def record_copy(self, num_bytes, latency):
+        """Record how long a CopyObject or UploadPartCopy request took."""
+        with self._lock:
+            self._model.add(num_bytes, latency)
@@ -16,8 +16,9 @@ import sys
 import threading
 
 from awscli.customizations.s3.utils import uni_print, \
-        IORequest, IOCloseRequest, StablePriorityQueue
+        StablePriorityQueue
 from awscli.customizations.s3.tasks import OrderableTask
+from awscli.customizations.s3.memory import get_memory_needed
 
 
 LOGGER = logging.getLogger(__name__)
@@ -41,19 +42,44 @@ class Executor(object):
     IMMEDIATE_PRIORITY= 1
 
     def __init__(self, num_threads, result_queue,
-                 quiet, max_queue_size, write_queue):
+                 quiet, max_queue_size,
+                 concurrency_controller=None, out_file=None,
+                 scheduling_policy=None, memory_budget=None,
+                 print_thread=None, thread_stack_size=None):
         self._max_queue_size = max_queue_size
         self.queue = StablePriorityQueue(maxsize=self._max_queue_size,
-                                         max_priority=20)
+                                         max_priority=20,
+                                         policy=scheduling_policy)
+        self._concurrency_controller = concurrency_controller
+        self._memory_budget = memory_budget
+        # If given, the stack size of the worker threads, in bytes.
+        self._thread_stack_size = thread_stack_size
+        if concurrency_controller is not None:
+            num_threads = concurrency_controller.target
+            concurrency_controller.add_listener(self.resize)
         self.num_threads = num_threads
+        # Guards num_threads, _pending_retirements and
+        # _shutdown_initiated when the pool is resized at runtime.
+        self._resize_lock = threading.Lock()
+        self._pending_retirements = 0
+        self._shutdown_initiated = False
         self.result_queue = result_queue
         self.quiet = quiet
         self.threads_list = []
-        self.write_queue = write_queue
-        self.print_thread = PrintThread(self.result_queue,
-                                        self.quiet)
+        # An optional thread to consume the results in place of a
+        # ``PrintThread``.  It reads from ``result_queue`` and exits on a
+        # ``ShutdownThreadRequest`` the same way.
+        if print_thread is None:
+            print_thread = PrintThread(self.result_queue, self.quiet,
+                                       out_file=out_file)
+        self.print_thread = print_thread
         self.print_thread.daemon = True
-        self.io_thread = IOWriterThread(self.write_queue)
+        # Tasks submitted with dependencies are held here, rather than
+        # in the queue, until their dependencies are done.  Guards
+        # _num_held_tasks and _deferred_shutdown.
+        self._held_condition = threading.Condition(threading.Lock())
+        self._num_held_tasks = 0
+        self._deferred_shutdown = False
 
     @property
     def num_tasks_failed(self):
@@ -69,25 +95,115 @@ class Executor(object):
             tasks_warned = self.print_thread.num_warnings_seen
         return tasks_warned
 
+    @property
+    def num_pending_tasks(self):
+        """The number of tasks waiting to be run, held or queued."""
+        with self._held_condition:
+            num_held_tasks = self._num_held_tasks
+        return num_held_tasks + self.queue.qsize()
+
     def start(self):
-        self.io_thread.start()
-        # Note that we're *not* adding the IO thread to the threads_list.
-        # There's a specific shutdown order we need and we're going to be
-        # explicit about it rather than relying on the threads_list order.
-        # See .join() for more info.
+        # The print thread is not in the threads_list, it is shut down
+        # after the workers, see wait_until_shutdown().
         self.print_thread.start()
         for i in range(self.num_threads):
-            worker = Worker(queue=self.queue)
-            worker.setDaemon(True)
-            self.threads_list.append(worker)
+            self._start_worker()
+
+    def _start_worker(self):
+        should_retire = None
+        if self._concurrency_controller is not None:
+            should_retire = self._should_retire
+        worker = Worker(queue=self.queue, should_retire=should_retire,
+                        memory_budget=self._memory_budget)
+        worker.setDaemon(True)
+        self.threads_list.append(worker)
+        if self._thread_stack_size is None:
+            worker.start()
+            return
+        # The stack size applies to every thread started until it is
+        # set back.
+        try:
+            default_stack_size = threading.stack_size(
+                self._thread_stack_size)
+        except (ValueError, threading.ThreadError):
+            LOGGER.debug("Can not set the stack size of worker threads.",
+                         exc_info=True)
             worker.start()
+            return
+        try:
+            worker.start()
+        finally:
+            threading.stack_size(default_stack_size)
+
+    def resize(self, num_threads):
+        """Grow or shrink the number of worker threads.
+
+        New workers are started right away.  When shrinking, workers
+        exit after they finish their current task.  Once a shutdown
+        has been initiated, the pool is no longer resized.
 
-    def submit(self, task):
+        """
+        with self._resize_lock:
+            if self._shutdown_initiated:
+                return
+            live_threads = self.num_threads - self._pending_retirements
+            if num_threads > live_threads:
+                to_start = num_threads - live_threads
+                # Cancel pending retirements before starting new threads.
+                cancelled = min(to_start, self._pending_retirements)
+                self._pending_retirements -= cancelled
+                for i in range(to_start - cancelled):
+                    self.num_threads += 1
+                    self._start_worker()
+            elif num_threads < live_threads:
+                self._pending_retirements += live_threads - num_threads
+            LOGGER.debug("Resized worker pool to %s threads.", num_threads)
+
+    def _should_retire(self):
+        with self._resize_lock:
+            if self._pending_retirements > 0 and \
+                    not self._shutdown_initiated:
+                self._pending_retirements -= 1
+                self.num_threads -= 1
+                return True
+            return False
+
+    def submit(self, task, dependencies=None):
         """
         This is the function used to submit a task to the ``Executor``.
+
+        If ``dependencies`` (a list of ``TaskDependency`` objects) is
+        given, the task is only queued once all of them are done, so it
+        never takes up a worker thread while it waits for them.  At most
+        ``max_queue_size`` tasks are held at a time.
         """
         LOGGER.debug("Submitting task: %s", task)
-        self.queue.put(task)
+        if not dependencies:
+            self.queue.put(task)
+            return
+        with self._held_condition:
+            while 0 < self._max_queue_size <= self._num_held_tasks:
+                self._held_condition.wait(timeout=1)
+            self._num_held_tasks += 1
+        held_task = _HeldTask(task, len(dependencies), self._release)
+        for dependency in dependencies:
+            dependency.add_done_callback(held_task.dependency_done)
+
+    def _release(self, task):
+        LOGGER.debug("Dependencies done, queueing task: %s", task)
+        # This is usually called from a worker thread, so the task is
+        # queued even if the queue is full.
+        self.queue.put_unbounded(task)
+        with self._held_condition:
+            self._num_held_tasks -= 1
+            self._held_condition.notify()
+            shutdown = self._deferred_shutdown and \
+                self._num_held_tasks == 0
+            if shutdown:
+                self._deferred_shutdown = False
+        if shutdown:
+            self._queue_shutdown_requests(self.STANDARD_PRIORITY,
+                                          self.queue.put_unbounded)
 
     def initiate_shutdown(self, priority=STANDARD_PRIORITY):
         """Instruct all threads to shutdown.
@@ -96,6 +212,8 @@ class Executor(object):
         currently queued tasks have been completed before the threads
         shutdown.  If the task queue is completely full, it may
         take a while for the threads to shutdown.
+        Tasks that are held until their dependencies are done are
+        completed as well.
 
         This method does not block.  Once ``initiate_shutdown`` has
         been called, you can all ``wait_until_shutdown`` to block
@@ -105,11 +223,25 @@ class Executor(object):
         # Implementation detail:  we only queue the worker threads
         # to shutdown.  The print/io threads are shutdown in the
         # ``wait_until_shutdown`` method.
-        for i in range(self.num_threads):
+        with self._resize_lock:
+            self._shutdown_initiated = True
+        if priority == self.STANDARD_PRIORITY:
+            with self._held_condition:
+                if self._num_held_tasks > 0:
+                    # The workers are needed for the held tasks, so they
+                    # are told to shutdown once the last one is queued.
+                    self._deferred_shutdown = True
+                    return
+        self._queue_shutdown_requests(priority, self.queue.put)
+
+    def _queue_shutdown_requests(self, priority, put):
+        with self._resize_lock:
+            num_threads = self.num_threads
+        for i in range(num_threads):
             LOGGER.debug(
                 "Queueing end sentinel for worker thread (priority: %s)",
                 priority)
-            self.queue.put(ShutdownThreadRequest(priority))
+            put(ShutdownThreadRequest(priority))
 
     def wait_until_shutdown(self):
         """Block until the Executor is fully shutdown.
@@ -128,52 +260,26 @@ class Executor(object):
 
         LOGGER.debug("Queueing end sentinel for result thread.")
         self.result_queue.put(ShutdownThreadRequest())
-        LOGGER.debug("Queueing end sentinel for IO thread.")
-        self.write_queue.put(ShutdownThreadRequest())
 
         LOGGER.debug("Waiting for result thread to shutdown.")
         self.print_thread.join()
-        LOGGER.debug("Waiting for IO thread to shutdown.")
-        self.io_thread.join()
         LOGGER.debug("All threads have been shutdown.")
 
 
-class IOWriterThread(threading.Thread):
-    def __init__(self, queue):
-        threading.Thread.__init__(self)
-        self.queue = queue
-        self.fd_descriptor_cache = {}
+class _HeldTask(object):
+    """A task waiting for its dependencies to be done."""
+    def __init__(self, task, num_dependencies, release):
+        self._task = task
+        self._remaining = num_dependencies
+        self._release = release
+        self._lock = threading.Lock()
 
-    def run(self):
-        while True:
-            task = self.queue.get(True)
-            if isinstance(task, ShutdownThreadRequest):
-                LOGGER.debug("Shutdown request received in IO thread, "
-                             "shutting down.")
-                self._cleanup()
-                return
-            elif isinstance(task, IORequest):
-                filename, offset, data = task
-                fileobj = self.fd_descriptor_cache.get(filename)
-                if fileobj is None:
-                    fileobj = open(filename, 'rb+')
-                    self.fd_descriptor_cache[filename] = fileobj
-                fileobj.seek(offset)
-                LOGGER.debug("Writing data to: %s, offset: %s",
-                             filename, offset)
-                fileobj.write(data)
-                fileobj.flush()
-            elif isinstance(task, IOCloseRequest):
-                LOGGER.debug("IOCloseRequest received for %s, closing file.",
-                             task.filename)
-                fileobj = self.fd_descriptor_cache.get(task.filename)
-                if fileobj is not None:
-                    fileobj.close()
-                    del self.fd_descriptor_cache[task.filename]
-
-    def _cleanup(self):
-        for fileobj in self.fd_descriptor_cache.values():
-            fileobj.close()
+    def dependency_done(self):
+        with self._lock:
+            self._remaining -= 1
+            is_ready = self._remaining == 0
+        if is_ready:
+            self._release(self._task)
 
 
 class Worker(threading.Thread):
@@ -181,10 +287,16 @@ class Worker(threading.Thread):
     This thread is in charge of performing the tasks provided via
     the main queue ``queue``.
     """
-    def __init__(self, queue):
+    def __init__(self, queue, should_retire=None, memory_budget=None):
         threading.Thread.__init__(self)
         # This is the queue where work (tasks) are submitted.
         self.queue = queue
+        # An optional callable, checked after each task, that returns
+        # True if this worker should exit because the pool is shrinking.
+        self._should_retire = should_retire
+        # An optional ``MemoryBudget`` the memory a task buffers is
+        # acquired from before the task is run.
+        self._memory_budget = memory_budget
 
     def run(self):
         while True:
@@ -196,12 +308,25 @@ class Worker(threading.Thread):
                     break
                 try:
                     LOGGER.debug("Worker thread invoking task: %s", function)
-                    function()
+                    self._run_task(function)
                 except Exception as e:
                     LOGGER.debug('Error calling task: %s', e, exc_info=True)
+                finally:
+                    self.queue.task_finished(function)
+                if self._should_retire is not None and self._should_retire():
+                    LOGGER.debug("Worker thread retiring, the worker pool "
+                                 "is shrinking.")
+                    break
             except queue.Empty:
                 pass
 
+    def _run_task(self, function):
+        if self._memory_budget is None:
+            function()
+            return
+        with self._memory_budget.reserve(get_memory_needed(function)):
+            function()
+
 
 class PrintThread(threading.Thread):
     """
@@ -225,9 +350,12 @@ class PrintThread(threading.Thread):
         * warning: Boolean indicating whether or not a file generated a
             warning.
 
+    Results are written to ``out_file`` (stdout by default).
+
     """
-    def __init__(self, result_queue, quiet):
+    def __init__(self, result_queue, quiet, out_file=None):
         threading.Thread.__init__(self)
+        self._out_file = out_file
         self._progress_dict = {}
         self._result_queue = result_queue
         self._quiet = quiet
@@ -253,13 +381,18 @@ class PrintThread(threading.Thread):
         with self._lock:
             self._total_files = total_files
 
+    def _get_out_file(self):
+        if self._out_file is None:
+            return sys.stdout
+        return self._out_file
+
     def run(self):
         while True:
             try:
                 print_task = self._result_queue.get(True)
                 if isinstance(print_task, ShutdownThreadRequest):
                     if self._needs_newline:
-                        sys.stdout.write('\n')
+                        self._get_out_file().write('\n')
                     LOGGER.debug("Shutdown request received in print thread, "
                                  "shutting down print thread.")
                     break
@@ -310,7 +443,7 @@ class PrintThread(threading.Thread):
             self._file_count += 1
 
         is_done = self._total_files == self._file_count
-        if not is_done:
+        if not is_done and not self._quiet:
             prog_str = "Completed %s " % self._num_parts
             num_files = self._total_files
             if self._total_files != '...':
@@ -324,6 +457,7 @@ class PrintThread(threading.Thread):
             self._progress_length = length_prog
             final_str += prog_str
         if not self._quiet:
-            uni_print(final_str)
+            out_file = self._get_out_file()
+            uni_print(final_str, out_file)
             self._needs_newline = not final_str.endswith('\n')
-            sys.stdout.flush()
+            out_file.flush()
@@ -13,14 +13,25 @@
 import os
 import sys
 import stat
+import threading
 
 import six
 from six.moves import queue
 from dateutil.parser import parse
 from dateutil.tz import tzlocal
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # The scandir backport for python 2.
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 from awscli.customizations.s3.utils import find_bucket_key, get_file_stat
-from awscli.customizations.s3.utils import BucketLister, create_warning
+from awscli.customizations.s3.utils import BucketLister, \
+    ParallelBucketLister, create_warning
 from awscli.errorhandler import ClientError
 
 
@@ -30,7 +41,13 @@ def is_special_file(path):
     file is a character special device, block special device, FIFO, or
     socket. 
     """
-    mode = os.stat(path).st_mode
+    return is_special_mode(os.stat(path).st_mode)
+
+
+def is_special_mode(mode):
+    """
+    Checks if the ``st_mode`` of a file is that of a special file.
+    """
     # Character special device.
     if stat.S_ISCHR(mode):
         return True
@@ -66,6 +83,128 @@ def is_readable(path):
     return True
 
 
+class _ListDirEntry(object):
+    """
+    A stand in for the entries ``os.scandir`` yields, for pythons that do
+    not have it.  Each method makes at most one system call, and the
+    result of ``stat`` is cached.
+    """
+    def __init__(self, directory, name):
+        self.name = name
+        self._directory = directory
+        self._stat = None
+
+    @property
+    def path(self):
+        return os.path.join(self._directory, self.name)
+
+    def is_dir(self):
+        try:
+            return stat.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            return False
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+def _scan_directory(path):
+    if scandir is not None:
+        return list(scandir(path))
+    return [_ListDirEntry(path, name) for name in os.listdir(path)]
+
+
+class _DirectoryScanner(object):
+    """
+    Scans the directories of a walk as the walk reaches them.
+    ``scan_function`` takes the path of a directory and returns its
+    listing.
+    """
+    def __init__(self, scan_function):
+        self._scan_function = scan_function
+
+    def scan(self, path):
+        return self._scan_function(path)
+
+    def scan_ahead(self, paths):
+        pass
+
+    def close(self):
+        pass
+
+
+class _ThreadedDirectoryScanner(_DirectoryScanner):
+    """
+    Scans directories in a pool of threads ahead of the walk.
+
+    ``scan_ahead`` is given the directories that the walk will reach next,
+    in the order it will reach them.  Up to twice as many directories as
+    there are threads are scanned ahead, so every thread stays busy while
+    the memory used by listings that are waiting to be walked is bounded.
+    """
+    def __init__(self, scan_function, num_threads):
+        super(_ThreadedDirectoryScanner, self).__init__(scan_function)
+        self._max_ahead = num_threads * 2
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        for i in range(num_threads):
+            thread = threading.Thread(target=self._run_worker)
+            thread.daemon = True
+            thread.start()
+
+    def scan(self, path):
+        job = self._jobs.pop(path, None)
+        if job is None:
+            return self._scan_function(path)
+        while not job.finished.wait(1):
+            # A timeout keeps the walk interruptible on python 2.
+            pass
+        if job.exc_info is not None:
+            six.reraise(*job.exc_info)
+        return job.listing
+
+    def scan_ahead(self, paths):
+        for path in paths:
+            if len(self._jobs) >= self._max_ahead:
+                return
+            if path not in self._jobs:
+                job = _ScanJob(path)
+                self._jobs[path] = job
+                self._queue.put(job)
+
+    def close(self):
+        self._cancelled.set()
+        # Wake up any threads that are waiting for a job so they exit.
+        for i in range(self._max_ahead):
+            self._queue.put(None)
+
+    def _run_worker(self):
+        while not self._cancelled.is_set():
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                job.listing = self._scan_function(job.path)
+            except Exception:
+                job.exc_info = sys.exc_info()
+            finally:
+                job.finished.set()
+
+
+class _ScanJob(object):
+    def __init__(self, path):
+        self.path = path
+        self.listing = None
+        self.exc_info = None
+        self.finished = threading.Event()
+
+
 # This class is provided primarily to provide a detailed error message.
 
 class FileDecodingError(Exception):
@@ -90,9 +229,14 @@ class FileDecodingError(Exception):
 
 
 class FileStat(object):
+    # There is one of these objects per file, so they have slots instead
+    # of an attribute dictionary.
+    __slots__ = ('src', 'dest', 'compare_key', 'size', 'last_update',
+                 'src_type', 'dest_type', 'operation_name', 'etag')
+
     def __init__(self, src, dest=None, compare_key=None, size=None,
                  last_update=None, src_type=None, dest_type=None,
-                 operation_name=None):
+                 operation_name=None, etag=None):
         self.src = src
         self.dest = dest
         self.compare_key = compare_key
@@ -101,6 +245,7 @@ class FileStat(object):
         self.src_type = src_type
         self.dest_type = dest_type
         self.operation_name = operation_name
+        self.etag = etag
 
 
 class FileGenerator(object):
@@ -112,14 +257,30 @@ class FileGenerator(object):
     ``FileInfo`` objects to send to a ``Comparator`` or ``S3Handler``.
     """
     def __init__(self, service, endpoint, operation_name,
-                 follow_symlinks=True, result_queue=None):
+                 follow_symlinks=True, result_queue=None, path_filter=None,
+                 walk_threads=None, list_concurrency=None, shard=None):
         self._service = service
         self._endpoint = endpoint
         self.operation_name = operation_name
         self.follow_symlinks = follow_symlinks
+        # :var walk_threads: If more than one, local directories are listed
+        #     and stat'ed by this many threads ahead of the walk.
+        self.walk_threads = walk_threads
+        # :var list_concurrency: If set, S3 prefixes are split on their
+        #     common prefixes and up to this many are listed concurrently.
+        self.list_concurrency = list_concurrency
         self.result_queue = result_queue
         if not result_queue:
             self.result_queue = queue.Queue()
+        # :var path_filter: A ``Filter`` whose rules are used to skip
+        #     directories and prefixes that only hold excluded files.
+        #     Files that are listed still need to be filtered.
+        self._path_filter = path_filter
+        # :var shard: A ``Shard`` used to skip directories and prefixes
+        #     that only hold the files of other shards.  Files that are
+        #     listed still need to be sharded.
+        self._shard = shard
+        self._listing_root = None
 
     def call(self, files):
         """
@@ -134,8 +295,9 @@ class FileGenerator(object):
         function_table = {'s3': self.list_objects, 'local': self.list_files}
         sep_table = {'s3': '/', 'local': os.sep}
         source = src['path']
+        self._listing_root = source
         file_list = function_table[src_type](source, files['dir_op'])
-        for src_path, size, last_update in file_list:
+        for src_path, size, last_update, etag in file_list:
             if files['dir_op']:
                 rel_path = src_path[len(src['path']):]
             else:
@@ -151,7 +313,7 @@ class FileGenerator(object):
                            compare_key=compare_key, size=size,
                            last_update=last_update, src_type=src_type,
                            dest_type=dest_type,
-                           operation_name=self.operation_name)
+                           operation_name=self.operation_name, etag=etag)
 
     def list_files(self, path, dir_op):
         """
@@ -159,47 +321,121 @@ class FileGenerator(object):
         under a directory depending on if the operation is on a directory.
         For directories a depth first search is implemented in order to
         follow the same sorted pattern as a s3 list objects operation
-        outputs.  It yields the file's source path, size, and last
-        update
+        outputs.  It yields the file's source path, size, last
+        update, and etag (which is always None for local files)
         """
-        join, isdir, isfile = os.path.join, os.path.isdir, os.path.isfile
-        error, listdir = os.error, os.listdir
         if not self.should_ignore_file(path):
             if not dir_op:
                 size, last_update = get_file_stat(path)
-                yield path, size, last_update
+                yield path, size, last_update, None
             else:
-                # We need to list files in byte order based on the full
-                # expanded path of the key: 'test/1/2/3.txt'  However,
-                # listdir() will only give us contents a single directory
-                # at a time, so we'll get 'test'.  At the same time we don't
-                # want to load the entire list of files into memory.  This
-                # is handled by first going through the current directory
-                # contents and adding the directory separator to any
-                # directories.  We can then sort the contents,
-                # and ensure byte order.
-                names = listdir(path)
-                self._check_paths_decoded(path, names)
-                for i, name in enumerate(names):
-                    file_path = join(path, name)
-                    if isdir(file_path):
-                        names[i] = name + os.path.sep
-                self.normalize_sort(names, os.sep, '/')
-                for name in names:
-                    file_path = join(path, name)
-                    if not self.should_ignore_file(file_path):
-                        if isdir(file_path):
-                            # Anything in a directory will have a prefix of
-                            # this current directory and will come before the
-                            # remaining contents in this directory.  This
-                            # means we need to recurse into this sub directory
-                            # before yielding the rest of this directory's
-                            # contents.
-                            for x in self.list_files(file_path, dir_op):
-                                yield x
-                        else:
-                            size, last_update = get_file_stat(file_path)
-                            yield file_path, size, last_update
+                if self.walk_threads and self.walk_threads > 1:
+                    scanner = _ThreadedDirectoryScanner(
+                        self._scan_directory, self.walk_threads)
+                else:
+                    scanner = _DirectoryScanner(self._scan_directory)
+                try:
+                    for x in self._walk_directory(path, scanner):
+                        yield x
+                finally:
+                    scanner.close()
+
+    def _walk_directory(self, path, scanner):
+        # Directories are walked with the type of each entry from the
+        # directory listing and a single stat of each file, instead of the
+        # checks ``should_ignore_file`` makes.  Files are not opened to
+        # check that they can be read; that is left until a file is
+        # transferred.
+        listing = scanner.scan(path)
+        sub_directories = []
+        for entry_path, is_dir, stats in listing:
+            if is_dir and not self._is_excluded_prefix(entry_path, 'local'):
+                sub_directories.append(entry_path)
+        # The sub directories are listed in this order as the walk reaches
+        # them, so they can be listed ahead of the walk.
+        scanner.scan_ahead(sub_directories)
+        sub_directories = set(sub_directories)
+        for entry_path, is_dir, stats in listing:
+            if is_dir:
+                if entry_path not in sub_directories:
+                    continue
+                # Anything in a directory will have a prefix of
+                # this current directory and will come before the
+                # remaining contents in this directory.  This
+                # means we need to recurse into this sub directory
+                # before yielding the rest of this directory's
+                # contents.
+                try:
+                    for x in self._walk_directory(entry_path, scanner):
+                        yield x
+                except OSError:
+                    self._warn(entry_path, "File/Directory is not readable.")
+            elif stats is None:
+                # A symlink to a file that does not exist.
+                self._warn(entry_path, "File does not exist.")
+            elif is_special_mode(stats.st_mode):
+                self._warn(entry_path,
+                           "File is character special device, "
+                           "block special device, FIFO, or socket.")
+            else:
+                size, last_update = get_file_stat(entry_path, stats)
+                yield entry_path, size, last_update, None
+
+    def _scan_directory(self, path):
+        """
+        List a directory and stat its files.  This makes all of the system
+        calls for a directory, so it can be run in another thread.
+
+        :returns: A list of ``(path, is_dir, stats)`` for each entry, sorted
+            in the order they need to be walked.  Directories end with a
+            separator and have no stats.  Files have None as their stats
+            if they could not be stat'ed.
+        """
+        # We need to list files in byte order based on the full
+        # expanded path of the key: 'test/1/2/3.txt'  However,
+        # a listing will only give us contents a single directory
+        # at a time, so we'll get 'test'.  At the same time we don't
+        # want to load the entire list of files into memory.  This
+        # is handled by first going through the current directory
+        # contents and adding the directory separator to any
+        # directories.  We can then sort the contents,
+        # and ensure byte order.
+        entries = _scan_directory(path)
+        self._check_paths_decoded(path, [entry.name for entry in entries])
+        names = []
+        listing_by_name = {}
+        for entry in entries:
+            if not self.follow_symlinks and entry.is_symlink():
+                continue
+            if entry.is_dir():
+                name = entry.name + os.path.sep
+                listing_by_name[name] = (entry.path + os.path.sep, True,
+                                         None)
+            else:
+                name = entry.name
+                try:
+                    stats = entry.stat()
+                except OSError:
+                    stats = None
+                listing_by_name[name] = (entry.path, False, stats)
+            names.append(name)
+        self.normalize_sort(names, os.sep, '/')
+        return [listing_by_name[name] for name in names]
+
+    def _is_excluded_prefix(self, prefix, src_type):
+        if self._path_filter is not None and \
+                self._path_filter.excludes_all_under(prefix, src_type):
+            return True
+        return self._shard is not None and \
+            self._is_other_shards_prefix(prefix, src_type)
+
+    def _is_other_shards_prefix(self, prefix, src_type):
+        if not prefix.startswith(self._listing_root):
+            return False
+        relative_prefix = prefix[len(self._listing_root):]
+        if src_type == 'local':
+            relative_prefix = relative_prefix.replace(os.sep, '/')
+        return self._shard.excludes_all_under(relative_prefix)
 
     def normalize_sort(self, names, os_sep, character):
         """
@@ -249,28 +485,27 @@ class FileGenerator(object):
         not have read access.
         """
         if not os.path.exists(path):
-            warning = create_warning(path, "File does not exist.")
-            self.result_queue.put(warning)
+            self._warn(path, "File does not exist.")
             return True
         if is_special_file(path):
-            warning = create_warning(path,
-                                     ("File is character special device, "
-                                      "block special device, FIFO, or "
-                                      "socket."))
-            self.result_queue.put(warning)
+            self._warn(path, ("File is character special device, "
+                              "block special device, FIFO, or "
+                              "socket."))
             return True
         if not is_readable(path):
-            warning = create_warning(path, "File/Directory is not readable.")
-            self.result_queue.put(warning)
+            self._warn(path, "File/Directory is not readable.")
             return True
         return False
 
+    def _warn(self, path, message):
+        self.result_queue.put(create_warning(path, message))
+
     def list_objects(self, s3_path, dir_op):
         """
         This function yields the appropriate object or objects under a
         common prefix depending if the operation is on objects under a
-        common prefix.  It yields the file's source path, size, and last
-        update.
+        common prefix.  It yields the file's source path, size, last
+        update, and etag.
         """
         # Short circuit path: if we are not recursing into the s3
         # bucket and a specific path was given, we can just yield
@@ -280,9 +515,18 @@ class FileGenerator(object):
             yield self._list_single_object(s3_path)
         else:
             operation = self._service.get_operation('ListObjects')
-            lister = BucketLister(operation, self._endpoint)
+            if self.list_concurrency:
+                def excludes_prefix(key_prefix):
+                    return self._is_excluded_prefix(bucket + '/' + key_prefix,
+                                                    's3')
+                lister = ParallelBucketLister(
+                    operation, self._endpoint,
+                    max_concurrency=self.list_concurrency,
+                    excludes_prefix=excludes_prefix)
+            else:
+                lister = BucketLister(operation, self._endpoint)
             for key in lister.list_objects(bucket=bucket, prefix=prefix):
-                source_path, size, last_update = key
+                source_path, size, last_update, etag = key
                 if size == 0 and source_path.endswith('/'):
                     if self.operation_name == 'delete':
                         # This is to filter out manually created folders
@@ -291,11 +535,11 @@ class FileGenerator(object):
                         # are automatically created when they do not
                         # exist locally.  But user should be able to
                         # delete them.
-                        yield source_path, size, last_update
+                        yield source_path, size, last_update, etag
                 elif not dir_op and s3_path != source_path:
                     pass
                 else:
-                    yield source_path, size, last_update
+                    yield source_path, size, last_update, etag
 
     def _list_single_object(self, s3_path):
         # When we know we're dealing with a single object, we can avoid
@@ -328,4 +572,7 @@ class FileGenerator(object):
         file_size = int(response['ContentLength'])
         last_update = parse(response['LastModified'])
         last_update = last_update.astimezone(tzlocal())
-        return s3_path, file_size, last_update
+        etag = response.get('ETag')
+        if etag is not None:
+            etag = etag[1:-1]
+        return s3_path, file_size, last_update, etag
@@ -7,11 +7,13 @@ import hashlib
 
 from dateutil.parser import parse
 from dateutil.tz import tzlocal
+from six import BytesIO
 
 from botocore.compat import quote
 from awscli.customizations.s3.utils import find_bucket_key, \
-        check_etag, check_error, operate, uni_print, \
-        guess_content_type, MD5Error
+        check_md5_etag, check_error, operate, uni_print, \
+        guess_content_type, MD5Error, add_hashing_body, is_multipart_etag, \
+        StreamingBodyReader
 
 
 class CreateDirectoryError(Exception):
@@ -46,14 +48,14 @@ def save_file(filename, response_data, last_update):
     md5 = hashlib.md5()
     file_chunks = iter(partial(body.read, 1024 * 1024), b'')
     with open(filename, 'wb') as out_file:
-        if not _is_multipart_etag(etag):
+        if not is_multipart_etag(etag):
             for chunk in file_chunks:
                 md5.update(chunk)
                 out_file.write(chunk)
         else:
             for chunk in file_chunks:
                 out_file.write(chunk)
-    if not _is_multipart_etag(etag):
+    if not is_multipart_etag(etag):
         if etag != md5.hexdigest():
             os.remove(filename)
             raise MD5Error(filename)
@@ -62,10 +64,6 @@ def save_file(filename, response_data, last_update):
     os.utime(filename, (int(mod_timestamp), int(mod_timestamp)))
 
 
-def _is_multipart_etag(etag):
-    return '-' in etag
-
-
 class TaskInfo(object):
     """
     This class contains important details related to performing a task.  This
@@ -87,6 +85,11 @@ class TaskInfo(object):
     Note that a local file will always have its absolute path, and a s3 file
     will have its path in the form of bucket/key
     """
+    # There is one of these objects per file, so they have slots instead
+    # of an attribute dictionary.
+    __slots__ = ('src', 'src_type', 'operation_name', 'service', 'endpoint',
+                 'parameters')
+
     def __init__(self, src, src_type, operation_name, service, endpoint):
         self.src = src
         self.src_type = src_type
@@ -136,11 +139,16 @@ class FileInfo(TaskInfo):
     :param dest_type: string
     :param parameters: a dictionary of important values this is assigned in
         the ``BasicTask`` object.
+    :param etag: the ETag of the source object if it is in s3.
+    :type etag: string
     """
+    __slots__ = ('dest', 'dest_type', 'compare_key', 'size', 'last_update',
+                 'etag', 'source_endpoint')
+
     def __init__(self, src, dest=None, compare_key=None, size=None,
                  last_update=None, src_type=None, dest_type=None,
                  operation_name=None, service=None, endpoint=None,
-                 parameters=None, source_endpoint=None):
+                 parameters=None, source_endpoint=None, etag=None):
         super(FileInfo, self).__init__(src, src_type=src_type,
                                        operation_name=operation_name,
                                        service=service,
@@ -150,6 +158,7 @@ class FileInfo(TaskInfo):
         self.compare_key = compare_key
         self.size = size
         self.last_update = last_update
+        self.etag = etag
         # Usually inject ``parameters`` from ``BasicTask`` class.
         if parameters is not None:
             self.parameters = parameters
@@ -204,24 +213,33 @@ class FileInfo(TaskInfo):
         if self.parameters['expires']:
             params['expires'] = self.parameters['expires'][0]
 
-    def upload(self):
+    def upload(self, payload=None):
         """
         Redirects the file to the multipart upload function if the file is
         large.  If it is small enough, it puts the file as an object in s3.
+
+        :param payload: The bytes to upload instead of the contents of
+            ``src``, used when uploading a stream read from stdin.
         """
-        with open(self.src, 'rb') as body:
-            bucket, key = find_bucket_key(self.dest)
-            params = {
-                'endpoint': self.endpoint,
-                'bucket': bucket,
-                'key': key,
-                'body': body,
-            }
-            self._handle_object_params(params)
-            response_data, http = operate(self.service, 'PutObject', params)
-            etag = response_data['ETag'][1:-1]
-            body.seek(0)
-            check_etag(etag, body)
+        if payload is not None:
+            self._put_object(BytesIO(payload), len(payload))
+            return
+        with open(self.src, 'rb') as fileobj:
+            size = os.fstat(fileobj.fileno()).st_size
+            self._put_object(fileobj, size)
+
+    def _put_object(self, fileobj, size):
+        bucket, key = find_bucket_key(self.dest)
+        params = {
+            'endpoint': self.endpoint,
+            'bucket': bucket,
+            'key': key,
+        }
+        body = add_hashing_body(params, fileobj, size)
+        self._handle_object_params(params)
+        response_data, http = operate(self.service, 'PutObject', params)
+        etag = response_data['ETag'][1:-1]
+        check_md5_etag(etag, body.hexdigest())
 
     def _inject_content_type(self, params, filename):
         # Add a content type param if we can guess the type.
@@ -250,6 +268,22 @@ class FileInfo(TaskInfo):
         self._handle_object_params(params)
         response_data, http = operate(self.service, 'CopyObject', params)
 
+    def relay(self):
+        """
+        Copies a object in s3 to another location in s3 by downloading it
+        from ``source_endpoint`` and uploading it as it is downloaded,
+        for when the destination can't copy the object itself.
+        """
+        bucket, key = find_bucket_key(self.src)
+        params = {'endpoint': self.source_endpoint, 'bucket': bucket,
+                  'key': key}
+        response_data, http = operate(self.service, 'GetObject', params)
+        body = StreamingBodyReader(response_data['Body'])
+        try:
+            self._put_object(body, self.size)
+        finally:
+            body.close()
+
     def delete(self):
         """
         Deletes the file from s3 or local.  The src file and type is used
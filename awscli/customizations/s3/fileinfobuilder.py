@@ -33,17 +33,14 @@ class FileInfoBuilder(object):
             yield file_info            
 
     def _inject_info(self, file_base):
-        file_info_attr = {}
-        file_info_attr['src'] = file_base.src
-        file_info_attr['dest'] = file_base.dest
-        file_info_attr['compare_key'] = file_base.compare_key
-        file_info_attr['size'] = file_base.size
-        file_info_attr['last_update'] = file_base.last_update
-        file_info_attr['src_type'] = file_base.src_type
-        file_info_attr['dest_type'] = file_base.dest_type
-        file_info_attr['operation_name'] = file_base.operation_name
-        file_info_attr['service'] = self._service
-        file_info_attr['endpoint'] = self._endpoint
-        file_info_attr['source_endpoint'] = self._source_endpoint
-        file_info_attr['parameters'] = self._parameters
-        return FileInfo(**file_info_attr)
+        return FileInfo(src=file_base.src, dest=file_base.dest,
+                        compare_key=file_base.compare_key,
+                        size=file_base.size,
+                        last_update=file_base.last_update,
+                        src_type=file_base.src_type,
+                        dest_type=file_base.dest_type,
+                        operation_name=file_base.operation_name,
+                        etag=file_base.etag, service=self._service,
+                        endpoint=self._endpoint,
+                        source_endpoint=self._source_endpoint,
+                        parameters=self._parameters)
@@ -13,6 +13,7 @@
 import logging
 import fnmatch
 import os
+import re
 
 from awscli.customizations.s3.utils import split_s3_bucket_key
 
@@ -77,6 +78,14 @@ class Filter(object):
         self._original_patterns = patterns
         self.patterns = self._full_path_patterns(patterns, rootdir)
         self.dst_patterns = self._full_path_patterns(patterns, dst_rootdir)
+        # A rule matching the destination root overrides the rule matching
+        # the source root for the same pattern.
+        rules = []
+        for pattern, dst_pattern in zip(self.patterns, self.dst_patterns):
+            rules.append(pattern)
+            rules.append(dst_pattern)
+        self._compiled_rules = {'local': _CompiledRules(rules, 'local'),
+                                's3': _CompiledRules(rules, 's3')}
 
     def _full_path_patterns(self, original_patterns, rootdir):
         # We need to transform the patterns into patterns that have
@@ -101,38 +110,90 @@ class Filter(object):
         before it.
         """
         for file_info in file_infos:
-            file_path = file_info.src
-            file_status = (file_info, True)
-            for pattern, dst_pattern in zip(self.patterns, self.dst_patterns):
-                current_file_status = self._match_pattern(pattern, file_info)
-                if current_file_status is not None:
-                    file_status = current_file_status
-                dst_current_file_status = self._match_pattern(dst_pattern, file_info)
-                if dst_current_file_status is not None:
-                    file_status = dst_current_file_status
+            rules = self._compiled_rules[file_info.src_type]
+            should_include = rules.is_included(file_info.src)
             LOG.debug("=%s final filtered status, should_include: %s",
-                      file_path, file_status[1])
-            if file_status[1]:
+                      file_info.src, should_include)
+            if should_include:
                 yield file_info
 
-    def _match_pattern(self, pattern, file_info):
-        file_status = None
-        file_path = file_info.src
-        pattern_type = pattern[0]
-        if file_info.src_type == 'local':
-            path_pattern = pattern[1].replace('/', os.sep)
-        else:
-            path_pattern = pattern[1].replace(os.sep, '/')
-        is_match = fnmatch.fnmatch(file_path, path_pattern)
-        if is_match and pattern_type == 'include':
-            file_status = (file_info, True)
-            LOG.debug("%s matched include filter: %s",
-                        file_path, path_pattern)
-        elif is_match and pattern_type == 'exclude':
-            file_status = (file_info, False)
-            LOG.debug("%s matched exclude filter: %s",
-                        file_path, path_pattern)
-        else:
-            LOG.debug("%s did not match %s filter: %s",
-                        file_path, pattern_type[2:], path_pattern)
-        return file_status
+    def excludes_all_under(self, prefix, src_type):
+        """
+        Determines if every path that starts with ``prefix`` (a directory
+        including its trailing separator, or a bucket and key prefix) is
+        excluded, in which case the prefix does not need to be listed.
+        A False result only means that the rules do not rule it out.
+        """
+        return self._compiled_rules[src_type].excludes_all_under(prefix)
+
+
+class _CompiledRules(object):
+    """The filter rules for the paths of one type, compiled once.
+
+    The rules are kept last to first, so the first rule that matches a
+    path is the one that decides whether it is included.
+
+    """
+    def __init__(self, rules, src_type):
+        self._rules = []
+        for rule_type, pattern in reversed(rules):
+            if src_type == 'local':
+                pattern = pattern.replace('/', os.sep)
+            else:
+                pattern = pattern.replace(os.sep, '/')
+            # fnmatch.fnmatch normalizes the case of both the pattern and
+            # the path, so the same is done here.
+            self._rules.append(_Rule(rule_type == 'include',
+                                     os.path.normcase(pattern)))
+
+    def is_included(self, path):
+        path = os.path.normcase(path)
+        for rule in self._rules:
+            if rule.matches(path):
+                return rule.is_include
+        return True
+
+    def excludes_all_under(self, prefix):
+        prefix = os.path.normcase(prefix)
+        for rule in self._rules:
+            if rule.is_include:
+                if rule.may_match_under(prefix):
+                    return False
+            elif rule.matches_all_under(prefix):
+                return True
+        # Anything no rule matches is included.
+        return False
+
+
+class _Rule(object):
+    WILDCARDS = re.compile(r'[*?[]')
+
+    def __init__(self, is_include, pattern):
+        self.is_include = is_include
+        self._regex = re.compile(fnmatch.translate(pattern))
+        # Every path the pattern matches starts with its literal prefix.
+        self._literal_prefix = self.WILDCARDS.split(pattern, 1)[0]
+        # A pattern ending in ``*`` matches everything under any prefix that
+        # the rest of the pattern matches.
+        self._all_under_literal = None
+        self._all_under_regex = None
+        if pattern.endswith('*'):
+            head = pattern.rstrip('*')
+            if self.WILDCARDS.search(head) is None:
+                self._all_under_literal = head
+            else:
+                self._all_under_regex = re.compile(fnmatch.translate(head))
+
+    def matches(self, path):
+        return self._regex.match(path) is not None
+
+    def may_match_under(self, prefix):
+        return prefix.startswith(self._literal_prefix) or \
+            self._literal_prefix.startswith(prefix)
+
+    def matches_all_under(self, prefix):
+        if self._all_under_literal is not None:
+            return prefix.startswith(self._all_under_literal)
+        if self._all_under_regex is not None:
+            return self._all_under_regex.match(prefix) is not None
+        return False
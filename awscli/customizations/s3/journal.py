@@ -0,0 +1,207 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from awscli.customizations.s3.utils import replace_file
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TransferJournal(object):
+    """Persist the progress of multipart transfers so they can be resumed.
+
+    Each transfer has its own small JSON file in ``directory``.  The file
+    name is derived from a key that identifies the transfer, for example
+    the source path, size, modification time and destination of an
+    upload, so a journal entry is only picked up again if the source has
+    not changed since it was written.
+
+    """
+    DEFAULT_DIRECTORY = os.path.join('~', '.aws', 's3', 'journal')
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.expanduser(self.DEFAULT_DIRECTORY)
+        self._directory = directory
+
+    def get_entry(self, *key):
+        """Get the journal entry for a transfer.
+
+        :param key: Values identifying the transfer.  They must be JSON
+            serializable.
+        :returns: A ``JournalEntry``, which is empty if this transfer
+            has not been journaled before.
+
+        """
+        serialized_key = json.dumps(key)
+        digest = hashlib.sha256(serialized_key.encode('utf-8')).hexdigest()
+        filename = os.path.join(self._directory, digest + '.json')
+        data = self._load(filename, serialized_key)
+        return JournalEntry(filename, serialized_key, data)
+
+    def _load(self, filename, serialized_key):
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            if os.path.exists(filename):
+                LOGGER.debug("Ignoring unreadable journal entry %s: %s",
+                             filename, e)
+            return {}
+        if data.get('key') != serialized_key:
+            return {}
+        return data.get('state', {})
+
+
+class JournalEntry(object):
+    """The journaled state of a single transfer.
+
+    ``state`` is a dictionary of JSON serializable values which is saved
+    to disk every time ``update`` is called.  Part numbers map to the
+    ETag of each completed upload part in ``parts``, or to None for the
+    parts of a download.
+
+    Completed parts are saved in batches, once ``SAVE_BATCH_SIZE`` parts
+    have been recorded or ``SAVE_INTERVAL`` seconds have passed since the
+    last save, as saving rewrites the whole entry.  Parts that were not
+    saved yet are transferred again by the next run.
+
+    This class is thread safe.
+
+    """
+    SAVE_BATCH_SIZE = 100
+    SAVE_INTERVAL = 5
+
+    def __init__(self, filename, serialized_key, state, clock=time.time):
+        self._filename = filename
+        self._serialized_key = serialized_key
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Held while an entry is written, so entries are written in the
+        # order their state was taken.
+        self._save_lock = threading.Lock()
+        self._parts = dict((int(part_number), value) for part_number, value
+                           in state.pop('parts', {}).items())
+        self._state = state
+        self._unsaved_parts = 0
+        self._last_save = clock()
+
+    def get(self, name, default=None):
+        with self._lock:
+            return self._state.get(name, default)
+
+    @property
+    def parts(self):
+        with self._lock:
+            return dict(self._parts)
+
+    def update(self, **kwargs):
+        with self._save_lock:
+            with self._lock:
+                self._state.update(kwargs)
+                self._write(self._take_state())
+
+    def record_part(self, part_number, value, sync=None):
+        """Record a completed part, saving the entry if a batch is due.
+
+        :param sync: Called before the part is saved, with no arguments.
+            It must make sure the data of every part recorded so far is
+            on disk.
+
+        """
+        with self._lock:
+            self._parts[part_number] = value
+            self._unsaved_parts += 1
+            if self._unsaved_parts < self.SAVE_BATCH_SIZE and \
+                    self._clock() - self._last_save < self.SAVE_INTERVAL:
+                return
+        self.flush(sync)
+
+    def flush(self, sync=None):
+        """Save the parts that were recorded since the last save."""
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved_parts:
+                    return
+                state = self._take_state()
+            # Only the parts taken above have to be synced, so other
+            # parts can be recorded meanwhile.
+            if sync is not None:
+                sync()
+            self._write(state)
+
+    def retain_parts(self, part_numbers):
+        """Forget every completed part not in ``part_numbers``."""
+        part_numbers = set(part_numbers)
+        with self._save_lock:
+            with self._lock:
+                for part_number in list(self._parts):
+                    if part_number not in part_numbers:
+                        del self._parts[part_number]
+                self._write(self._take_state())
+
+    def reset(self, **kwargs):
+        """Forget all the state of the transfer and start over."""
+        with self._save_lock:
+            with self._lock:
+                self._state = kwargs
+                self._parts = {}
+                self._write(self._take_state())
+
+    def remove(self):
+        with self._save_lock:
+            with self._lock:
+                self._state = {}
+                self._parts = {}
+                self._unsaved_parts = 0
+                try:
+                    os.remove(self._filename)
+                except OSError:
+                    pass
+
+    def _take_state(self):
+        state = dict(self._state)
+        state['parts'] = dict((str(part_number), value) for
+                              part_number, value in self._parts.items())
+        self._unsaved_parts = 0
+        self._last_save = self._clock()
+        return state
+
+    def _write(self, state):
+        # The entry is written to a temporary file which is then renamed
+        # over the old entry, so a crash never leaves a partial entry.
+        directory = os.path.dirname(self._filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        fd, temp_filename = tempfile.mkstemp(dir=directory,
+                                             suffix='.json.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': self._serialized_key, 'state': state}, f)
+            replace_file(temp_filename, self._filename)
+        except Exception:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
@@ -0,0 +1,107 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import logging
+import threading
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_memory_needed(task):
+    """The number of bytes a task buffers in memory while it runs."""
+    memory_needed = getattr(task, 'memory_needed', None)
+    if memory_needed is None:
+        return 0
+    return memory_needed()
+
+
+class MemoryBudget(object):
+    """Bound the number of bytes of transfer buffers held at once.
+
+    Anything that is about to read data into memory first acquires the
+    number of bytes it is going to hold, and releases them once the data
+    is no longer needed.  Once ``max_bytes`` have been acquired,
+    ``acquire`` blocks until enough bytes are released, so a transfer
+    slows down instead of using more memory.
+
+    A request for more than ``max_bytes`` is let through once nothing
+    else is held, so a single large buffer never waits forever.  The
+    highest number of bytes held at once is kept in ``peak_bytes``.
+
+    This class is thread safe.
+
+    """
+    def __init__(self, max_bytes):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1, got: %s"
+                             % max_bytes)
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition(threading.Lock())
+        self._bytes_in_use = 0
+        self.peak_bytes = 0
+        self.num_waits = 0
+
+    @property
+    def bytes_in_use(self):
+        with self._condition:
+            return self._bytes_in_use
+
+    def acquire(self, num_bytes):
+        if num_bytes <= 0:
+            return
+        with self._condition:
+            if not self._fits(num_bytes):
+                self.num_waits += 1
+                LOGGER.debug("Waiting for %s bytes of the memory budget "
+                             "(%s of %s bytes in use).", num_bytes,
+                             self._bytes_in_use, self.max_bytes)
+                while not self._fits(num_bytes):
+                    # Wait with a timeout so a KeyboardInterrupt is not
+                    # held up when this is called from the main thread.
+                    self._condition.wait(1)
+            self._bytes_in_use += num_bytes
+            self.peak_bytes = max(self.peak_bytes, self._bytes_in_use)
+
+    def release(self, num_bytes):
+        if num_bytes <= 0:
+            return
+        with self._condition:
+            self._bytes_in_use -= num_bytes
+            self._condition.notify_all()
+
+    def reserve(self, num_bytes):
+        """Acquire ``num_bytes`` for the duration of a ``with`` block."""
+        return _Reservation(self, num_bytes)
+
+    def _fits(self, num_bytes):
+        return self._bytes_in_use == 0 or \
+            self._bytes_in_use + num_bytes <= self.max_bytes
+
+    def summary(self):
+        with self._condition:
+            return ("Peak memory used by transfer buffers: %s bytes "
+                    "(budget: %s bytes, waits: %s)"
+                    % (self.peak_bytes, self.max_bytes, self.num_waits))
+
+
+class _Reservation(object):
+    def __init__(self, budget, num_bytes):
+        self._budget = budget
+        self._num_bytes = num_bytes
+
+    def __enter__(self):
+        self._budget.acquire(self._num_bytes)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._budget.release(self._num_bytes)
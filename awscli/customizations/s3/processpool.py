@@ -0,0 +1,234 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from collections import namedtuple
+import logging
+import multiprocessing
+from six.moves import queue
+
+from awscli.clidriver import create_clidriver
+from awscli.customizations.s3.constants import MAX_QUEUE_SIZE
+from awscli.customizations.s3.executor import PrintThread, \
+    ShutdownThreadRequest
+from awscli.customizations.s3.filegenerator import FileStat
+from awscli.customizations.s3.s3handler import S3Handler, CommandResult
+from awscli.customizations.s3.utils import PrintTask
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# The number of files or parts a process has transferred, sent once it
+# knows.  ``name`` is either 'files' or 'parts'.
+ShardTotal = namedtuple('ShardTotal', ['name', 'value'])
+
+
+def _get_context():
+    # Processes are spawned, where that is supported, rather than forked
+    # from a process that is already running threads.
+    get_context = getattr(multiprocessing, 'get_context', None)
+    if get_context is None:
+        return multiprocessing
+    return get_context('spawn')
+
+
+class ProcessPoolS3Handler(object):
+    """Share the transfers of a command between several processes.
+
+    Hashing, TLS and parsing responses all hold the GIL, so the threads
+    of one ``S3Handler`` don't get much more than a core between them.
+    This starts ``num_processes`` processes, each with its own session,
+    endpoints and ``S3Handler`` with its own threads, and hands the files
+    out to them from a queue, so a process that finishes its files early
+    takes more.  Each file, with all of its parts, is transferred by one
+    process.
+
+    ``files`` are ``FileStat`` objects, as yielded by the file generator
+    or the comparator.  They are turned into ``FileInfo`` objects in the
+    processes by the ``FileInfoBuilder`` that
+    ``create_file_info_builder(session, parameters)`` returns, which has
+    to be a module level function so it can be sent to the processes.
+
+    The results of every process are sent back to a single
+    ``PrintThread`` in this process, which also adds up the totals.
+    ``num_processes`` is passed on to the ``S3Handler`` of each process
+    in ``params``, so they share the memory budget between them.
+
+    """
+    def __init__(self, session, params, num_processes,
+                 create_file_info_builder):
+        self.session = session
+        self.params = params
+        self.num_processes = num_processes
+        self._create_file_info_builder = create_file_info_builder
+        self._context = _get_context()
+        # The results of the processes, which anything else can put its
+        # own results on to be printed with them.
+        self.result_queue = self._context.Queue()
+
+    def call(self, files):
+        file_queue = self._context.Queue(maxsize=MAX_QUEUE_SIZE)
+        result_queue = self.result_queue
+        processes = []
+        for i in range(self.num_processes):
+            process = self._context.Process(
+                target=_run_shard,
+                args=(self._create_file_info_builder, self.session.profile,
+                      self.params, file_queue, result_queue))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+        print_thread = ShardPrintThread(result_queue,
+                                        self.params.get('quiet', False),
+                                        self.num_processes)
+        print_thread.daemon = True
+        print_thread.start()
+        try:
+            for file_stat in files:
+                self._put(file_queue, _encode_file_stat(file_stat),
+                          processes)
+            for process in processes:
+                self._put(file_queue, None, processes)
+            self._wait_for(processes)
+        except Exception as e:
+            LOGGER.debug('Exception caught during task execution: %s',
+                         str(e), exc_info=True)
+            result_queue.put(PrintTask(message=str(e), error=True))
+            self._stop(processes)
+        except KeyboardInterrupt:
+            result_queue.put(PrintTask(message=("Cleaning up. "
+                                                "Please wait..."),
+                                       error=True))
+            # The processes are interrupted as well, and clean up their
+            # own transfers.
+            self._wait_for(processes)
+        # Nothing reads the files that are left once the processes exit.
+        file_queue.cancel_join_thread()
+        for process in processes:
+            if process.exitcode:
+                result_queue.put(PrintTask(
+                    message="A transfer process exited with code %s."
+                    % process.exitcode, error=True))
+        result_queue.put(ShutdownThreadRequest())
+        print_thread.join()
+        return CommandResult(print_thread.num_errors_seen,
+                             print_thread.num_warnings_seen)
+
+    def _put(self, file_queue, item, processes):
+        while True:
+            try:
+                file_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError("The transfer processes exited "
+                                       "before every file was transferred.")
+
+    def _wait_for(self, processes):
+        for process in processes:
+            # Join with a timeout so a KeyboardInterrupt is not held up.
+            while process.is_alive():
+                process.join(1)
+
+    def _stop(self, processes):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self._wait_for(processes)
+
+
+def _encode_file_stat(file_stat):
+    return tuple(getattr(file_stat, name) for name in FileStat.__slots__)
+
+
+def _receive_files(file_queue):
+    while True:
+        message = file_queue.get()
+        if message is None:
+            return
+        yield FileStat(*message)
+
+
+def _run_shard(create_file_info_builder, profile, params, file_queue,
+               result_queue):
+    """Transfer files from ``file_queue`` until it hands out a None."""
+    try:
+        results = queue.Queue()
+        try:
+            session = create_clidriver().session
+            if profile is not None:
+                session.profile = profile
+            file_info_builder = create_file_info_builder(session, params)
+            s3_handler = S3Handler(
+                session, params, result_queue=results,
+                print_thread=ResultForwarder(results, result_queue))
+        except Exception as e:
+            LOGGER.debug('Exception caught setting up a transfer process: '
+                         '%s', e, exc_info=True)
+            result_queue.put(PrintTask(message=str(e), error=True))
+            return
+        s3_handler.call(file_info_builder.call(_receive_files(file_queue)))
+    except KeyboardInterrupt:
+        # ``S3Handler`` has already cleaned up what it could.
+        pass
+
+
+class ResultForwarder(PrintThread):
+    """Send the results of a process to the process that prints them.
+
+    This is used in place of the ``PrintThread`` of the ``S3Handler`` of
+    a process.  It counts the errors and warnings the same way, and the
+    totals it is given are passed on as ``ShardTotal`` messages.
+
+    """
+    def __init__(self, result_queue, forward_queue):
+        PrintThread.__init__(self, result_queue, quiet=True)
+        self._forward_queue = forward_queue
+
+    def set_total_files(self, total_files):
+        self._forward_queue.put(ShardTotal('files', total_files))
+
+    def set_total_parts(self, total_parts):
+        self._forward_queue.put(ShardTotal('parts', total_parts))
+
+    def _process_print_task(self, print_task):
+        if print_task.error:
+            self.num_errors_seen += 1
+        if print_task.warning:
+            self.num_warnings_seen += 1
+        self._forward_queue.put(print_task)
+
+
+class ShardPrintThread(PrintThread):
+    """Print the results of every process.
+
+    The totals are set once each of the ``num_shards`` processes has
+    sent its own.
+
+    """
+    def __init__(self, result_queue, quiet, num_shards, out_file=None):
+        PrintThread.__init__(self, result_queue, quiet, out_file=out_file)
+        self._num_shards = num_shards
+        self._shard_totals = {'files': [], 'parts': []}
+
+    def _process_print_task(self, print_task):
+        if not isinstance(print_task, ShardTotal):
+            PrintThread._process_print_task(self, print_task)
+            return
+        totals = self._shard_totals[print_task.name]
+        totals.append(print_task.value)
+        if len(totals) < self._num_shards:
+            return
+        if print_task.name == 'files':
+            self.set_total_files(sum(totals))
+        else:
+            self.set_total_parts(sum(totals))
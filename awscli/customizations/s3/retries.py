@@ -0,0 +1,157 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import errno
+import logging
+import random
+import socket
+import threading
+import time
+
+from botocore.vendored import requests
+from botocore.exceptions import IncompleteReadError
+
+from awscli.customizations.s3.constants import RETRY_MAX_ATTEMPTS, \
+    RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_BUDGET, RETRY_COST, \
+    THROTTLED_RETRY_COST
+from awscli.customizations.s3.utils import MD5Error, ThrottlingError
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The errors a request is retried for.
+RETRYABLE_ERRORS = (requests.ConnectionError, socket.timeout,
+                    IncompleteReadError, MD5Error, ThrottlingError)
+# socket.error is also raised for local errors (it is OSError on python 3),
+# so it is only retried for these connection errors.
+RETRYABLE_ERRNOS = (errno.ECONNRESET, errno.ECONNREFUSED, errno.ECONNABORTED,
+                    errno.ETIMEDOUT)
+
+
+def is_retryable(error):
+    """Determine if a request that failed with ``error`` can be retried."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, socket.error) and \
+        getattr(error, 'errno', None) in RETRYABLE_ERRNOS
+
+
+class RetryBudget(object):
+    """The retries shared by every task of a command.
+
+    Each retry takes ``cost`` from the budget, and each request that
+    succeeds puts one back, up to ``capacity``.  Once the budget is
+    spent, requests fail at their first error instead of being retried,
+    until enough requests have succeeded again.  This stops an outage
+    or heavy throttling from being made worse by every thread retrying
+    over and over.
+
+    This class is thread safe.
+
+    """
+    def __init__(self, capacity=RETRY_BUDGET):
+        self.capacity = capacity
+        self._available = capacity
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        with self._lock:
+            return self._available
+
+    def acquire(self, cost):
+        """Take ``cost`` from the budget, returns False if it's spent."""
+        with self._lock:
+            if cost > self._available:
+                return False
+            self._available -= cost
+            return True
+
+    def release(self, amount=1):
+        with self._lock:
+            self._available = min(self.capacity, self._available + amount)
+
+
+class RetryPolicy(object):
+    """Retry requests with exponential backoff and full jitter.
+
+    A request that fails with an error for which ``is_retryable`` is
+    True is attempted up to ``max_attempts`` times in all.  Before retry
+    ``n`` the task sleeps a random time between 0 and
+    ``min(max_delay, base_delay * 2 ** (n - 1))``, so threads that
+    failed at the same time don't all retry at the same time.
+
+    The policy is shared by the tasks of a command.  If it has a
+    ``budget``, each retry has to be paid for from it.  If it has a
+    ``concurrency_controller``, the concurrency is cut whenever a
+    request is still throttled after botocore's own retries.
+
+    """
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 budget=None, concurrency_controller=None,
+                 sleep=time.sleep, random=random.random):
+        self.max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget = budget
+        self._concurrency_controller = concurrency_controller
+        self._sleep = sleep
+        self._random = random
+
+    def delay(self, attempt):
+        """The seconds to wait after ``attempt`` failed, counting from 1."""
+        return self._random() * min(self._max_delay,
+                                    self._base_delay * 2 ** (attempt - 1))
+
+    def call(self, func, description='request', is_cancelled=None):
+        """Call ``func`` until it succeeds or can't be retried.
+
+        The error of the last attempt is raised if every attempt fails.
+        ``is_cancelled``, if given, is checked before each retry so a
+        cancelled transfer isn't retried.
+
+        """
+        attempt = 1
+        while True:
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e) or \
+                        not self._should_retry(attempt, e, is_cancelled):
+                    raise
+                delay = self.delay(attempt)
+                LOGGER.debug("Retrying %s in %.2f seconds after error: %s "
+                             "(attempt %s / %s)", description, delay, e,
+                             attempt, self.max_attempts)
+                self._sleep(delay)
+                attempt += 1
+            else:
+                if self._budget is not None:
+                    self._budget.release()
+                return result
+
+    def _should_retry(self, attempt, error, is_cancelled):
+        throttled = isinstance(error, ThrottlingError)
+        if throttled and self._concurrency_controller is not None:
+            self._concurrency_controller.back_off()
+        if attempt >= self.max_attempts:
+            return False
+        if is_cancelled is not None and is_cancelled():
+            return False
+        if self._budget is not None:
+            cost = THROTTLED_RETRY_COST if throttled else RETRY_COST
+            if not self._budget.acquire(cost):
+                LOGGER.debug("Not retrying, the retry budget is spent: %s",
+                             error)
+                return False
+        return True
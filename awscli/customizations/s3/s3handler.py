@@ -11,16 +11,33 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 from collections import namedtuple
+from functools import partial
 import logging
 import math
 import os
+import sys
+import threading
 from six.moves import queue
 
 from awscli.customizations.s3.constants import MULTI_THRESHOLD, CHUNKSIZE, \
-    NUM_THREADS, MAX_UPLOAD_SIZE, MAX_QUEUE_SIZE
+    NUM_THREADS, MAX_UPLOAD_SIZE, MAX_QUEUE_SIZE, ADAPTIVE_MIN_THREADS, \
+    ADAPTIVE_MAX_THREADS, PARTIAL_DOWNLOAD_SUFFIX, \
+    MAX_STREAM_PARTS_IN_FLIGHT, MAX_STREAM_UPLOAD_PARTS, DELETE_BATCH_SIZE, \
+    MAX_MEMORY, MULTIPART_COPY_THRESHOLD, WORKER_THREAD_STACK_SIZE
 from awscli.customizations.s3.utils import find_chunksize, \
-    operate, find_bucket_key, relative_path, PrintTask, create_warning
+    operate, find_bucket_key, relative_path, PrintTask, create_warning, \
+    ScopedEventHandler, get_binary_stdin, \
+    get_binary_stdout, read_stream_chunk, OrderedStreamWriter, \
+    set_max_pool_connections
 from awscli.customizations.s3.executor import Executor
+from awscli.customizations.s3.filegenerator import is_readable
+from awscli.customizations.s3.journal import TransferJournal
+from awscli.customizations.s3.concurrency import \
+    AdaptiveConcurrencyController, RequestMonitor
+from awscli.customizations.s3.scheduling import create_scheduling_policy
+from awscli.customizations.s3.memory import MemoryBudget
+from awscli.customizations.s3.copystrategy import CopyStrategy
+from awscli.customizations.s3.retries import RetryBudget, RetryPolicy
 from awscli.customizations.s3 import tasks
 
 LOGGER = logging.getLogger(__name__)
@@ -35,15 +52,10 @@ class S3Handler(object):
     sources the ``self.executor`` from which threads inside the
     class pull tasks from to complete.
     """
-    MAX_IO_QUEUE_SIZE = 20
-
     def __init__(self, session, params, result_queue=None,
-                 multi_threshold=MULTI_THRESHOLD, chunksize=CHUNKSIZE):
+                 multi_threshold=MULTI_THRESHOLD, chunksize=CHUNKSIZE,
+                 print_thread=None):
         self.session = session
-        # The write_queue has potential for optimizations, so the constant
-        # for maxsize is scoped to this class (as opposed to constants.py)
-        # so we have the ability to change this value later.
-        self.write_queue = queue.Queue(maxsize=self.MAX_IO_QUEUE_SIZE)
         self.result_queue = result_queue
         if not self.result_queue:
             self.result_queue = queue.Queue()
@@ -53,20 +65,111 @@ class S3Handler(object):
                        'content_type': None, 'cache_control': None,
                        'content_disposition': None, 'content_encoding': None,
                        'content_language': None, 'expires': None,
-                       'grants': None}
+                       'grants': None, 'adaptive_concurrency': False,
+                       'min_concurrency': None, 'max_concurrency': None,
+                       'resume': False, 'is_stream': False,
+                       'schedule': None, 'max_file_bytes_in_flight': None,
+                       'max_memory': None, 'multipart_copy_threshold': None,
+                       'max_single_copy_size': None, 'copy_mode': None,
+                       'num_processes': None,
+                       'max_concurrent_requests': None}
         self.params['region'] = params['region']
         for key in self.params.keys():
             if key in params:
                 self.params[key] = params[key]
         self.multi_threshold = multi_threshold
         self.chunksize = chunksize
+        self._num_threads = NUM_THREADS
+        thread_stack_size = None
+        if self.params['max_concurrent_requests'] is not None:
+            # Each request in flight takes up a thread, so there are a lot
+            # of them, with small stacks.
+            self._num_threads = int(self.params['max_concurrent_requests'])
+            thread_stack_size = WORKER_THREAD_STACK_SIZE
+        self._concurrency_controller = self._create_concurrency_controller()
+        self._memory_budget = self._create_memory_budget()
+        self._copy_strategy = self._create_copy_strategy()
+        # Every task shares one budget of retries, and throttled requests
+        # cut the concurrency when it is adaptive.
+        self._retry_policy = RetryPolicy(
+            budget=RetryBudget(),
+            concurrency_controller=self._concurrency_controller)
+        self._relay_copies = self.params['copy_mode'] == 'relay'
+        # When streaming an object to stdout, progress goes to stderr so
+        # it isn't mixed in with the contents of the object.
+        out_file = None
+        if self.params['is_stream']:
+            out_file = sys.stderr
         self.executor = Executor(
-            num_threads=NUM_THREADS, result_queue=self.result_queue,
+            num_threads=self._num_threads, result_queue=self.result_queue,
             quiet=self.params['quiet'], max_queue_size=MAX_QUEUE_SIZE,
-            write_queue=self.write_queue
+            concurrency_controller=self._concurrency_controller,
+            out_file=out_file,
+            scheduling_policy=self._create_scheduling_policy(),
+            memory_budget=self._memory_budget,
+            print_thread=print_thread,
+            thread_stack_size=thread_stack_size
         )
+        self._max_connections = self._num_threads
+        if self._concurrency_controller is not None:
+            self._max_connections = self._concurrency_controller.max_threads
+        # The endpoints whose connection pools have been sized for the
+        # threads, by id.
+        self._pooled_endpoints = set()
         self._multipart_uploads = []
         self._multipart_downloads = []
+        self._stream_writers = []
+        self._journal = None
+        if self.params['resume']:
+            self._journal = TransferJournal()
+
+    def _create_concurrency_controller(self):
+        if not self.params['adaptive_concurrency']:
+            return None
+        min_threads = self.params['min_concurrency']
+        if min_threads is None:
+            min_threads = ADAPTIVE_MIN_THREADS
+        max_threads = self.params['max_concurrency']
+        if max_threads is None:
+            max_threads = self.params['max_concurrent_requests']
+        if max_threads is None:
+            max_threads = max(ADAPTIVE_MAX_THREADS, int(min_threads))
+        return AdaptiveConcurrencyController(
+            min_threads=int(min_threads), max_threads=int(max_threads),
+            initial_threads=NUM_THREADS)
+
+    def _create_scheduling_policy(self):
+        max_file_bytes_in_flight = self.params['max_file_bytes_in_flight']
+        if self.params['schedule'] is None and \
+                max_file_bytes_in_flight is None:
+            return None
+        if max_file_bytes_in_flight is not None:
+            max_file_bytes_in_flight = int(max_file_bytes_in_flight)
+        return create_scheduling_policy(
+            self.params['schedule'],
+            max_file_bytes_in_flight=max_file_bytes_in_flight)
+
+    def _create_memory_budget(self):
+        max_memory = self.params['max_memory']
+        if max_memory is None:
+            max_memory = MAX_MEMORY
+        max_memory = int(max_memory)
+        if self.params['num_processes']:
+            # This is one of the processes the transfers are shared
+            # between, so it gets its share of the budget.
+            num_processes = int(self.params['num_processes'])
+            max_memory = max(1, max_memory // num_processes)
+        return MemoryBudget(max_memory)
+
+    def _create_copy_strategy(self):
+        multipart_threshold = self.params['multipart_copy_threshold']
+        if multipart_threshold is None:
+            multipart_threshold = MULTIPART_COPY_THRESHOLD
+        max_single_copy_size = self.params['max_single_copy_size']
+        if max_single_copy_size is not None:
+            max_single_copy_size = int(max_single_copy_size)
+        return CopyStrategy(int(multipart_threshold),
+                            max_single_copy_size=max_single_copy_size)
 
     def call(self, files):
         """
@@ -79,12 +182,10 @@ class S3Handler(object):
         """
         try:
             self.executor.start()
-            total_files, total_parts = self._enqueue_tasks(files)
-            self.executor.print_thread.set_total_files(total_files)
-            self.executor.print_thread.set_total_parts(total_parts)
-            self.executor.initiate_shutdown()
-            self.executor.wait_until_shutdown()
-            self._shutdown()
+            if self._concurrency_controller is not None:
+                self._call_with_monitor(files)
+            else:
+                self._run_tasks(files)
         except Exception as e:
             LOGGER.debug('Exception caught during task execution: %s',
                          str(e), exc_info=True)
@@ -101,20 +202,73 @@ class S3Handler(object):
                 priority=self.executor.IMMEDIATE_PRIORITY)
             self._shutdown()
             self.executor.wait_until_shutdown()
-        
+
+        if self._concurrency_controller is not None:
+            self._report_concurrency()
+        self._report_memory()
         return CommandResult(self.executor.num_tasks_failed,
                              self.executor.num_tasks_warned)
 
+    def _run_tasks(self, files):
+        total_files, total_parts = self._enqueue_tasks(files)
+        self.executor.print_thread.set_total_files(total_files)
+        self.executor.print_thread.set_total_parts(total_parts)
+        self.executor.initiate_shutdown()
+        self.executor.wait_until_shutdown()
+        self._shutdown()
+
+    def _call_with_monitor(self, files):
+        # The monitor measures every S3 request made while the tasks run
+        # and feeds the measurements to the concurrency controller.
+        monitor = RequestMonitor(self._concurrency_controller)
+        with ScopedEventHandler(self.session, 'before-call.s3',
+                                monitor.on_before_call,
+                                'S3HandlerMonitorBeforeCall'):
+            with ScopedEventHandler(self.session, 'needs-retry.s3',
+                                    monitor.on_needs_retry,
+                                    'S3HandlerMonitorNeedsRetry'):
+                self._run_tasks(files)
+
+    def _report_concurrency(self):
+        summary = self._concurrency_controller.summary()
+        LOGGER.debug(summary)
+        if not self.params['quiet']:
+            sys.stderr.write(summary + '\n')
+
+    def _report_memory(self):
+        summary = self._memory_budget.summary()
+        LOGGER.debug(summary)
+        # The peak is only shown if the budget was asked for, so the
+        # output of a command doesn't change otherwise.
+        if self.params['max_memory'] is not None and \
+                not self.params['quiet']:
+            sys.stderr.write(summary + '\n')
+
+    def _stream_window(self, part_size, extra_parts=0):
+        # The number of parts of a stream in flight at once, limited so
+        # the parts, and ``extra_parts`` more, fit in the memory budget.
+        parts_in_budget = self._memory_budget.max_bytes // part_size
+        return max(1, min(MAX_STREAM_PARTS_IN_FLIGHT,
+                          parts_in_budget - extra_parts))
+
     def _shutdown(self):
         # And finally we need to make a pass through all the existing
         # multipart uploads and abort any pending multipart uploads.
         self._abort_pending_multipart_uploads()
         self._remove_pending_downloads()
+        for stream_writer in self._stream_writers:
+            stream_writer.cancel()
 
     def _abort_pending_multipart_uploads(self):
         # For the purpose of aborting uploads, we consider any
         # upload context with an upload id.
         for upload, filename in self._multipart_uploads:
+            if upload.is_journaled:
+                # The parts are kept (and the journal entry left in
+                # place) so the upload can be resumed by the next run.
+                upload.cancel_upload()
+                upload.save_journal_entry()
+                continue
             if upload.is_cancelled():
                 try:
                     upload.wait_for_upload_id()
@@ -133,6 +287,13 @@ class S3Handler(object):
         # to go through the multipart downloads that were in progress but
         # cancelled and remove the local file.
         for context, local_filename in self._multipart_downloads:
+            if context.is_journaled:
+                # The partial file is kept so the download can be
+                # resumed, so make sure the journaled parts are on disk.
+                context.cancel()
+                context.close_file(fsync=True)
+                context.save_journal_entry()
+                continue
             if (context.is_cancelled() or context.is_started()) and \
                     os.path.exists(local_filename):
                 # The file is in an inconsistent state (not all the parts
@@ -141,9 +302,12 @@ class S3Handler(object):
                 # want to remove the files if the download has *not* been
                 # started because we haven't touched the file yet, so it's
                 # better to leave the old version of the file rather than
-                # deleting the file entirely.
+                # deleting the file entirely.  The file has to be
+                # closed first (Windows can't remove an open file).
+                context.close_file()
                 os.remove(local_filename)
             context.cancel()
+            context.close_file()
 
     def _cancel_upload(self, upload_id, filename):
         bucket, key = find_bucket_key(filename.dest)
@@ -160,17 +324,30 @@ class S3Handler(object):
     def _enqueue_tasks(self, files):
         total_files = 0
         total_parts = 0
+        # Deletes of s3 objects are grouped by bucket into batches that
+        # are each sent as a single DeleteObjects request.
+        delete_batches = {}
         for filename in files:
             num_uploads = 1
+            self._size_connection_pools(filename)
             is_multipart_task = self._is_multipart_task(filename)
             too_large = False
-            if hasattr(filename, 'size'):
+            if getattr(filename, 'size', None) is not None:
                 too_large = filename.size > MAX_UPLOAD_SIZE
             if too_large and filename.operation_name == 'upload':
                 warning_message = "File exceeds s3 upload limit of 5 TB."
                 warning = create_warning(relative_path(filename.src),
                                          message=warning_message)
                 self.result_queue.put(warning)
+            elif self._is_stream_task(filename) and \
+                    not self.params['dryrun']:
+                num_uploads = self._enqueue_stream_tasks(filename)
+            elif self._is_unreadable_local_file(filename):
+                # Local directory walks leave checking that a file can be
+                # read until it is about to be transferred.
+                warning = create_warning(relative_path(filename.src),
+                                         "File/Directory is not readable.")
+                self.result_queue.put(warning)
             elif is_multipart_task and not self.params['dryrun']:
                 # If we're in dryrun mode, then we don't need the
                 # real multipart tasks.  We can just use a BasicTask
@@ -179,20 +356,93 @@ class S3Handler(object):
                 # the specific part tasks required to perform the
                 # transfer.
                 num_uploads = self._enqueue_multipart_tasks(filename)
+            elif self._is_batch_delete_task(filename) and \
+                    not self.params['dryrun']:
+                self._add_to_delete_batch(filename, delete_batches)
+            elif self._is_s3_copy(filename) and self._relay_copies and \
+                    not self.params['dryrun']:
+                task = tasks.RelayObjectTask(
+                    session=self.session, filename=filename,
+                    parameters=self.params, result_queue=self.result_queue,
+                    retry_policy=self._retry_policy)
+                self.executor.submit(task)
+            elif self._is_s3_copy(filename) and not self.params['dryrun']:
+                task = tasks.CopyObjectTask(
+                    session=self.session, filename=filename,
+                    parameters=self.params, result_queue=self.result_queue,
+                    on_copied=self._copy_strategy.record_copy,
+                    retry_policy=self._retry_policy)
+                self.executor.submit(task)
             else:
                 task = tasks.BasicTask(
                     session=self.session, filename=filename,
                     parameters=self.params,
-                    result_queue=self.result_queue)
+                    result_queue=self.result_queue,
+                    retry_policy=self._retry_policy)
                 self.executor.submit(task)
             total_files += 1
             total_parts += num_uploads
+        for batch in delete_batches.values():
+            self._enqueue_delete_batch(batch)
         return total_files, total_parts
 
+    def _is_unreadable_local_file(self, filename):
+        return filename.src_type == 'local' and \
+            filename.operation_name in ('upload', 'move') and \
+            not self._is_stream_task(filename) and \
+            not is_readable(filename.src)
+
+    def _size_connection_pools(self, filename):
+        if self._max_connections <= NUM_THREADS:
+            # The default connection pools are large enough.
+            return
+        for endpoint in (getattr(filename, 'endpoint', None),
+                         getattr(filename, 'source_endpoint', None)):
+            if endpoint is not None and \
+                    id(endpoint) not in self._pooled_endpoints:
+                self._pooled_endpoints.add(id(endpoint))
+                set_max_pool_connections(endpoint, self._max_connections)
+
+    def _is_batch_delete_task(self, filename):
+        return filename.operation_name == 'delete' and \
+            filename.src_type == 's3'
+
+    def _add_to_delete_batch(self, filename, delete_batches):
+        batch_key = (find_bucket_key(filename.src)[0],
+                     filename.source_endpoint)
+        batch = delete_batches.setdefault(batch_key, [])
+        batch.append(filename)
+        if len(batch) == DELETE_BATCH_SIZE:
+            self._enqueue_delete_batch(delete_batches.pop(batch_key))
+
+    def _enqueue_delete_batch(self, batch):
+        task = tasks.DeleteObjectsTask(
+            filenames=batch, parameters=self.params,
+            result_queue=self.result_queue, retry_policy=self._retry_policy)
+        self.executor.submit(task)
+
+    def _is_stream_task(self, filename):
+        return self.params['is_stream'] and '-' in (filename.src,
+                                                    filename.dest)
+
+    def _is_s3_copy(self, filename):
+        return filename.operation_name in ('copy', 'move') and \
+            filename.src_type == 's3' and filename.dest_type == 's3'
+
     def _is_multipart_task(self, filename):
+        if getattr(filename, 'size', None) is not None and \
+                self._is_s3_copy(filename) and not self._relay_copies:
+            # Copies are made with CopyObject or UploadPartCopy depending
+            # on which is expected to be faster.  Queued tasks take up
+            # threads that the parts could otherwise be copied on.
+            chunksize = find_chunksize(filename.size, self.chunksize)
+            parallelism = self.executor.num_threads - \
+                self.executor.num_pending_tasks
+            return self._copy_strategy.use_multipart(
+                filename.size, chunksize, parallelism)
         # First we need to determine if it's an operation that even
         # qualifies for multipart upload.
-        if hasattr(filename, 'size'):
+        if getattr(filename, 'size', None) is not None:
             above_multipart_threshold = filename.size > self.multi_threshold
             if above_multipart_threshold:
                 if filename.operation_name in ('upload', 'download',
@@ -227,29 +477,163 @@ class S3Handler(object):
             num_uploads = self._enqueue_range_download_tasks(filename)
         return num_uploads
 
-    def _enqueue_range_download_tasks(self, filename, remove_remote_file=False):
+    def _enqueue_stream_tasks(self, filename):
+        if filename.src == '-':
+            return self._enqueue_stream_upload_tasks(filename)
+        return self._enqueue_stream_download_tasks(filename)
+
+    def _enqueue_stream_upload_tasks(self, filename):
+        # The size of stdin isn't known up front, so it is read a part at a
+        # time.  Only a window of parts are held in memory: reading another
+        # part waits for an earlier part to be uploaded.  The memory of the
+        # window, plus the part read ahead, is acquired up front, as the
+        # part tasks can't acquire it without waiting on each other.
+        stream = get_binary_stdin()
+        chunksize = self.chunksize
+        window = self._stream_window(chunksize, extra_parts=1)
+        reserved = (window + 1) * chunksize
+        self._memory_budget.acquire(reserved)
+        payload = read_stream_chunk(stream, chunksize)
+        next_payload = read_stream_chunk(stream, chunksize)
+        if not next_payload:
+            self._memory_budget.release(reserved - len(payload))
+            task = tasks.UploadStreamTask(
+                session=self.session, filename=filename,
+                parameters=self.params, result_queue=self.result_queue,
+                payload=payload, on_done=partial(
+                    self._memory_budget.release, len(payload)),
+                retry_policy=self._retry_policy)
+            self.executor.submit(task)
+            return 1
+        upload_context = self._enqueue_upload_start_task(
+            chunksize, None, filename)
+        upload_context.upload_finished.add_done_callback(
+            partial(self._memory_budget.release, reserved))
+        self._multipart_uploads.append((upload_context, filename))
+        slots = threading.BoundedSemaphore(window)
+        num_uploads = 0
+        while payload:
+            if upload_context.is_cancelled():
+                return num_uploads
+            if num_uploads == MAX_STREAM_UPLOAD_PARTS:
+                upload_context.cancel_upload()
+                raise ValueError("Stream exceeds the s3 limit of %s parts "
+                                 "of %s bytes." % (MAX_STREAM_UPLOAD_PARTS,
+                                                   chunksize))
+            slots.acquire()
+            num_uploads += 1
+            task = tasks.UploadStreamPartTask(
+                part_number=num_uploads, chunk_size=chunksize,
+                result_queue=self.result_queue,
+                upload_context=upload_context, filename=filename,
+                payload=payload, on_done=slots.release,
+                retry_policy=self._retry_policy)
+            self.executor.submit(
+                task, dependencies=[upload_context.upload_id_available])
+            payload = next_payload
+            next_payload = read_stream_chunk(stream, chunksize)
+        upload_context.announce_total_parts(num_uploads)
+        complete_multipart_upload_task = tasks.CompleteMultipartUploadTask(
+            session=self.session, filename=filename, parameters=self.params,
+            result_queue=self.result_queue, upload_context=upload_context,
+            retry_policy=self._retry_policy)
+        self.executor.submit(complete_multipart_upload_task,
+                             dependencies=[upload_context.parts_finished])
+        return num_uploads
+
+    def _enqueue_stream_download_tasks(self, filename):
+        bucket, key = find_bucket_key(filename.src)
+        response_data, http = operate(
+            filename.service, 'HeadObject',
+            {'endpoint': filename.endpoint, 'bucket': bucket, 'key': key})
+        filename.size = int(response_data['ContentLength'])
+        filename.etag = response_data['ETag'][1:-1]
         chunksize = find_chunksize(filename.size, self.chunksize)
-        num_downloads = int(filename.size / chunksize)
+        num_downloads = int(math.ceil(filename.size / float(chunksize)))
+        # Parts are downloaded in parallel but written to stdout in order,
+        # and only a window of parts are held in memory.  The memory of the
+        # window is acquired up front, as a part that acquired memory
+        # could otherwise wait on a part that can't.
+        window = self._stream_window(chunksize)
+        self._memory_budget.acquire(window * chunksize)
+        stream_writer = OrderedStreamWriter(get_binary_stdout(), window)
+        self._stream_writers.append(stream_writer)
         context = tasks.MultipartDownloadContext(num_downloads)
-        create_file_task = tasks.CreateLocalFileTask(context=context,
-                                                     filename=filename)
+        context.download_finished.add_done_callback(
+            partial(self._memory_budget.release, window * chunksize))
+        # There is no local file to create.
+        context.announce_file_created()
+        for i in range(num_downloads):
+            task = tasks.DownloadStreamPartTask(
+                part_number=i, chunk_size=chunksize,
+                result_queue=self.result_queue, service=filename.service,
+                filename=filename, context=context,
+                stream_writer=stream_writer, retry_policy=self._retry_policy)
+            self.executor.submit(task)
+        complete_task = tasks.CompleteStreamDownloadTask(
+            context=context, filename=filename, result_queue=self.result_queue,
+            params=self.params, stream_writer=stream_writer)
+        self.executor.submit(complete_task,
+                             dependencies=[context.download_finished])
+        return max(num_downloads, 1)
+
+    def _enqueue_range_download_tasks(self, filename, remove_remote_file=False):
+        chunksize = find_chunksize(filename.size, self.chunksize)
+        num_downloads = int(math.ceil(filename.size / float(chunksize)))
+        journal_entry = None
+        partial_filename = None
+        completed_parts = {}
+        if self._journal is not None and filename.etag is not None:
+            partial_filename = filename.dest + PARTIAL_DOWNLOAD_SUFFIX
+            journal_entry = self._get_download_journal_entry(
+                filename, chunksize, partial_filename)
+            completed_parts = journal_entry.parts
+        context = tasks.MultipartDownloadContext(
+            num_downloads, journal_entry=journal_entry)
+        create_file_task = tasks.CreateLocalFileTask(
+            context=context, filename=filename,
+            partial_filename=partial_filename)
         self.executor.submit(create_file_task)
         for i in range(num_downloads):
+            if i in completed_parts:
+                continue
             task = tasks.DownloadPartTask(
                 part_number=i, chunk_size=chunksize,
                 result_queue=self.result_queue, service=filename.service,
-                filename=filename, context=context, io_queue=self.write_queue)
-            self.executor.submit(task)
+                filename=filename, context=context,
+                retry_policy=self._retry_policy)
+            self.executor.submit(task, dependencies=[context.file_created])
         complete_file_task = tasks.CompleteDownloadTask(
             context=context, filename=filename, result_queue=self.result_queue,
-            params=self.params, io_queue=self.write_queue)
-        self.executor.submit(complete_file_task)
-        self._multipart_downloads.append((context, filename.dest))
+            params=self.params, partial_filename=partial_filename)
+        self.executor.submit(complete_file_task,
+                             dependencies=[context.download_finished])
+        self._multipart_downloads.append(
+            (context, partial_filename or filename.dest))
         if remove_remote_file:
             remove_task = tasks.RemoveRemoteObjectTask(
                 filename=filename, context=context)
-            self.executor.submit(remove_task)
-        return num_downloads
+            self.executor.submit(remove_task,
+                                 dependencies=[context.download_finished])
+        return num_downloads - len(completed_parts)
+
+    def _get_download_journal_entry(self, filename, chunksize,
+                                    partial_filename):
+        # The ETag and size are part of the key, so a journal entry is
+        # only resumed if the object has not changed.
+        journal_entry = self._journal.get_entry(
+            'download', filename.src, filename.size, filename.etag,
+            os.path.abspath(filename.dest))
+        partial_file_intact = os.path.isfile(partial_filename) and \
+            os.path.getsize(partial_filename) == filename.size
+        if journal_entry.get('chunksize') != chunksize or \
+                not partial_file_intact:
+            journal_entry.reset(chunksize=chunksize)
+        else:
+            LOGGER.debug("Resuming download of %s with %s part(s) "
+                         "downloaded", filename.src,
+                         len(journal_entry.parts))
+        return journal_entry
 
     def _enqueue_multipart_upload_tasks(self, filename,
                                         remove_local_file=False):
@@ -259,15 +643,23 @@ class S3Handler(object):
         chunksize = find_chunksize(filename.size, self.chunksize)
         num_uploads = int(math.ceil(filename.size /
                                     float(chunksize)))
+        journal_entry = None
+        if self._journal is not None:
+            journal_entry = self._get_upload_journal_entry(
+                filename, chunksize, num_uploads)
         upload_context = self._enqueue_upload_start_task(
-            chunksize, num_uploads, filename)
+            chunksize, num_uploads, filename, journal_entry)
         self._enqueue_upload_tasks(
-            num_uploads, chunksize, upload_context, filename, tasks.UploadPartTask)
+            num_uploads, chunksize, upload_context, filename,
+            tasks.UploadPartTask, journal_entry)
         self._enqueue_upload_end_task(filename, upload_context)
         if remove_local_file:
             remove_task = tasks.RemoveFileTask(local_filename=filename.src,
                                                upload_context=upload_context)
-            self.executor.submit(remove_task)
+            self.executor.submit(
+                remove_task, dependencies=[upload_context.upload_finished])
+        if journal_entry is not None:
+            return num_uploads - len(journal_entry.parts)
         return num_uploads
 
     def _enqueue_multipart_copy_tasks(self, filename,
@@ -276,38 +668,124 @@ class S3Handler(object):
         num_uploads = int(math.ceil(filename.size / float(chunksize)))
         upload_context = self._enqueue_upload_start_task(
             chunksize, num_uploads, filename)
+        if self._relay_copies:
+            # The parts are downloaded and uploaded like the parts of an
+            # upload, so they are the same size.
+            task_class = tasks.RelayPartTask
+        else:
+            task_class = partial(tasks.CopyPartTask,
+                                 on_copied=self._copy_strategy.record_copy)
         self._enqueue_upload_tasks(
-            num_uploads, chunksize, upload_context, filename, tasks.CopyPartTask)
+            num_uploads, chunksize, upload_context, filename, task_class)
         self._enqueue_upload_end_task(filename, upload_context)
         if remove_remote_file:
             remove_task = tasks.RemoveRemoteObjectTask(
                 filename=filename, context=upload_context)
-            self.executor.submit(remove_task)
+            self.executor.submit(
+                remove_task, dependencies=[upload_context.upload_finished])
         return num_uploads
 
-    def _enqueue_upload_start_task(self, chunksize, num_uploads, filename):
+    def _get_upload_journal_entry(self, filename, chunksize, num_uploads):
+        journal_entry = self._journal.get_entry(
+            'upload', os.path.abspath(filename.src), filename.size,
+            filename.last_update.isoformat(), filename.dest)
+        upload_id = journal_entry.get('upload_id')
+        if upload_id is None:
+            journal_entry.reset(chunksize=chunksize)
+        elif journal_entry.get('chunksize') != chunksize:
+            LOGGER.debug("Chunksize changed, not resuming upload %s of %s",
+                         upload_id, filename.src)
+            self._abort_abandoned_upload(upload_id, filename)
+            journal_entry.reset(chunksize=chunksize)
+        else:
+            self._reconcile_upload_journal(
+                journal_entry, filename, chunksize, num_uploads)
+        return journal_entry
+
+    def _reconcile_upload_journal(self, journal_entry, filename, chunksize,
+                                  num_uploads):
+        # Only the parts that S3 has, with the same size and ETag as the
+        # journal recorded, are skipped.  Everything else is uploaded again.
+        upload_id = journal_entry.get('upload_id')
+        try:
+            uploaded_parts = self._list_uploaded_parts(upload_id, filename)
+        except Exception as e:
+            LOGGER.debug("Unable to list parts of upload %s, starting a new "
+                         "upload of %s: %s", upload_id, filename.src, e)
+            journal_entry.reset(chunksize=chunksize)
+            return
+        last_part_size = filename.size - (num_uploads - 1) * chunksize
+        resumable_parts = []
+        for part_number, etag in journal_entry.parts.items():
+            expected_size = chunksize
+            if part_number == num_uploads:
+                expected_size = last_part_size
+            if uploaded_parts.get(part_number) == (etag, expected_size):
+                resumable_parts.append(part_number)
+        journal_entry.retain_parts(resumable_parts)
+        LOGGER.debug("Resuming upload %s of %s with %s of %s parts uploaded",
+                     upload_id, filename.src, len(resumable_parts),
+                     num_uploads)
+
+    def _list_uploaded_parts(self, upload_id, filename):
+        bucket, key = find_bucket_key(filename.dest)
+        params = {'endpoint': filename.endpoint, 'bucket': bucket,
+                  'key': key, 'upload_id': upload_id}
+        uploaded_parts = {}
+        while True:
+            response_data, http = operate(
+                filename.service, 'ListParts', params)
+            for part in response_data.get('Parts', []):
+                uploaded_parts[part['PartNumber']] = (
+                    part['ETag'][1:-1], part['Size'])
+            if not response_data.get('IsTruncated'):
+                return uploaded_parts
+            params['part_number_marker'] = \
+                response_data['NextPartNumberMarker']
+
+    def _abort_abandoned_upload(self, upload_id, filename):
+        try:
+            self._cancel_upload(upload_id, filename)
+        except Exception as e:
+            LOGGER.debug("Unable to abort multipart upload %s: %s",
+                         upload_id, e)
+
+    def _enqueue_upload_start_task(self, chunksize, num_uploads, filename,
+                                   journal_entry=None):
         upload_context = tasks.MultipartUploadContext(
-            expected_parts=num_uploads)
+            expected_parts=num_uploads, journal_entry=journal_entry)
+        if upload_context.in_progress():
+            # The upload is being resumed, so it already has an upload id.
+            return upload_context
         create_multipart_upload_task = tasks.CreateMultipartUploadTask(
             session=self.session, filename=filename,
             parameters=self.params,
-            result_queue=self.result_queue, upload_context=upload_context)
+            result_queue=self.result_queue, upload_context=upload_context,
+            retry_policy=self._retry_policy)
         self.executor.submit(create_multipart_upload_task)
         return upload_context
 
     def _enqueue_upload_tasks(self, num_uploads, chunksize, upload_context, filename,
-                              task_class):
+                              task_class, journal_entry=None):
+        completed_parts = {}
+        if journal_entry is not None:
+            completed_parts = journal_entry.parts
         for i in range(1, (num_uploads + 1)):
+            if i in completed_parts:
+                continue
             task = task_class(
                 part_number=i, chunk_size=chunksize,
                 result_queue=self.result_queue, upload_context=upload_context,
-                filename=filename)
-            self.executor.submit(task)
+                filename=filename, retry_policy=self._retry_policy)
+            self.executor.submit(
+                task, dependencies=[upload_context.upload_id_available])
 
     def _enqueue_upload_end_task(self, filename, upload_context):
         complete_multipart_upload_task = tasks.CompleteMultipartUploadTask(
             session=self.session, filename=filename, parameters=self.params,
-            result_queue=self.result_queue, upload_context=upload_context)
-        self.executor.submit(complete_multipart_upload_task)
+            result_queue=self.result_queue, upload_context=upload_context,
+            retry_policy=self._retry_policy)
+        self.executor.submit(complete_multipart_upload_task,
+                             dependencies=[upload_context.parts_finished])
         self._multipart_uploads.append((upload_context, filename))
 
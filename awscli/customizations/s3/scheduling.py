@@ -0,0 +1,181 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Policies for the order in which the task queue hands out tasks.
+
+A policy is given to a ``StablePriorityQueue``, which calls it with its
+lock held, so policies do not need to be thread safe.  Tasks of a lower
+``PRIORITY`` are always handed out first.  Among tasks of the same
+priority, the policy decides the order with ``sort_key``, and the queue
+falls back to the order the tasks were queued in.
+
+Tasks describe what they transfer with a ``schedule_info()`` method that
+returns a ``ScheduleInfo`` (or None).  Anything else is queued as if it
+did not belong to any file.
+
+"""
+from collections import namedtuple
+
+
+SCHEDULING_POLICIES = ['fifo', 'round-robin', 'smallest-first']
+
+
+def create_scheduling_policy(name=None, max_file_bytes_in_flight=None):
+    """Create a scheduling policy by name.
+
+    :param name: One of ``SCHEDULING_POLICIES``, defaults to ``fifo``.
+    :param max_file_bytes_in_flight: If given, tasks of a file that
+        already has this many bytes being transferred are held back
+        while tasks of other files are waiting.
+
+    """
+    if name is None:
+        name = 'fifo'
+    policy_classes = {'fifo': SchedulingPolicy,
+                      'round-robin': RoundRobinPolicy,
+                      'smallest-first': SmallestFirstPolicy}
+    if name not in policy_classes:
+        raise ValueError("Unknown scheduling policy: %s, must be one of: %s"
+                         % (name, ', '.join(SCHEDULING_POLICIES)))
+    return policy_classes[name](
+        max_file_bytes_in_flight=max_file_bytes_in_flight)
+
+
+# The file a task transfers all or part of, the size of the file and the
+# number of bytes the task itself transfers.
+ScheduleInfo = namedtuple('ScheduleInfo', ['file', 'file_size', 'num_bytes'])
+
+
+def get_schedule_info(task):
+    schedule_info = getattr(task, 'schedule_info', None)
+    if schedule_info is None:
+        return None
+    return schedule_info()
+
+
+class SchedulingPolicy(object):
+    """Hand out tasks in the order they were queued.
+
+    If ``max_file_bytes_in_flight`` is given, a task is held back while
+    the tasks of its file that have been handed out, and have not
+    finished, transfer that many bytes or more.  This keeps one large
+    file from taking up every worker.  The queue still hands out a held
+    back task if nothing else is waiting, so no worker sits idle.
+
+    """
+    def __init__(self, max_file_bytes_in_flight=None):
+        self._max_file_bytes_in_flight = max_file_bytes_in_flight
+        self._bytes_in_flight = {}
+
+    def sort_key(self, task):
+        """The key that orders tasks of the same priority.
+
+        This is called once, when the task is queued.
+
+        """
+        return ()
+
+    def group(self, task):
+        """The file a task belongs to, or None."""
+        schedule_info = get_schedule_info(task)
+        if schedule_info is None:
+            return None
+        return schedule_info.file
+
+    def can_start(self, task):
+        if self._max_file_bytes_in_flight is None:
+            return True
+        schedule_info = get_schedule_info(task)
+        if schedule_info is None or not schedule_info.num_bytes:
+            return True
+        bytes_in_flight = self._bytes_in_flight.get(schedule_info.file, 0)
+        # A file is always allowed one task in flight.
+        return bytes_in_flight == 0 or \
+            bytes_in_flight + schedule_info.num_bytes <= \
+            self._max_file_bytes_in_flight
+
+    def started(self, task, sort_key):
+        """Called when the queue hands out a task."""
+        if self._max_file_bytes_in_flight is None:
+            return
+        schedule_info = get_schedule_info(task)
+        if schedule_info is not None and schedule_info.num_bytes:
+            self._bytes_in_flight[schedule_info.file] = \
+                self._bytes_in_flight.get(schedule_info.file, 0) + \
+                schedule_info.num_bytes
+
+    def finished(self, task):
+        """Called once a task that was handed out has finished."""
+        if self._max_file_bytes_in_flight is None:
+            return
+        schedule_info = get_schedule_info(task)
+        if schedule_info is None or not schedule_info.num_bytes:
+            return
+        bytes_in_flight = self._bytes_in_flight.get(schedule_info.file, 0) \
+            - schedule_info.num_bytes
+        if bytes_in_flight > 0:
+            self._bytes_in_flight[schedule_info.file] = bytes_in_flight
+        else:
+            self._bytes_in_flight.pop(schedule_info.file, None)
+
+
+class RoundRobinPolicy(SchedulingPolicy):
+    """Take turns between files.
+
+    The n-th queued task of a file is in round n, and tasks are handed
+    out a round at a time, so the parts of a large file are interleaved
+    with the tasks of other files.  A file that has no tasks queued starts
+    again from the round being handed out, rather than from the start.
+
+    """
+    def __init__(self, max_file_bytes_in_flight=None):
+        super(RoundRobinPolicy, self).__init__(max_file_bytes_in_flight)
+        self._current_round = 0
+        # The next round and the number of queued tasks of each file
+        # with tasks queued.
+        self._next_rounds = {}
+        self._num_queued = {}
+
+    def sort_key(self, task):
+        group = self.group(task)
+        if group is None:
+            return (self._current_round,)
+        task_round = max(self._next_rounds.get(group, 0),
+                         self._current_round)
+        self._next_rounds[group] = task_round + 1
+        self._num_queued[group] = self._num_queued.get(group, 0) + 1
+        return (task_round,)
+
+    def started(self, task, sort_key):
+        super(RoundRobinPolicy, self).started(task, sort_key)
+        self._current_round = max(self._current_round, sort_key[0])
+        group = self.group(task)
+        if group is None:
+            return
+        self._num_queued[group] -= 1
+        if not self._num_queued[group]:
+            del self._num_queued[group]
+            del self._next_rounds[group]
+
+
+class SmallestFirstPolicy(SchedulingPolicy):
+    """Hand out the tasks of the smallest files first.
+
+    This finishes the most files in the least time, and the parts of a
+    large file are still handed out in order.
+
+    """
+    def sort_key(self, task):
+        schedule_info = get_schedule_info(task)
+        if schedule_info is None or schedule_info.file_size is None:
+            return (0,)
+        return (schedule_info.file_size,)
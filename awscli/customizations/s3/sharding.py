@@ -0,0 +1,79 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import hashlib
+
+
+def parse_shard(value, by='key'):
+    """Create a ``Shard`` from an ``INDEX/COUNT`` string such as ``0/4``."""
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise ValueError("--shard must be INDEX/COUNT, such as 0/4, "
+                         "got: %s" % value)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("--shard INDEX must be at least 0 and less than "
+                         "COUNT, got: %s" % value)
+    return Shard(index, count, by=by)
+
+
+class Shard(object):
+    """One of ``count`` disjoint parts of the files of a command.
+
+    Each file belongs to the shard that the md5 of its compare key picks,
+    so running a command once for each shard, on any number of hosts,
+    handles every file exactly once.  The md5 doesn't depend on the host
+    or the python version, so a file stays in the same shard from one
+    run to the next.
+
+    With ``by='prefix'`` the md5 of the first component of the compare
+    key is used instead, so a top level directory (or common prefix) and
+    everything under it belong to one shard.  The other shards then don't
+    need to list it at all, see ``excludes_all_under``.  The shards are
+    only as even as the top level directories are.
+
+    """
+    def __init__(self, index, count, by='key'):
+        if by not in ('key', 'prefix'):
+            raise ValueError("Unknown shard type: %s" % by)
+        self.index = index
+        self.count = count
+        self.by = by
+
+    def __str__(self):
+        return '%s/%s' % (self.index, self.count)
+
+    def owns(self, compare_key):
+        if self.by == 'prefix':
+            compare_key = compare_key.split('/', 1)[0]
+        return self._shard_of(compare_key) == self.index
+
+    def _shard_of(self, name):
+        digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+        return int(digest, 16) % self.count
+
+    def excludes_all_under(self, relative_prefix):
+        """Whether every file under a directory belongs to another shard.
+
+        :param relative_prefix: The path of a directory relative to the
+            path being listed, with ``/`` separators and a trailing
+            ``/``.
+
+        """
+        if self.by != 'prefix' or '/' not in relative_prefix:
+            return False
+        return not self.owns(relative_prefix)
+
+    def call(self, files):
+        for file_stat in files:
+            if self.owns(file_stat.compare_key):
+                yield file_stat
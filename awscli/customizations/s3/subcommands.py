@@ -10,24 +10,33 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+from functools import partial
 import os
 import six
 from six.moves import queue
 import sys
 
+import botocore.session
+
 from dateutil.parser import parse
 from dateutil.tz import tzlocal
 
+from awscli import EnvironmentVariables
 from awscli.customizations.commands import BasicCommand
+from awscli.customizations.s3.checksums import HashCache, LocalChecksummer
 from awscli.customizations.s3.comparator import Comparator
 from awscli.customizations.s3.fileinfobuilder import FileInfoBuilder
 from awscli.customizations.s3.fileformat import FileFormat
 from awscli.customizations.s3.filegenerator import FileGenerator
-from awscli.customizations.s3.fileinfo import TaskInfo
+from awscli.customizations.s3.fileinfo import TaskInfo, FileInfo
 from awscli.customizations.s3.filters import create_filter
 from awscli.customizations.s3.s3handler import S3Handler
+from awscli.customizations.s3.processpool import ProcessPoolS3Handler
+from awscli.customizations.s3.sharding import parse_shard
+from awscli.customizations.s3.syncindex import SyncIndex
 from awscli.customizations.s3.utils import find_bucket_key, uni_print, \
-    AppendFilter
+    AppendFilter, BackgroundGenerator
+from awscli.customizations.s3.constants import SYNC_INDEX_MAX_AGE
 
 
 RECURSIVE = {'name': 'recursive', 'action': 'store_true', 'dest': 'dir_op',
@@ -206,13 +215,204 @@ ERROR_DOCUMENT = {'name': 'error-document',
                       'The object key name to use when '
                       'a 4XX class error occurs.')}
 
+ADAPTIVE_CONCURRENCY = {'name': 'adaptive-concurrency', 'action': 'store_true',
+                        'help_text': (
+                            "Adjusts the number of concurrent requests while "
+                            "the command runs, based on the measured "
+                            "latency, throughput and throttling (503 "
+                            "SlowDown) responses.  The chosen concurrency "
+                            "is reported when the command finishes.")}
+
+MIN_CONCURRENCY = {'name': 'min-concurrency', 'cli_type_name': 'integer',
+                   'help_text': (
+                       "The lowest number of concurrent requests "
+                       "``--adaptive-concurrency`` will use.")}
+
+MAX_CONCURRENCY = {'name': 'max-concurrency', 'cli_type_name': 'integer',
+                   'help_text': (
+                       "The highest number of concurrent requests "
+                       "``--adaptive-concurrency`` will use.")}
+
+RESUME = {'name': 'resume', 'action': 'store_true',
+          'help_text': (
+              "Records the progress of multipart uploads and downloads "
+              "in a journal under ~/.aws/s3/journal.  If the command is "
+              "interrupted, running it again with ``--resume`` only "
+              "transfers the parts that are missing.  Downloads are "
+              "written to a file ending in .s3download which is renamed "
+              "into place when the download completes.  Uploaded parts "
+              "are not aborted when the command fails, so they continue "
+              "to be stored (and billed) until the upload is resumed or "
+              "aborted.")}
+
+WALK_THREADS = {'name': 'walk-threads', 'cli_type_name': 'integer',
+                'help_text': (
+                    "The number of threads that list and stat local "
+                    "directories ahead of the transfer.  Walking with "
+                    "several threads is faster on network file systems, "
+                    "where each listing and stat waits on the server.  "
+                    "Files are still transferred in the same order.  By "
+                    "default directories are walked by a single thread.")}
+
+LIST_CONCURRENCY = {'name': 'list-concurrency', 'cli_type_name': 'integer',
+                    'help_text': (
+                        "Lists S3 prefixes with a ``/`` delimiter and lists "
+                        "each common prefix on its own, with up to this "
+                        "many prefixes listed concurrently.  Keys are still "
+                        "listed in the same order.  This is faster for "
+                        "prefixes holding many keys under a few large "
+                        "subprefixes, but makes one more request for every "
+                        "subprefix, so it is slower for many small ones.  "
+                        "By default a prefix is listed one page at a "
+                        "time.")}
+
+SCHEDULE = {'name': 'schedule',
+            'choices': ['fifo', 'round-robin', 'smallest-first'],
+            'help_text': (
+                "The order in which the parts of files are transferred.  "
+                "``fifo`` (the default) transfers them in the order they "
+                "are listed.  ``round-robin`` takes turns between files, so "
+                "the parts of a large file don't hold up the files listed "
+                "after it.  ``smallest-first`` transfers the smallest files "
+                "first, so the most files finish soonest.")}
+
+MAX_FILE_BYTES_IN_FLIGHT = {'name': 'max-file-bytes-in-flight',
+                            'cli_type_name': 'integer',
+                            'help_text': (
+                                "The number of bytes of one file that can "
+                                "be transferred at the same time while "
+                                "other files are waiting.  This keeps a "
+                                "large file from using every thread.")}
+
+MAX_MEMORY = {'name': 'max-memory', 'cli_type_name': 'integer',
+              'help_text': (
+                  "The most bytes of file data held in memory at once while "
+                  "transferring.  Transfers wait for memory to be freed "
+                  "instead of using more.  Defaults to 512 MiB.  The most "
+                  "memory used is shown once the command completes.")}
+
+SOURCE_ENDPOINT_URL = {'name': 'source-endpoint-url',
+                       'help_text': (
+                           "When transferring objects from an s3 bucket to "
+                           "an s3 bucket, the URL of the endpoint of the "
+                           "source bucket, such as that of an S3 compatible "
+                           "store.  Implies ``--copy-mode relay`` unless "
+                           "``--copy-mode`` is given.")}
+
+SOURCE_PROFILE = {'name': 'source-profile',
+                  'help_text': (
+                      "When transferring objects from an s3 bucket to an s3 "
+                      "bucket, the profile whose credentials are used to "
+                      "read the source bucket.  Implies ``--copy-mode "
+                      "relay`` unless ``--copy-mode`` is given.")}
+
+COPY_MODE = {'name': 'copy-mode', 'choices': ['server', 'relay'],
+             'help_text': (
+                 "How objects are copied from an s3 bucket to an s3 bucket.  "
+                 "``server`` (the default) has S3 copy the objects.  "
+                 "``relay`` downloads each object from the source and "
+                 "uploads it to the destination as it is downloaded, a "
+                 "part at a time and with many parts at once, without "
+                 "writing it to disk.  Use ``relay`` when the destination "
+                 "can't read the source itself.")}
+
+MAX_CONCURRENT_REQUESTS = {'name': 'max-concurrent-requests',
+                           'cli_type_name': 'integer',
+                           'help_text': (
+                               "The number of requests made at once, "
+                               "which can be in the hundreds when each "
+                               "request takes a long time, such as for "
+                               "small files far from their bucket.  Each "
+                               "request is made by a thread with a small "
+                               "stack, and as many connections are kept "
+                               "open.  Defaults to 10.")}
+
+NUM_PROCESSES = {'name': 'num-processes', 'cli_type_name': 'integer',
+                 'help_text': (
+                     "The number of processes the files are transferred "
+                     "by.  Each process has its own connections and "
+                     "threads, so hashing and encrypting files is not "
+                     "limited to one CPU core.  Each file is transferred "
+                     "by one process, and the processes share "
+                     "``--max-memory`` between them.  Defaults to 1.")}
+
+SHARD = {'name': 'shard',
+         'help_text': (
+             "Only transfers the files of one of several shards, given as "
+             "INDEX/COUNT, such as 0/4 for the first of four.  Running the "
+             "command once for each INDEX, from any number of hosts, "
+             "transfers every file exactly once.  A file always belongs to "
+             "the same shard.")}
+
+SHARD_BY = {'name': 'shard-by', 'choices': ['key', 'prefix'],
+            'help_text': (
+                "How the files are shared out with ``--shard``.  ``key`` "
+                "(the default) shares out each file on its own.  ``prefix`` "
+                "shares out each top level directory or prefix, with "
+                "everything under it, so the directories of other shards "
+                "are not listed at all.")}
+
+MULTIPART_COPY_THRESHOLD = {'name': 'multipart-copy-threshold',
+                            'cli_type_name': 'integer',
+                            'help_text': (
+                                "S3 to S3 copies of objects up to this many "
+                                "bytes are always made with a single copy "
+                                "request.  Larger objects are copied in "
+                                "parts when that is expected to be faster, "
+                                "based on how long the copies made so far "
+                                "took.  Defaults to 32 MiB.")}
+
+MAX_SINGLE_COPY_SIZE = {'name': 'max-single-copy-size',
+                        'cli_type_name': 'integer',
+                        'help_text': (
+                            "S3 to S3 copies of objects larger than this "
+                            "many bytes are always copied in parts.  "
+                            "Defaults to 5 GiB, the largest object a single "
+                            "copy request can copy.")}
+
 TRANSFER_ARGS = [DRYRUN, QUIET, RECURSIVE, INCLUDE, EXCLUDE, ACL,
                  FOLLOW_SYMLINKS, NO_FOLLOW_SYMLINKS, NO_GUESS_MIME_TYPE,
                  SSE, STORAGE_CLASS, GRANTS, WEBSITE_REDIRECT, CONTENT_TYPE,
                  CACHE_CONTROL, CONTENT_DISPOSITION, CONTENT_ENCODING,
-                 CONTENT_LANGUAGE, EXPIRES, SOURCE_REGION]
+                 CONTENT_LANGUAGE, EXPIRES, SOURCE_REGION,
+                 ADAPTIVE_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY,
+                 RESUME, WALK_THREADS, LIST_CONCURRENCY, SCHEDULE,
+                 MAX_FILE_BYTES_IN_FLIGHT,
+                 MAX_MEMORY, MULTIPART_COPY_THRESHOLD, MAX_SINGLE_COPY_SIZE,
+                 SOURCE_ENDPOINT_URL, SOURCE_PROFILE, COPY_MODE,
+                 NUM_PROCESSES, SHARD, SHARD_BY, MAX_CONCURRENT_REQUESTS]
+
+USE_SYNC_INDEX = {'name': 'use-sync-index', 'action': 'store_true',
+                  'help_text': (
+                      "Keeps an index of the destination bucket under "
+                      "~/.aws/s3/sync-index.  While the index is less than "
+                      "a week old, later syncs between the same source and "
+                      "destination read it instead of listing the "
+                      "destination.  Changes made to the destination by "
+                      "anything other than sync are not seen until the "
+                      "index is rebuilt.  The index is rebuilt whenever a "
+                      "sync fails.  It has no effect when the destination "
+                      "is local.")}
+
+FULL_RECONCILE = {'name': 'full-reconcile', 'action': 'store_true',
+                  'help_text': (
+                      "Lists the destination even if "
+                      "``--use-sync-index`` has a fresh index, and rebuilds "
+                      "the index from the listing.")}
 
-SYNC_ARGS = [DELETE, EXACT_TIMESTAMPS, SIZE_ONLY] + TRANSFER_ARGS
+CHECKSUM = {'name': 'checksum', 'action': 'store_true',
+            'help_text': (
+                "Compares files of the same size by their contents instead "
+                "of their last modified times.  The MD5 of each local file "
+                "(or the ETag it would have if uploaded in parts) is "
+                "compared with the ETag of the object.  Checksums of local "
+                "files are cached under ~/.aws/s3 and only recalculated "
+                "when a file changes.  Objects encrypted with SSE-KMS or "
+                "SSE-C do not have an MD5 ETag, so they are always "
+                "treated as changed.")}
+
+SYNC_ARGS = [DELETE, EXACT_TIMESTAMPS, SIZE_ONLY, USE_SYNC_INDEX,
+             FULL_RECONCILE, CHECKSUM] + TRANSFER_ARGS
 
 
 def get_endpoint(service, region, endpoint_url, verify):
@@ -220,6 +420,18 @@ def get_endpoint(service, region, endpoint_url, verify):
                                 verify=verify)
 
 
+def create_file_info_builder(cmd, session, parameters):
+    """Create the ``FileInfoBuilder`` of a command from a session.
+
+    This is how the processes of ``--num-processes`` make their own
+    endpoints.
+
+    """
+    cmd_arc = CommandArchitecture(session, cmd, parameters)
+    cmd_arc.set_endpoints()
+    return cmd_arc.create_file_info_builder()
+
+
 class S3Command(BasicCommand):
     def _run_main(self, parsed_args, parsed_globals):
         self.service = self._session.get_service('s3')
@@ -405,7 +617,8 @@ class S3TransferCommand(S3Command):
 class CpCommand(S3TransferCommand):
     NAME = 'cp'
     DESCRIPTION = "Copies a local file or S3 object to another location " \
-                  "locally or in S3."
+                  "locally or in S3.  A <LocalPath> of ``-`` streams " \
+                  "the object from stdin or to stdout."
     USAGE = "<LocalPath> <S3Path> or <S3Path> <LocalPath> " \
             "or <S3Path> <S3Path>"
     ARG_TABLE = [{'name': 'paths', 'nargs': 2, 'positional_arg': True,
@@ -489,14 +702,35 @@ class CommandArchitecture(object):
             verify=self.parameters['verify_ssl']
         )
         self._source_endpoint = self._endpoint
+        source_endpoint_url = self.parameters.get('source_endpoint_url')
+        source_profile = self.parameters.get('source_profile')
+        if not (self.parameters['source_region'] or source_endpoint_url or
+                source_profile):
+            return
+        if self.parameters['paths_type'] != 's3s3':
+            return
+        source_region = self.parameters['region']
         if self.parameters['source_region']:
-            if self.parameters['paths_type'] == 's3s3':
-                self._source_endpoint = get_endpoint(
-                    self._service,
-                    region=self.parameters['source_region'][0],
-                    endpoint_url=None,
-                    verify=self.parameters['verify_ssl']
-                )
+            source_region = self.parameters['source_region'][0]
+        source_service = self._service
+        if source_profile:
+            # The endpoint signs requests with the credentials of the
+            # session it was created from.
+            source_session = botocore.session.get_session(
+                EnvironmentVariables)
+            source_session.profile = source_profile
+            source_service = source_session.get_service('s3')
+        self._source_endpoint = get_endpoint(
+            source_service,
+            region=source_region,
+            endpoint_url=source_endpoint_url,
+            verify=self.parameters['verify_ssl']
+        )
+        if (source_endpoint_url or source_profile) and \
+                self.parameters.get('copy_mode') is None:
+            # A server side copy can't read from another store or with
+            # other credentials, so the objects are relayed instead.
+            self.parameters['copy_mode'] = 'relay'
 
     def create_instructions(self):
         """
@@ -506,16 +740,40 @@ class CommandArchitecture(object):
         instruction list because it sends the request to S3 and does not
         yield anything.
         """
+        if self.parameters.get('is_stream'):
+            # A stream is a single object, so there are no files to
+            # generate.
+            self.instructions.append('s3_handler')
+            return
         if self.cmd not in ['mb', 'rb']:
             self.instructions.append('file_generator')
         if self.parameters.get('filters'):
             self.instructions.append('filters')
         if self.cmd == 'sync':
             self.instructions.append('comparator')
-        if self.cmd not in ['mb', 'rb']:
+        if self.parameters.get('shard') and self.cmd not in ['mb', 'rb']:
+            self.instructions.append('shard')
+        if self.cmd == 'sync' and self._uses_sync_index():
+            self.instructions.append('sync_index')
+        if self.cmd not in ['mb', 'rb'] and not self._uses_processes():
+            # The processes build their own FileInfo objects.
             self.instructions.append('file_info_builder')
         self.instructions.append('s3_handler')
 
+    def _uses_processes(self):
+        num_processes = self.parameters.get('num_processes')
+        return num_processes is not None and int(num_processes) > 1 and \
+            self.cmd not in ['mb', 'rb'] and \
+            not self.parameters.get('is_stream')
+
+    def create_file_info_builder(self):
+        return FileInfoBuilder(self._service, self._endpoint,
+                               self._source_endpoint, self.parameters)
+
+    def _uses_sync_index(self):
+        return self.parameters.get('use_sync_index') and \
+            self.parameters['paths_type'].endswith('s3')
+
     def run(self):
         """
         This function wires together all of the generators and completes
@@ -555,36 +813,94 @@ class CommandArchitecture(object):
             'mb': 'make_bucket',
             'rb': 'remove_bucket'
         }
-        result_queue = queue.Queue()
+        if self._uses_processes():
+            s3handler = ProcessPoolS3Handler(
+                self.session, self.parameters,
+                int(self.parameters['num_processes']),
+                partial(create_file_info_builder, self.cmd))
+        else:
+            s3handler = S3Handler(self.session, self.parameters,
+                                  result_queue=queue.Queue())
+        # Warnings about the files listed are printed with the results.
+        result_queue = s3handler.result_queue
         operation_name = cmd_translation[paths_type][self.cmd]
+        walk_threads = self.parameters.get('walk_threads')
+        if walk_threads is not None:
+            walk_threads = int(walk_threads)
+        list_concurrency = self.parameters.get('list_concurrency')
+        if list_concurrency is not None:
+            list_concurrency = int(list_concurrency)
+        file_filter = None
+        rev_filter = None
+        if self.parameters.get('filters'):
+            file_filter = create_filter(self.parameters)
+            # A sync index records everything at the destination, so its
+            # listing can not skip the prefixes that are excluded.
+            if not (self.cmd == 'sync' and self._uses_sync_index()):
+                rev_filter = file_filter
+        shard = None
+        if self.parameters.get('shard'):
+            shard = parse_shard(self.parameters['shard'],
+                                by=self.parameters.get('shard_by') or 'key')
         file_generator = FileGenerator(self._service,
                                        self._source_endpoint,
                                        operation_name,
                                        self.parameters['follow_symlinks'],
-                                       result_queue=result_queue)
+                                       result_queue=result_queue,
+                                       path_filter=file_filter,
+                                       walk_threads=walk_threads,
+                                       list_concurrency=list_concurrency,
+                                       shard=shard)
         rev_generator = FileGenerator(self._service, self._endpoint, '',
                                       self.parameters['follow_symlinks'],
-                                      result_queue=result_queue)
+                                      result_queue=result_queue,
+                                      path_filter=rev_filter,
+                                      walk_threads=walk_threads,
+                                      list_concurrency=list_concurrency,
+                                      shard=shard)
+        # Listing runs in the background so it is not held up by the
+        # transfers that are being submitted, and vice versa.
+        file_generator = BackgroundGenerator(file_generator)
+        rev_generator = BackgroundGenerator(rev_generator)
         taskinfo = [TaskInfo(src=files['src']['path'],
                              src_type='s3',
                              operation_name=operation_name,
                              service=self._service,
                              endpoint=self._endpoint)]
-        file_info_builder = FileInfoBuilder(self._service, self._endpoint,
-                                 self._source_endpoint, self.parameters) 
-        s3handler = S3Handler(self.session, self.parameters,
-                              result_queue=result_queue)
+        file_info_builder = self.create_file_info_builder()
+
+        sync_index = None
+        if self.cmd == 'sync' and self._uses_sync_index():
+            sync_index = SyncIndex(files['src']['path'],
+                                   files['dest']['path'], shard=shard)
+            if sync_index.is_fresh(SYNC_INDEX_MAX_AGE) and \
+                    not self.parameters.get('full_reconcile'):
+                # The index stands in for listing the destination.
+                rev_generator = sync_index
+            else:
+                rev_generator = sync_index.recorder(rev_generator)
+
+        checksummer = None
+        if self.cmd == 'sync' and self.parameters.get('checksum'):
+            checksummer = LocalChecksummer(HashCache())
 
         command_dict = {}
-        if self.cmd == 'sync':
+        if self.parameters.get('is_stream'):
+            command_dict = {'setup': [[self._create_stream_file_info(
+                                files, operation_name)]],
+                            's3_handler': [s3handler]}
+        elif self.cmd == 'sync':
             command_dict = {'setup': [files, rev_files],
                             'file_generator': [file_generator,
                                                rev_generator],
                             'filters': [create_filter(self.parameters),
                                         create_filter(self.parameters)],
-                            'comparator': [Comparator(self.parameters)],
+                            'comparator': [Comparator(self.parameters,
+                                                      checksummer)],
                             'file_info_builder': [file_info_builder],
                             's3_handler': [s3handler]}
+            if sync_index is not None:
+                command_dict['sync_index'] = [sync_index.tracker()]
         elif self.cmd == 'cp':
             command_dict = {'setup': [files],
                             'file_generator': [file_generator],
@@ -610,17 +926,30 @@ class CommandArchitecture(object):
             command_dict = {'setup': [taskinfo],
                             's3_handler': [s3handler]}
 
+        if shard is not None:
+            command_dict['shard'] = [shard]
+
         files = command_dict['setup']
-        while self.instructions:
-            instruction = self.instructions.pop(0)
-            file_list = []
-            components = command_dict[instruction]
-            for i in range(len(components)):
-                if len(files) > len(components):
-                    file_list.append(components[i].call(*files))
-                else:
-                    file_list.append(components[i].call(files[i]))
-            files = file_list
+        try:
+            while self.instructions:
+                instruction = self.instructions.pop(0)
+                file_list = []
+                components = command_dict[instruction]
+                for i in range(len(components)):
+                    if len(files) > len(components):
+                        file_list.append(components[i].call(*files))
+                    else:
+                        file_list.append(components[i].call(files[i]))
+                files = file_list
+        except BaseException:
+            if sync_index is not None:
+                sync_index.invalidate()
+            raise
+        finally:
+            if checksummer is not None:
+                checksummer.close()
+        if sync_index is not None:
+            self._finish_sync_index(sync_index, files[0])
         # This is kinda quirky, but each call through the instructions
         # will replaces the files attr with the return value of the
         # file_list.  The very last call is a single list of
@@ -639,6 +968,31 @@ class CommandArchitecture(object):
         return rc
 
 
+    def _finish_sync_index(self, sync_index, result):
+        # The changes are only applied to the index if every one of them
+        # was made.  Otherwise the next sync lists the destination again.
+        if self.parameters['dryrun']:
+            sync_index.rollback()
+        elif result.num_tasks_failed == 0 and result.num_tasks_warned == 0:
+            sync_index.commit()
+        else:
+            sync_index.invalidate()
+        sync_index.close()
+
+    def _create_stream_file_info(self, files, operation_name):
+        if self.parameters['src'] == '-':
+            return FileInfo(src='-', dest=files['dest']['path'],
+                            src_type='local', dest_type='s3',
+                            operation_name=operation_name,
+                            service=self._service, endpoint=self._endpoint,
+                            parameters=self.parameters)
+        return FileInfo(src=files['src']['path'], dest='-',
+                        src_type='s3', dest_type='local',
+                        operation_name=operation_name,
+                        service=self._service, endpoint=self._endpoint,
+                        parameters=self.parameters)
+
+
 class CommandParameters(object):
     """
     This class is used to do some initial error based on the
@@ -669,6 +1023,9 @@ class CommandParameters(object):
         not used the destination is the same as the source to ensure
         the destination always have some value.
         """
+        # Streams are checked first, '-' would otherwise be taken for a
+        # local path.
+        self._validate_stream_args(paths)
         self.check_path_type(paths)
         self._normalize_s3_trailing_slash(paths)
         src_path = paths[0]
@@ -678,6 +1035,37 @@ class CommandParameters(object):
         elif len(paths) == 1:
             self.parameters['dest'] = paths[0]
         self._validate_path_args()
+        self._validate_shard_args()
+
+    def _validate_stream_args(self, paths):
+        # A path of '-' streams the object from stdin or to stdout.
+        if '-' not in paths:
+            return
+        if self.cmd != 'cp' or self.parameters['dir_op']:
+            raise ValueError("Streaming from stdin or to stdout with '-' is "
+                             "only supported by cp of a single object")
+        other_paths = [path for path in paths if path != '-']
+        if len(paths) != 2 or len(other_paths) != 1 or \
+                not other_paths[0].startswith('s3://'):
+            raise ValueError("Streaming from stdin or to stdout with '-' "
+                             "requires the other path to be an s3:// path "
+                             "of an object")
+        s3_path = other_paths[0]
+        bucket, key = find_bucket_key(s3_path[5:])
+        if not key or key.endswith('/'):
+            raise ValueError("Streaming from stdin or to stdout with '-' "
+                             "requires the full key of an object: %s" %
+                             s3_path)
+        self.parameters['is_stream'] = True
+
+    def _validate_shard_args(self):
+        if not self.parameters.get('shard'):
+            return
+        if self.parameters.get('is_stream'):
+            raise ValueError("--shard can not be used when streaming from "
+                             "stdin or to stdout")
+        # This raises an error if the shard is not valid.
+        parse_shard(self.parameters['shard'])
 
     def _validate_path_args(self):
         # If we're using a mv command, you can't copy the object onto itself.
@@ -0,0 +1,223 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+
+from dateutil.tz import tzutc
+
+from awscli.customizations.s3.filegenerator import FileStat
+
+try:
+    import sqlite3
+except ImportError:
+    # Some python builds do not include sqlite3.
+    sqlite3 = None
+
+
+LOGGER = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=tzutc())
+
+
+class SyncIndex(object):
+    """A local index of the destination of a sync.
+
+    The index records the compare key, size, last modified time and ETag
+    of every file at the destination, as of the end of the last successful
+    sync between the same source and destination.  While the index is
+    fresh it can stand in for listing the destination: its ``call`` method
+    yields the same ``FileStat`` objects a ``FileGenerator`` listing the
+    destination would.
+
+    Changes made by a sync are staged with ``tracker`` and only applied by
+    ``commit``, which should be called once every change has been made.
+    If the sync fails, ``invalidate`` forces the next sync to list the
+    destination again.
+
+    The index is a SQLite database in ``directory``, named after the
+    source and destination, and the ``Shard`` of the sync if it has one,
+    since the index of a shard only records the changes the shard made.
+
+    """
+    DEFAULT_DIRECTORY = os.path.join('~', '.aws', 's3', 'sync-index')
+
+    def __init__(self, src, dest, directory=None, shard=None):
+        if sqlite3 is None:
+            raise ValueError("A sync index requires the sqlite3 module, "
+                             "which is not available.")
+        if directory is None:
+            directory = os.path.expanduser(self.DEFAULT_DIRECTORY)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        key_parts = [src, dest]
+        if shard is not None:
+            key_parts.append([shard.by, str(shard)])
+        key = json.dumps(key_parts)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        self.filename = os.path.join(directory, digest + '.sqlite')
+        self._connection = sqlite3.connect(self.filename)
+        self._connection.executescript(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            '  compare_key TEXT PRIMARY KEY, size INTEGER,'
+            '  last_update REAL, etag TEXT);'
+            'CREATE TABLE IF NOT EXISTS staged ('
+            '  compare_key TEXT PRIMARY KEY, size INTEGER,'
+            '  last_update REAL, etag TEXT, deleted INTEGER);'
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            '  name TEXT PRIMARY KEY, value TEXT);'
+            'DELETE FROM staged;')
+        self._connection.commit()
+
+    def is_fresh(self, max_age):
+        """Whether the index can be used instead of listing the destination.
+
+        :param max_age: The number of seconds after a sync that the
+            index is trusted for.
+
+        """
+        synced_at = self._get_metadata('synced_at')
+        if synced_at is None:
+            return False
+        return time.time() - float(synced_at) <= max_age
+
+    def call(self, files):
+        """Yield the destination files recorded in the index.
+
+        ``files`` is the same dictionary that would be given to the
+        ``FileGenerator`` listing the destination.
+
+        """
+        src = files['src']
+        dest = files['dest']
+        dest_sep = os.sep if dest['type'] == 'local' else '/'
+        # SQLite compares text by its UTF-8 bytes, which is the same order
+        # that keys are listed in.
+        cursor = self._connection.execute(
+            'SELECT compare_key, size, last_update, etag FROM entries '
+            'ORDER BY compare_key')
+        for compare_key, size, last_update, etag in cursor:
+            yield FileStat(
+                src=src['path'] + compare_key,
+                dest=dest['path'] + compare_key.replace('/', dest_sep),
+                compare_key=compare_key, size=size,
+                last_update=_from_timestamp(last_update),
+                src_type=src['type'], dest_type=dest['type'],
+                operation_name='', etag=etag)
+
+    def recorder(self, file_generator):
+        """Wrap a generator listing the destination to rebuild the index."""
+        return _ListingRecorder(self, file_generator)
+
+    def tracker(self):
+        """Create a component that stages the changes made by a sync."""
+        return _ChangeTracker(self)
+
+    def reset_entries(self):
+        self._connection.execute('DELETE FROM entries')
+
+    def record_entry(self, file_stat):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+            _entry_values(file_stat))
+
+    def stage_change(self, file_stat):
+        deleted = file_stat.operation_name == 'delete'
+        self._connection.execute(
+            'INSERT OR REPLACE INTO staged VALUES (?, ?, ?, ?, ?)',
+            _entry_values(file_stat) + (int(deleted),))
+
+    def commit(self):
+        """Apply the staged changes and mark the index as fresh."""
+        execute = self._connection.execute
+        execute('DELETE FROM entries WHERE compare_key IN '
+                '(SELECT compare_key FROM staged)')
+        execute('INSERT INTO entries SELECT compare_key, size, last_update, '
+                'etag FROM staged WHERE NOT deleted')
+        execute('DELETE FROM staged')
+        self._set_metadata('synced_at', str(time.time()))
+        self._connection.commit()
+
+    def rollback(self):
+        """Discard everything recorded since the last commit."""
+        self._connection.rollback()
+
+    def invalidate(self):
+        """Discard any changes and force the next sync to list again."""
+        self._connection.rollback()
+        self._connection.execute(
+            "DELETE FROM metadata WHERE name = 'synced_at'")
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+    def _get_metadata(self, name):
+        row = self._connection.execute(
+            'SELECT value FROM metadata WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    def _set_metadata(self, name, value):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO metadata VALUES (?, ?)', (name, value))
+
+
+class _ListingRecorder(object):
+    def __init__(self, sync_index, file_generator):
+        self._sync_index = sync_index
+        self._file_generator = file_generator
+
+    def call(self, files):
+        self._sync_index.reset_entries()
+        for file_stat in self._file_generator.call(files):
+            self._sync_index.record_entry(file_stat)
+            yield file_stat
+
+
+class _ChangeTracker(object):
+    def __init__(self, sync_index):
+        self._sync_index = sync_index
+
+    def call(self, files):
+        for file_stat in files:
+            # Transferred files end up with the size and modification time
+            # of the source, which is what later syncs compare against.
+            self._sync_index.stage_change(file_stat)
+            yield file_stat
+
+
+def _entry_values(file_stat):
+    return (file_stat.compare_key, file_stat.size,
+            _to_timestamp(file_stat.last_update), file_stat.etag)
+
+
+def _to_timestamp(last_update):
+    if last_update is None:
+        return None
+    return _total_seconds(last_update - EPOCH)
+
+
+def _from_timestamp(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tzutc())
+
+
+def _total_seconds(delta):
+    # timedelta.total_seconds() is not available on python 2.6.
+    return (delta.microseconds +
+            (delta.seconds + delta.days * 24 * 3600) * 10 ** 6) / 10.0 ** 6
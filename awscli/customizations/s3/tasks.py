@@ -1,20 +1,26 @@
+from functools import partial
 import logging
 import math
 import os
 import time
-import socket
 import threading
 
-from botocore.vendored import requests
-from botocore.exceptions import IncompleteReadError
+from six import BytesIO
 
 from awscli.customizations.s3.utils import find_bucket_key, MD5Error, \
-    operate, ReadFileChunk, relative_path, IORequest, IOCloseRequest, \
-    PrintTask
+    operate, ReadFileChunk, relative_path, PrintTask, PositionalFileWriter, \
+    add_hashing_body, check_md5_etag, \
+    calculate_multipart_etag_from_parts, replace_file, get_operation, \
+    TaskDependency, buffered_body_size, StreamingBodyReader
+from awscli.customizations.s3.scheduling import ScheduleInfo
+from awscli.customizations.s3.retries import RetryPolicy, is_retryable
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Used by tasks that aren't given a policy, it has no retry budget.
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
 
 class UploadCancelledError(Exception):
     pass
@@ -52,9 +58,32 @@ def print_operation(filename, failed, dryrun=False):
     return print_str
 
 
+def _schedule_info(filename, num_bytes):
+    return ScheduleInfo(filename, getattr(filename, 'size', None), num_bytes)
+
+
 class OrderableTask(object):
+    __slots__ = ()
     PRIORITY = 10
 
+    def schedule_info(self):
+        """Describe what the task transfers to the scheduling policy.
+
+        :returns: A ``ScheduleInfo``, or None if the task isn't part of
+            transferring a file.
+
+        """
+        return None
+
+    def memory_needed(self):
+        """The number of bytes the task buffers in memory while it runs.
+
+        The worker acquires this from the memory budget before the task
+        is run, and releases it once the task is done.
+
+        """
+        return 0
+
 
 class BasicTask(OrderableTask):
     """
@@ -63,41 +92,62 @@ class BasicTask(OrderableTask):
     attributes like ``session`` object in order for the filename to
     perform its designated operation.
     """
-    def __init__(self, session, filename, parameters, result_queue):
+    # One of these is created for every file that is not transferred in
+    # parts, so they have slots instead of an attribute dictionary.
+    __slots__ = ('session', 'filename', 'parameters', 'result_queue',
+                 'retry_policy')
+
+    def __init__(self, session, filename, parameters, result_queue,
+                 retry_policy=None):
         self.session = session
-        self.service = self.session.get_service('s3')
 
         self.filename = filename
         self.filename.parameters = parameters
 
         self.parameters = parameters
         self.result_queue = result_queue
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self.retry_policy = retry_policy
+
+    def schedule_info(self):
+        if self.filename is None:
+            return None
+        return _schedule_info(self.filename,
+                              getattr(self.filename, 'size', None))
+
+    def memory_needed(self):
+        filename = self.filename
+        size = getattr(filename, 'size', None)
+        if size is None or self.parameters['dryrun']:
+            return 0
+        if filename.operation_name not in ('upload', 'download', 'move'):
+            return 0
+        if filename.src_type == 'local' and filename.dest_type == 's3':
+            return buffered_body_size(size)
+        if filename.src_type == 's3' and filename.dest_type == 'local':
+            # save_file reads the body a chunk at a time.
+            return min(size, DownloadPartTask.ITERATE_CHUNK_SIZE)
+        return 0
 
     def __call__(self):
-        self._execute_task(attempts=3)
+        self._execute_task()
 
-    def _execute_task(self, attempts, last_error=''):
-        if attempts == 0:
-            # We've run out of retries.
-            self._queue_print_message(self.filename, failed=True,
-                                      dryrun=self.parameters['dryrun'],
-                                      error_message=last_error)
-            return
+    def _execute_task(self):
         filename = self.filename
         try:
             if not self.parameters['dryrun']:
-                getattr(filename, filename.operation_name)()
-        except requests.ConnectionError as e:
-            connect_error = str(e)
-            LOGGER.debug("%s %s failure: %s",
-                         filename.src, filename.operation_name, connect_error)
-            self._execute_task(attempts - 1, last_error=str(e))
-        except MD5Error as e:
-            LOGGER.debug("%s %s failure: Data was corrupted: %s",
-                         filename.src, filename.operation_name, e)
-            self._execute_task(attempts - 1, last_error=str(e))
+                self.retry_policy.call(
+                    partial(self._perform_operation, filename),
+                    description='%s %s' % (filename.operation_name,
+                                           filename.src))
         except Exception as e:
-            LOGGER.debug(str(e), exc_info=True)
+            if is_retryable(e):
+                # We've run out of retries.
+                LOGGER.debug("%s %s failure: %s",
+                             filename.src, filename.operation_name, e)
+            else:
+                LOGGER.debug(str(e), exc_info=True)
             self._queue_print_message(filename, failed=True,
                                       dryrun=self.parameters['dryrun'],
                                       error_message=str(e))
@@ -105,28 +155,177 @@ class BasicTask(OrderableTask):
             self._queue_print_message(filename, failed=False,
                                       dryrun=self.parameters['dryrun'])
 
+    def _perform_operation(self, filename):
+        getattr(filename, filename.operation_name)()
+
     def _queue_print_message(self, filename, failed, dryrun,
                              error_message=None):
         try:
             if filename.operation_name != 'list_objects':
-                message = print_operation(filename, failed,
-                                          self.parameters['dryrun'])
-                if error_message is not None:
-                    message += ' ' + error_message
+                # Nothing is printed in quiet mode, so the message is only
+                # formatted when it is going to be shown.
+                message = ''
+                if not self.parameters.get('quiet'):
+                    message = print_operation(filename, failed,
+                                              self.parameters['dryrun'])
+                    if error_message is not None:
+                        message += ' ' + error_message
                 result = {'message': message, 'error': failed}
                 self.result_queue.put(PrintTask(**result))
         except Exception as e:
             LOGGER.debug('%s' % str(e))
 
 
+class UploadStreamTask(BasicTask):
+    """Upload data read from stdin that fits in a single PutObject.
+
+    The payload was read into memory before the task was created, so
+    its memory is accounted for by whoever read it.  ``on_done``, if
+    given, is called once the payload is no longer needed.
+
+    """
+    def __init__(self, session, filename, parameters, result_queue,
+                 payload, on_done=None, retry_policy=None):
+        super(UploadStreamTask, self).__init__(
+            session, filename, parameters, result_queue, retry_policy)
+        self._payload = payload
+        self._on_done = on_done
+
+    def memory_needed(self):
+        return 0
+
+    def __call__(self):
+        try:
+            super(UploadStreamTask, self).__call__()
+        finally:
+            self._payload = None
+            if self._on_done is not None:
+                self._on_done()
+
+    def _perform_operation(self, filename):
+        filename.upload(payload=self._payload)
+
+
+class CopyObjectTask(BasicTask):
+    """Copy, or move, an object with a single CopyObject request.
+
+    ``on_copied`` is called with the size of the object and the number
+    of seconds the copy took.
+
+    """
+    def __init__(self, session, filename, parameters, result_queue,
+                 on_copied, retry_policy=None):
+        super(CopyObjectTask, self).__init__(
+            session, filename, parameters, result_queue, retry_policy)
+        self._on_copied = on_copied
+
+    def _perform_operation(self, filename):
+        start_time = time.time()
+        filename.copy()
+        self._on_copied(filename.size, time.time() - start_time)
+        if filename.operation_name == 'move':
+            filename.delete()
+
+
+class RelayObjectTask(BasicTask):
+    """Copy, or move, an object by downloading and uploading it."""
+    def memory_needed(self):
+        return buffered_body_size(self.filename.size)
+
+    def _perform_operation(self, filename):
+        filename.relay()
+        if filename.operation_name == 'move':
+            filename.delete()
+
+
+class DeleteObjectsTask(OrderableTask):
+    """Delete a batch of objects in a bucket with a single DeleteObjects.
+
+    ``filenames`` are the ``FileInfo`` objects of the objects to delete,
+    which must all be in the same bucket.  A result is queued for every
+    object, including any per-key error returned by S3.
+    """
+    def __init__(self, filenames, parameters, result_queue,
+                 retry_policy=None):
+        self._filenames = filenames
+        self._parameters = parameters
+        self._result_queue = result_queue
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self._retry_policy = retry_policy
+
+    def __call__(self):
+        try:
+            errors = self._retry_policy.call(self._delete_objects,
+                                             description='DeleteObjects')
+        except Exception as e:
+            if is_retryable(e):
+                # We've run out of retries.
+                LOGGER.debug("DeleteObjects failure: %s", e)
+            else:
+                LOGGER.debug(str(e), exc_info=True)
+            self._queue_results(str(e), {})
+        else:
+            self._queue_results(None, errors)
+
+    def _delete_objects(self):
+        first = self._filenames[0]
+        bucket = find_bucket_key(first.src)[0]
+        objects = [{'Key': find_bucket_key(filename.src)[1]}
+                   for filename in self._filenames]
+        params = {'endpoint': first.source_endpoint, 'bucket': bucket,
+                  'delete': {'Objects': objects, 'Quiet': True}}
+        # This doesn't use operate() because the errors of individual
+        # keys are returned in the same 'Errors' list as request errors.
+        operation = get_operation(first.service, 'DeleteObjects')
+        http, response_data = operation.call(**params)
+        errors = {}
+        for error in response_data.get('Errors', []):
+            if 'Key' not in error:
+                raise Exception("Error: %s\n" % error['Message'])
+            errors[error['Key']] = error
+        if http.status_code >= 300:
+            raise Exception("Error: DeleteObjects failed with status %s" %
+                            http.status_code)
+        return errors
+
+    def _queue_results(self, batch_error, key_errors):
+        quiet = self._parameters.get('quiet')
+        for filename in self._filenames:
+            error_message = batch_error
+            key = find_bucket_key(filename.src)[1]
+            if key in key_errors:
+                error = key_errors[key]
+                error_message = '%s: %s' % (error.get('Code'),
+                                            error.get('Message'))
+            failed = error_message is not None
+            if quiet:
+                # Nothing is printed, only the errors are counted.
+                if failed:
+                    self._result_queue.put(PrintTask(message='', error=True))
+                continue
+            message = print_operation(filename, failed,
+                                      self._parameters['dryrun'])
+            if failed:
+                message += ' ' + error_message
+            self._result_queue.put(PrintTask(message=message, error=failed))
+
+
 class CopyPartTask(OrderableTask):
     def __init__(self, part_number, chunk_size,
-                 result_queue, upload_context, filename):
+                 result_queue, upload_context, filename, on_copied=None,
+                 retry_policy=None):
         self._result_queue = result_queue
         self._upload_context = upload_context
         self._part_number = part_number
         self._chunk_size = chunk_size
         self._filename = filename
+        # Called with the size of the part and the number of seconds
+        # the UploadPartCopy request took.
+        self._on_copied = on_copied
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self._retry_policy = retry_policy
 
     def _is_last_part(self, part_number):
         return self._part_number == int(
@@ -136,6 +335,9 @@ class CopyPartTask(OrderableTask):
         return int(math.ceil(
             self._filename.size / float(self._chunk_size)))
 
+    def schedule_info(self):
+        return _schedule_info(self._filename, self._chunk_size)
+
     def __call__(self):
         LOGGER.debug("Uploading part copy %s for filename: %s",
                      self._part_number, self._filename.src)
@@ -157,8 +359,16 @@ class CopyPartTask(OrderableTask):
                       'upload_id': upload_id,
                       'copy_source': '%s/%s' % (src_bucket, src_key),
                       'copy_source_range': range_param}
-            response_data, http = operate(
-                self._filename.service, 'UploadPartCopy', params)
+            start_time = time.time()
+            response_data, http = self._retry_policy.call(
+                partial(operate, self._filename.service, 'UploadPartCopy',
+                        params),
+                description='copy of part %s of %s' % (self._part_number,
+                                                       self._filename.src),
+                is_cancelled=self._upload_context.is_cancelled)
+            if self._on_copied is not None:
+                self._on_copied(end_range - start_range + 1,
+                                time.time() - start_time)
             etag = response_data['CopyPartResult']['ETag'][1:-1]
             self._upload_context.announce_finished_part(
                 etag=etag, part_number=self._part_number)
@@ -196,12 +406,15 @@ class UploadPartTask(OrderableTask):
     object.
     """
     def __init__(self, part_number, chunk_size,
-                 result_queue, upload_context, filename):
+                 result_queue, upload_context, filename, retry_policy=None):
         self._result_queue = result_queue
         self._upload_context = upload_context
         self._part_number = part_number
         self._chunk_size = chunk_size
         self._filename = filename
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self._retry_policy = retry_policy
 
     def _read_part(self):
         actual_filename = self._filename.src
@@ -209,6 +422,19 @@ class UploadPartTask(OrderableTask):
         starting_byte = in_file_part_number * self._chunk_size
         return ReadFileChunk(actual_filename, starting_byte, self._chunk_size)
 
+    def _create_body(self, params):
+        part = self._read_part()
+        return add_hashing_body(params, part, len(part))
+
+    def _total_parts(self):
+        return int(math.ceil(self._filename.size/float(self._chunk_size)))
+
+    def schedule_info(self):
+        return _schedule_info(self._filename, self._chunk_size)
+
+    def memory_needed(self):
+        return buffered_body_size(self._chunk_size)
+
     def __call__(self):
         LOGGER.debug("Uploading part %s for filename: %s",
                      self._part_number, self._filename.src)
@@ -216,20 +442,18 @@ class UploadPartTask(OrderableTask):
             LOGGER.debug("Waiting for upload id.")
             upload_id = self._upload_context.wait_for_upload_id()
             bucket, key = find_bucket_key(self._filename.dest)
-            total = int(math.ceil(
-                self._filename.size/float(self._chunk_size)))
-            body = self._read_part()
+            total = self._total_parts()
             params = {'endpoint': self._filename.endpoint,
                       'bucket': bucket, 'key': key,
                       'part_number': self._part_number,
-                      'upload_id': upload_id,
-                      'body': body}
-            try:
-                response_data, http = operate(
-                    self._filename.service, 'UploadPart', params)
-            finally:
-                body.close()
-            etag = response_data['ETag'][1:-1]
+                      'upload_id': upload_id}
+            # Each attempt creates a new body, a part relayed from
+            # another object can only be read once.
+            etag = self._retry_policy.call(
+                partial(self._upload_part, params),
+                description='upload of part %s of %s' % (self._part_number,
+                                                         self._filename.src),
+                is_cancelled=self._upload_context.is_cancelled)
             self._upload_context.announce_finished_part(
                 etag=etag, part_number=self._part_number)
 
@@ -255,11 +479,92 @@ class UploadPartTask(OrderableTask):
             LOGGER.debug("Part number %s completed for filename: %s",
                          self._part_number, self._filename.src)
 
+    def _upload_part(self, params):
+        params = dict(params)
+        body = self._create_body(params)
+        try:
+            response_data, http = operate(
+                self._filename.service, 'UploadPart', params)
+            md5_hexdigest = body.hexdigest()
+        finally:
+            body.close()
+        etag = response_data['ETag'][1:-1]
+        check_md5_etag(etag, md5_hexdigest)
+        return etag
+
+
+class UploadStreamPartTask(UploadPartTask):
+    """Upload a part of a stream read from stdin.
+
+    The part is held in memory until it is uploaded.  ``on_done`` is
+    called once the part no longer needs its memory, whether or not the
+    upload succeeded, so the reader of the stream can read another part.
+
+    """
+    def __init__(self, part_number, chunk_size, result_queue,
+                 upload_context, filename, payload, on_done,
+                 retry_policy=None):
+        super(UploadStreamPartTask, self).__init__(
+            part_number, chunk_size, result_queue, upload_context, filename,
+            retry_policy)
+        self._payload = payload
+        self._on_done = on_done
+
+    def _create_body(self, params):
+        return add_hashing_body(params, BytesIO(self._payload),
+                                len(self._payload))
+
+    def _total_parts(self):
+        # The size of a stream isn't known until all of it has been read.
+        return '...'
+
+    def memory_needed(self):
+        # The payload is accounted for by the reader of the stream, and
+        # buffering it for the request doesn't copy it.
+        return 0
+
+    def __call__(self):
+        try:
+            super(UploadStreamPartTask, self).__call__()
+        finally:
+            self._payload = None
+            self._on_done()
+
+
+class RelayPartTask(UploadPartTask):
+    """Copy a part of an object by downloading and uploading it.
+
+    The part is downloaded from the ``source_endpoint`` of the object
+    with a ranged GetObject, and its body is sent as the body of the
+    UploadPart request as it is received, so nothing is written to disk.
+    Parts small enough to be buffered for ``Content-MD5`` are read into
+    memory first.
+
+    """
+    def _create_body(self, params):
+        start_range = (self._part_number - 1) * self._chunk_size
+        end_range = min(start_range + self._chunk_size,
+                        self._filename.size) - 1
+        bucket, key = find_bucket_key(self._filename.src)
+        response_data, http = operate(
+            self._filename.service, 'GetObject',
+            {'endpoint': self._filename.source_endpoint, 'bucket': bucket,
+             'key': key, 'range': 'bytes=%s-%s' % (start_range, end_range)})
+        return add_hashing_body(
+            params, StreamingBodyReader(response_data['Body']),
+            end_range - start_range + 1)
+
 
 class CreateLocalFileTask(OrderableTask):
-    def __init__(self, context, filename):
+    def __init__(self, context, filename, partial_filename=None):
         self._context = context
         self._filename = filename
+        # When a download can be resumed, parts are written to this file,
+        # which keeps the parts written by previous attempts.
+        self._partial_filename = partial_filename
+
+    def schedule_info(self):
+        return _schedule_info(self._filename, 0)
 
     def __call__(self):
         dirname = os.path.dirname(self._filename.dest)
@@ -274,38 +579,55 @@ class CreateLocalFileTask(OrderableTask):
                     # can move on.
                     pass
             # Always create the file.  Even if it exists, we need to
-            # wipe out the existing contents.
-            with open(self._filename.dest, 'wb'):
-                pass
+            # wipe out the existing contents.  The file is preallocated
+            # to its final size so every part can be written in place.
+            if self._partial_filename is None:
+                file_writer = PositionalFileWriter(self._filename.dest,
+                                                   self._filename.size)
+            else:
+                file_writer = PositionalFileWriter(self._partial_filename,
+                                                   self._filename.size,
+                                                   truncate=False)
         except Exception as e:
             self._context.cancel()
         else:
-            self._context.announce_file_created()
+            self._context.announce_file_created(file_writer)
 
 
 class CompleteDownloadTask(OrderableTask):
-    def __init__(self, context, filename, result_queue, params, io_queue):
+    def __init__(self, context, filename, result_queue, params,
+                 partial_filename=None):
         self._context = context
         self._filename = filename
         self._result_queue = result_queue
         self._parameters = params
-        self._io_queue = io_queue
+        self._partial_filename = partial_filename
+
+    def schedule_info(self):
+        return _schedule_info(self._filename, 0)
 
     def __call__(self):
         # When the file is downloading, we have a few things we need to do:
-        # 1) Fix up the last modified time to match s3.
-        # 2) Tell the result_queue we're done.
-        # 3) Queue an IO request to the IO thread letting it know we're
-        #    done with the file.
+        # 1) Flush the file to disk and close it.  This is the only
+        #    fsync for the whole download.
+        # 2) Fix up the last modified time to match s3.
+        # 3) Rename a resumable download into place.
+        # 4) Tell the result_queue we're done.
         self._context.wait_for_completion()
+        self._context.close_file(fsync=True)
+        local_filename = self._filename.dest
+        if self._partial_filename is not None:
+            local_filename = self._partial_filename
         last_update_tuple = self._filename.last_update.timetuple()
         mod_timestamp = time.mktime(last_update_tuple)
-        os.utime(self._filename.dest, (int(mod_timestamp), int(mod_timestamp)))
+        os.utime(local_filename, (int(mod_timestamp), int(mod_timestamp)))
+        if self._partial_filename is not None:
+            replace_file(self._partial_filename, self._filename.dest)
+            self._context.discard_journal_entry()
         message = print_operation(self._filename, False,
                                   self._parameters['dryrun'])
         print_task = {'message': message, 'error': False}
         self._result_queue.put(PrintTask(**print_task))
-        self._io_queue.put(IOCloseRequest(self._filename.dest))
 
 
 class DownloadPartTask(OrderableTask):
@@ -320,17 +642,24 @@ class DownloadPartTask(OrderableTask):
     # Amount to read from response body at a time.
     ITERATE_CHUNK_SIZE = 1024 * 1024
     READ_TIMEOUT = 60
-    TOTAL_ATTEMPTS = 5
 
     def __init__(self, part_number, chunk_size, result_queue, service,
-                 filename, context, io_queue):
+                 filename, context, retry_policy=None):
         self._part_number = part_number
         self._chunk_size = chunk_size
         self._result_queue = result_queue
         self._filename = filename
         self._service = filename.service
         self._context = context
-        self._io_queue = io_queue
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self._retry_policy = retry_policy
+
+    def schedule_info(self):
+        return _schedule_info(self._filename, self._chunk_size)
+
+    def memory_needed(self):
+        return min(self._chunk_size, self.ITERATE_CHUNK_SIZE)
 
     def __call__(self):
         try:
@@ -344,8 +673,10 @@ class DownloadPartTask(OrderableTask):
 
     def _download_part(self):
         total_file_size = self._filename.size
+        total_parts = int(math.ceil(total_file_size /
+                                    float(self._chunk_size)))
         start_range = self._part_number * self._chunk_size
-        if self._part_number == int(total_file_size / self._chunk_size) - 1:
+        if self._part_number == total_parts - 1:
             end_range = ''
         else:
             end_range = start_range + self._chunk_size - 1
@@ -355,38 +686,42 @@ class DownloadPartTask(OrderableTask):
         bucket, key = find_bucket_key(self._filename.src)
         params = {'endpoint': self._filename.endpoint, 'bucket': bucket,
                   'key': key, 'range': range_param}
-        for i in range(self.TOTAL_ATTEMPTS):
-            try:
-                LOGGER.debug("Making GetObject requests with byte range: %s",
-                             range_param)
-                response_data, http = operate(self._service, 'GetObject',
-                                              params)
-                LOGGER.debug("Response received from GetObject")
-                body = response_data['Body']
-                self._queue_writes(body)
-                self._context.announce_completed_part(self._part_number)
-
-                message = print_operation(self._filename, 0)
-                total_parts = int(self._filename.size / self._chunk_size)
-                result = {'message': message, 'error': False,
-                          'total_parts': total_parts}
-                self._result_queue.put(PrintTask(**result))
-                LOGGER.debug("Task complete: %s", self)
-                return
-            except (socket.timeout, socket.error) as e:
-                LOGGER.debug("Socket timeout caught, retrying request, "
-                             "(attempt %s / %s)", i, self.TOTAL_ATTEMPTS,
-                             exc_info=True)
-                continue
-            except IncompleteReadError as e:
-                LOGGER.debug("Incomplete read detected: %s, (attempt %s / %s)",
-                             e, i, self.TOTAL_ATTEMPTS)
-                continue
-        raise RetriesExeededError("Maximum number of attempts exceeded: %s" %
-                                  self.TOTAL_ATTEMPTS)
-
-    def _queue_writes(self, body):
-        self._context.wait_for_file_created()
+        if self._context.is_journaled:
+            # Parts written by a previous run must come from the same
+            # version of the object.
+            params['if_match'] = '"%s"' % self._filename.etag
+        try:
+            self._retry_policy.call(
+                partial(self._get_part, params),
+                description='download of bytes %s of %s' % (
+                    range_param, self._filename.src),
+                is_cancelled=self._context.is_cancelled)
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            LOGGER.debug("Downloading bytes range %s failed: %s",
+                         range_param, e)
+            raise RetriesExeededError(
+                "Maximum number of attempts exceeded: %s" %
+                self._retry_policy.max_attempts)
+        self._context.announce_completed_part(self._part_number)
+        message = print_operation(self._filename, 0)
+        result = {'message': message, 'error': False,
+                  'total_parts': total_parts}
+        self._result_queue.put(PrintTask(**result))
+        LOGGER.debug("Task complete: %s", self)
+
+    def _get_part(self, params):
+        LOGGER.debug("Making GetObject requests with byte range: %s",
+                     params['range'])
+        response_data, http = operate(self._service, 'GetObject', params)
+        LOGGER.debug("Response received from GetObject")
+        self._write_body(response_data['Body'])
+
+    def _write_body(self, body):
+        # Each part writes its own byte range straight into the
+        # preallocated file, so parts never wait on a shared IO thread.
+        file_writer = self._context.wait_for_file_created()
         LOGGER.debug("Writing part number %s to file: %s",
                      self._part_number, self._filename.dest)
         iterate_chunk_size = self.ITERATE_CHUNK_SIZE
@@ -395,28 +730,106 @@ class DownloadPartTask(OrderableTask):
         current = body.read(iterate_chunk_size)
         while current:
             offset = self._part_number * self._chunk_size + amount_read
-            LOGGER.debug("Submitting IORequest to write queue.")
-            self._io_queue.put(IORequest(self._filename.dest, offset, current))
-            LOGGER.debug("Request successfully submitted.")
+            file_writer.write(offset, current)
             amount_read += len(current)
             current = body.read(iterate_chunk_size)
-        # Change log message.
-        LOGGER.debug("Done queueing writes for part number %s to file: %s",
+        LOGGER.debug("Done writing part number %s to file: %s",
                      self._part_number, self._filename.dest)
 
 
+class DownloadStreamPartTask(DownloadPartTask):
+    """Download a part of an object that is being written to stdout.
+
+    The part is read into memory and handed to an ``OrderedStreamWriter``,
+    which writes the parts to the stream in order.  The part waits for a
+    slot in the writer's window before it is requested, which bounds the
+    number of parts held in memory.
+
+    """
+    def __init__(self, part_number, chunk_size, result_queue, service,
+                 filename, context, stream_writer, retry_policy=None):
+        super(DownloadStreamPartTask, self).__init__(
+            part_number, chunk_size, result_queue, service, filename,
+            context, retry_policy)
+        self._stream_writer = stream_writer
+
+    def memory_needed(self):
+        # The part is held in a slot of the writer's window, which is
+        # accounted for when the writer is created.  Acquiring memory
+        # here could wait on parts that are waiting for this one.
+        return 0
+
+    def __call__(self):
+        if self._context.is_cancelled() or \
+                not self._stream_writer.wait_for_slot(self._part_number):
+            LOGGER.debug("Not downloading part, stream has been cancelled.")
+            return
+        try:
+            super(DownloadStreamPartTask, self).__call__()
+        except Exception:
+            self._stream_writer.cancel()
+            raise
+
+    def _write_body(self, body):
+        body.set_socket_timeout(self.READ_TIMEOUT)
+        chunks = []
+        current = body.read(self.ITERATE_CHUNK_SIZE)
+        while current:
+            chunks.append(current)
+            current = body.read(self.ITERATE_CHUNK_SIZE)
+        # The part is only handed to the writer once all of it has been
+        # read, so a retried request never writes partial data.
+        self._stream_writer.write(self._part_number, b''.join(chunks))
+
+
+class CompleteStreamDownloadTask(OrderableTask):
+    def __init__(self, context, filename, result_queue, params,
+                 stream_writer):
+        self._context = context
+        self._filename = filename
+        self._result_queue = result_queue
+        self._parameters = params
+        self._stream_writer = stream_writer
+
+    def schedule_info(self):
+        return _schedule_info(self._filename, 0)
+
+    def __call__(self):
+        try:
+            self._context.wait_for_completion()
+        except DownloadCancelledError:
+            self._stream_writer.cancel()
+            message = print_operation(self._filename, True,
+                                      self._parameters['dryrun'])
+            self._result_queue.put(PrintTask(message=message, error=True))
+            return
+        self._stream_writer.close()
+        message = print_operation(self._filename, False,
+                                  self._parameters['dryrun'])
+        self._result_queue.put(PrintTask(message=message, error=False))
+
+
 class CreateMultipartUploadTask(BasicTask):
     def __init__(self, session, filename, parameters, result_queue,
-                 upload_context):
+                 upload_context, retry_policy=None):
         super(CreateMultipartUploadTask, self).__init__(
-            session, filename, parameters, result_queue)
+            session, filename, parameters, result_queue, retry_policy)
         self._upload_context = upload_context
 
+    def schedule_info(self):
+        return _schedule_info(self.filename, 0)
+
+    def memory_needed(self):
+        return 0
+
     def __call__(self):
         LOGGER.debug("Creating multipart upload for file: %s",
                      self.filename.src)
         try:
-            upload_id = self.filename.create_multipart_upload()
+            upload_id = self.retry_policy.call(
+                self.filename.create_multipart_upload,
+                description='create multipart upload of %s' %
+                self.filename.src)
             LOGGER.debug("Announcing upload id: %s", upload_id)
             self._upload_context.announce_upload_id(upload_id)
         except Exception as e:
@@ -436,11 +849,14 @@ class RemoveRemoteObjectTask(OrderableTask):
         self._context = context
         self._filename = filename
 
+    def schedule_info(self):
+        return _schedule_info(self._filename, 0)
+
     def __call__(self):
         LOGGER.debug("Waiting for download to finish.")
         self._context.wait_for_completion()
         bucket, key = find_bucket_key(self._filename.src)
-        params = {'endpoint': self._filename.endpoint,
+        params = {'endpoint': self._filename.source_endpoint,
                   'bucket': bucket, 'key': key}
         response_data, http = operate(
             self._filename.service, 'DeleteObject', params)
@@ -448,11 +864,17 @@ class RemoveRemoteObjectTask(OrderableTask):
 
 class CompleteMultipartUploadTask(BasicTask):
     def __init__(self, session, filename, parameters, result_queue,
-                 upload_context):
+                 upload_context, retry_policy=None):
         super(CompleteMultipartUploadTask, self).__init__(
-            session, filename, parameters, result_queue)
+            session, filename, parameters, result_queue, retry_policy)
         self._upload_context = upload_context
 
+    def schedule_info(self):
+        return _schedule_info(self.filename, 0)
+
+    def memory_needed(self):
+        return 0
+
     def __call__(self):
         LOGGER.debug("Completing multipart upload for file: %s",
                      self.filename.src)
@@ -467,7 +889,12 @@ class CompleteMultipartUploadTask(BasicTask):
             'multipart_upload': {'Parts': parts},
         }
         try:
-            operate(self.filename.service, 'CompleteMultipartUpload', params)
+            response_data, http = self.retry_policy.call(
+                partial(operate, self.filename.service,
+                        'CompleteMultipartUpload', params),
+                description='complete multipart upload of %s' %
+                self.filename.src)
+            self._verify_etag(response_data.get('ETag'), parts)
         except Exception as e:
             LOGGER.debug("Error trying to complete multipart upload: %s",
                          e, exc_info=True)
@@ -479,6 +906,9 @@ class CompleteMultipartUploadTask(BasicTask):
                 'message': message,
                 'error': True
             }
+            # The tasks that run once the upload is finished, such as
+            # removing the local file of a move, must not go ahead.
+            self._upload_context.cancel_upload()
         else:
             LOGGER.debug("Multipart upload completed for: %s",
                          self.filename.src)
@@ -488,6 +918,19 @@ class CompleteMultipartUploadTask(BasicTask):
             self._upload_context.announce_completed()
         self.result_queue.put(PrintTask(**result))
 
+    def _verify_etag(self, etag, parts):
+        # Each part ETag has already been checked against the md5 of the
+        # data that was sent, so the ETag of the object can be checked
+        # against the one calculated from them.
+        if etag is None:
+            return
+        etag = etag[1:-1]
+        calculated_etag = calculate_multipart_etag_from_parts(parts)
+        if etag != calculated_etag:
+            raise MD5Error("Data was corrupted: the ETag of the uploaded "
+                           "parts, %s, does not match the ETag of the "
+                           "object, %s" % (calculated_etag, etag))
+
 
 class RemoveFileTask(BasicTask):
     def __init__(self, local_filename, upload_context):
@@ -521,6 +964,23 @@ class MultipartUploadContext(object):
     operations).  This context object provides the necessary building blocks
     to allow for the three stages to efficiently communicate with each other.
 
+    ``expected_parts`` may be None if the number of parts is not known
+    when the upload starts, as when uploading a stream.  It must then be
+    provided later with ``announce_total_parts``.
+
+    If a ``journal_entry`` is provided, the upload id and the finished
+    parts are recorded in it so the upload can be resumed later.  If the
+    journal entry already has an upload id, the context starts out with
+    that upload id and the parts recorded in the journal.
+
+    Tasks can be submitted to the executor to run once a stage is done
+    instead of waiting for it: ``upload_id_available``,
+    ``parts_finished`` and ``upload_finished`` are ``TaskDependency``
+    objects that are done once the upload id is announced, once every
+    part has finished and once the upload is complete.  They are also
+    done once the upload is cancelled, so the tasks waiting on them
+    find out that it was.
+
     This class is thread safe.
 
     """
@@ -530,30 +990,71 @@ class MultipartUploadContext(object):
     _CANCELLED = '_CANCELLED'
     _COMPLETED = '_COMPLETED'
 
-    def __init__(self, expected_parts):
+    def __init__(self, expected_parts, journal_entry=None):
         self._upload_id = None
         self._expected_parts = expected_parts
         self._parts = []
+        self._journal_entry = journal_entry
         self._lock = threading.Lock()
         self._upload_id_condition = threading.Condition(self._lock)
         self._parts_condition = threading.Condition(self._lock)
         self._upload_complete_condition = threading.Condition(self._lock)
         self._state = self._UNSTARTED
+        self.upload_id_available = TaskDependency()
+        self.parts_finished = TaskDependency()
+        self.upload_finished = TaskDependency()
+        if journal_entry is not None and \
+                journal_entry.get('upload_id') is not None:
+            self._upload_id = journal_entry.get('upload_id')
+            self._state = self._STARTED
+            for part_number, etag in sorted(journal_entry.parts.items()):
+                self._parts.append({'ETag': etag, 'PartNumber': part_number})
+            self.upload_id_available.set_done()
+            self._check_parts_finished()
+
+    @property
+    def is_journaled(self):
+        return self._journal_entry is not None
+
+    def save_journal_entry(self):
+        """Save the journaled parts that are not saved yet."""
+        if self._journal_entry is not None:
+            self._journal_entry.flush()
 
     def announce_upload_id(self, upload_id):
+        if self._journal_entry is not None:
+            self._journal_entry.update(upload_id=upload_id)
         with self._upload_id_condition:
             self._upload_id = upload_id
             self._state = self._STARTED
             self._upload_id_condition.notifyAll()
+        self.upload_id_available.set_done()
 
     def announce_finished_part(self, etag, part_number):
+        if self._journal_entry is not None:
+            self._journal_entry.record_part(part_number, etag)
         with self._parts_condition:
             self._parts.append({'ETag': etag, 'PartNumber': part_number})
             self._parts_condition.notifyAll()
+        self._check_parts_finished()
+
+    def announce_total_parts(self, expected_parts):
+        with self._parts_condition:
+            self._expected_parts = expected_parts
+            self._parts_condition.notifyAll()
+        self._check_parts_finished()
+
+    def _check_parts_finished(self):
+        with self._lock:
+            finished = self._expected_parts is not None and \
+                len(self._parts) >= self._expected_parts
+        if finished:
+            self.parts_finished.set_done()
 
     def wait_for_parts_to_finish(self):
         with self._parts_condition:
-            while len(self._parts) < self._expected_parts:
+            while self._expected_parts is None or \
+                    len(self._parts) < self._expected_parts:
                 if self._state == self._CANCELLED:
                     raise UploadCancelledError("Upload has been cancelled.")
                 self._parts_condition.wait(timeout=1)
@@ -603,6 +1104,15 @@ class MultipartUploadContext(object):
                     kwargs = {}
                 canceller(self._upload_id, *args, **kwargs)
             self._state = self._CANCELLED
+            self._upload_id_condition.notifyAll()
+            self._parts_condition.notifyAll()
+            self._upload_complete_condition.notifyAll()
+        self._set_dependencies_done()
+
+    def _set_dependencies_done(self):
+        self.upload_id_available.set_done()
+        self.parts_finished.set_done()
+        self.upload_finished.set_done()
 
     def in_progress(self):
         """Determines whether or not the multipart upload is in process.
@@ -632,13 +1142,22 @@ class MultipartUploadContext(object):
         This should be called after a CompleteMultipartUpload operation.
 
         """
+        if self._journal_entry is not None:
+            self._journal_entry.remove()
         with self._upload_complete_condition:
             self._state = self._COMPLETED
             self._upload_complete_condition.notifyAll()
+        self._set_dependencies_done()
 
 
 class MultipartDownloadContext(object):
+    """Context object for a ranged download.
 
+    ``file_created`` and ``download_finished`` are ``TaskDependency``
+    objects that are done once the local file has been created and once
+    every part has been downloaded, or once the download is cancelled.
+
+    """
     _STATES = {
         'UNSTARTED': 'UNSTARTED',
         'STARTED': 'STARTED',
@@ -646,7 +1165,7 @@ class MultipartDownloadContext(object):
         'CANCELLED': 'CANCELLED'
     }
 
-    def __init__(self, num_parts, lock=None):
+    def __init__(self, num_parts, lock=None, journal_entry=None):
         self.num_parts = num_parts
 
         if lock is None:
@@ -656,26 +1175,87 @@ class MultipartDownloadContext(object):
         self._completed_condition = threading.Condition(self._lock)
         self._state = self._STATES['UNSTARTED']
         self._finished_parts = set()
+        self._file_writer = None
+        self.file_created = TaskDependency()
+        self.download_finished = TaskDependency()
+        # If a journal entry is provided, finished parts are recorded in
+        # it, and the parts it already has are considered finished.
+        self._journal_entry = journal_entry
+        if journal_entry is not None:
+            self._finished_parts.update(journal_entry.parts)
+
+    @property
+    def is_journaled(self):
+        return self._journal_entry is not None
+
+    def discard_journal_entry(self):
+        if self._journal_entry is not None:
+            self._journal_entry.remove()
 
     def announce_completed_part(self, part_number):
+        if self._journal_entry is not None:
+            # The part must be on disk before the journal says it is.
+            self._journal_entry.record_part(part_number, None,
+                                            sync=self._sync_file)
         with self._completed_condition:
             self._finished_parts.add(part_number)
-            if len(self._finished_parts) == self.num_parts:
+            is_completed = len(self._finished_parts) == self.num_parts
+            if is_completed:
                 self._state = self._STATES['COMPLETED']
                 self._completed_condition.notifyAll()
+        if is_completed:
+            self.download_finished.set_done()
 
-    def announce_file_created(self):
+    def announce_file_created(self, file_writer=None):
         with self._created_condition:
+            self._file_writer = file_writer
             self._state = self._STATES['STARTED']
             self._created_condition.notifyAll()
+            is_completed = len(self._finished_parts) == self.num_parts
+            if is_completed:
+                # Every part was downloaded by a previous run.
+                self._state = self._STATES['COMPLETED']
+                self._completed_condition.notifyAll()
+        self.file_created.set_done()
+        if is_completed:
+            self.download_finished.set_done()
 
     def wait_for_file_created(self):
+        """Wait for the local file to be created.
+
+        :returns: The ``PositionalFileWriter`` parts should write to.
+
+        """
         with self._created_condition:
             while not self._state == self._STATES['STARTED']:
                 if self._state == self._STATES['CANCELLED']:
                     raise DownloadCancelledError(
                         "Download has been cancelled.")
                 self._created_condition.wait(timeout=1)
+            return self._file_writer
+
+    def save_journal_entry(self):
+        """Save the journaled parts, once the file has been synced."""
+        if self._journal_entry is not None:
+            self._journal_entry.flush(sync=self._sync_file)
+
+    def _sync_file(self):
+        with self._lock:
+            file_writer = self._file_writer
+        if file_writer is not None:
+            file_writer.sync()
+
+    def close_file(self, fsync=False):
+        """Close the local file, waiting for any in progress writes.
+
+        It is safe to call this more than once.
+
+        """
+        with self._lock:
+            file_writer = self._file_writer
+            self._file_writer = None
+        if file_writer is not None:
+            file_writer.close(fsync=fsync)
 
     def wait_for_completion(self):
         with self._completed_condition:
@@ -688,6 +1268,10 @@ class MultipartDownloadContext(object):
     def cancel(self):
         with self._lock:
             self._state = self._STATES['CANCELLED']
+            self._created_condition.notifyAll()
+            self._completed_condition.notifyAll()
+        self.file_created.set_done()
+        self.download_finished.set_done()
 
     def is_cancelled(self):
         with self._lock:
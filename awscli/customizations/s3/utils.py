@@ -11,23 +11,36 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 import argparse
+import base64
+import binascii
 from datetime import datetime
 import mimetypes
 import hashlib
+import heapq
+import itertools
 import math
 import os
 import sys
+import threading
+import weakref
 from collections import namedtuple, deque
 from functools import partial
 
+import six
 from six import PY3
 from six.moves import queue
 from dateutil.parser import parse
 from dateutil.tz import tzlocal
 from botocore.compat import unquote_str
+from botocore.vendored.requests.adapters import HTTPAdapter
 
+from awscli.customizations.s3.concurrency import THROTTLING_ERROR_CODES
 from awscli.customizations.s3.constants import MAX_PARTS
+from awscli.customizations.s3.constants import MIN_UPLOAD_PART_SIZE
 from awscli.customizations.s3.constants import MAX_SINGLE_UPLOAD_SIZE
+from awscli.customizations.s3.constants import MAX_IN_MEMORY_UPLOAD_SIZE
+from awscli.customizations.s3.constants import MAX_LIST_CONCURRENCY
+from awscli.customizations.s3.constants import MAX_PREFETCH_SIZE
 
 
 class AppendFilter(argparse.Action):
@@ -60,6 +73,13 @@ class MD5Error(Exception):
     pass
 
 
+class ThrottlingError(Exception):
+    """
+    Exception for requests that S3 throttled, such as a 503 SlowDown.
+    """
+    pass
+
+
 class StablePriorityQueue(queue.Queue):
     """Priority queue that maintains FIFO order for same priority items.
 
@@ -73,35 +93,141 @@ class StablePriorityQueue(queue.Queue):
           value passed into the ``__init__``.  Objects with lower
           priority numbers are retrieved before objects with higher
           priority numbers.
-        * A relatively small max_priority should be chosen.  ``get()``
-          calls are O(max_priority).
 
     Any object that does not have a ``PRIORITY`` attribute or whose
     priority exceeds ``max_priority`` will be queued at the highest
     (least important) priority available.
 
+    The items are kept in a heap, so ``put()`` and ``get()`` are
+    O(log n).  A scheduling ``policy`` (see
+    awscli.customizations.s3.scheduling) can change the order of items
+    of the same priority, and hold back items that can't start yet.
+    Items that are handed out by ``get()`` must then be reported with
+    ``task_finished()`` once they are done.
+
     """
-    def __init__(self, maxsize=0, max_priority=20):
+    def __init__(self, maxsize=0, max_priority=20, policy=None):
         queue.Queue.__init__(self, maxsize=maxsize)
-        self.priorities = [deque([]) for i in range(max_priority + 1)]
         self.default_priority = max_priority
+        self._policy = policy
+        self._heap = []
+        self._counter = itertools.count()
+        # Entries the policy held back, as a heap per group.
+        self._held_back = {}
+        self._num_held_back = 0
 
     def _qsize(self):
-        size = 0
-        for bucket in self.priorities:
-            size += len(bucket)
-        return size
+        return len(self._heap) + self._num_held_back
 
     def _put(self, item):
         priority = min(getattr(item, 'PRIORITY', self.default_priority),
                         self.default_priority)
-        self.priorities[priority].append(item)
+        sort_key = ()
+        if self._policy is not None:
+            sort_key = self._policy.sort_key(item)
+        heapq.heappush(self._heap,
+                       (priority, sort_key, next(self._counter), item))
 
     def _get(self):
-        for bucket in self.priorities:
-            if not bucket:
-                continue
-            return bucket.popleft()
+        while self._heap:
+            held_back = self._first_held_back()
+            if held_back is not None and \
+                    held_back[0][0] < self._heap[0][0]:
+                # Never hand out a less important item, such as a request
+                # to shutdown, while a more important one is held back.
+                break
+            entry = heapq.heappop(self._heap)
+            if self._policy is None:
+                return entry[-1]
+            if self._policy.can_start(entry[-1]):
+                return self._start(entry)
+            group = self._policy.group(entry[-1])
+            heapq.heappush(self._held_back.setdefault(group, []), entry)
+            self._num_held_back += 1
+        # Everything left is held back, but nothing else is waiting.
+        entry, group = self._first_held_back()
+        heapq.heappop(self._held_back[group])
+        if not self._held_back[group]:
+            del self._held_back[group]
+        self._num_held_back -= 1
+        return self._start(entry)
+
+    def _first_held_back(self):
+        # Only the files that are over their limit have entries held
+        # back, and there are no more of those than there are workers.
+        first = None
+        for group, entries in self._held_back.items():
+            if first is None or entries[0] < first[0]:
+                first = (entries[0], group)
+        return first
+
+    def _start(self, entry):
+        self._policy.started(entry[-1], entry[1])
+        return entry[-1]
+
+    def task_finished(self, item):
+        """Let the policy know an item from ``get()`` is done."""
+        if self._policy is None:
+            return
+        with self.mutex:
+            self._policy.finished(item)
+            entries = self._held_back.pop(self._policy.group(item), [])
+            # The held back entries are checked again when they come up.
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._num_held_back -= len(entries)
+
+    def put_unbounded(self, item):
+        """Queue an item without waiting for room in the queue.
+
+        This is for items queued by the consumers of the queue, which
+        could otherwise all wait for room that only they can make.
+
+        """
+        with self.mutex:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class TaskDependency(object):
+    """Something a task can be scheduled to run after.
+
+    A dependency is done once ``set_done`` is called, after which it
+    stays done.  Callbacks added with ``add_done_callback`` are called
+    once, by the thread that sets the dependency done, or right away if
+    it already is.
+
+    This class is thread safe.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._is_done = False
+        self._callbacks = []
+
+    def is_done(self):
+        with self._lock:
+            return self._is_done
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._is_done:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set_done(self):
+        with self._lock:
+            if self._is_done:
+                return
+            self._is_done = True
+            callbacks = self._callbacks
+            self._callbacks = []
+        # The callbacks are called without the lock held, so they can
+        # check on this or other dependencies.
+        for callback in callbacks:
+            callback()
 
 
 def find_bucket_key(s3_path):
@@ -131,13 +257,15 @@ def split_s3_bucket_key(s3_path):
     return find_bucket_key(s3_path)
 
 
-def get_file_stat(path):
+def get_file_stat(path, stats=None):
     """
     This is a helper function that given a local path return the size of
-    the file in bytes and time of last modification.
+    the file in bytes and time of last modification.  ``stats`` is the
+    result of ``os.stat`` for the path, if it has already been made.
     """
     try:
-        stats = os.stat(path)
+        if stats is None:
+            stats = os.stat(path)
         update_time = datetime.fromtimestamp(stats.st_mtime, tzlocal())
     except (ValueError, IOError) as e:
         raise ValueError('Could not retrieve file stat of "%s": %s' % (
@@ -145,17 +273,14 @@ def get_file_stat(path):
     return stats.st_size, update_time
 
 
-def check_etag(etag, fileobj):
+def check_md5_etag(etag, md5_hexdigest):
     """
-    This fucntion checks the etag and the md5 checksum to ensure no
-    data was corrupted upon transfer.
+    This function checks the etag and the md5 checksum to ensure no
+    data was corrupted upon transfer.  Multipart etags are not an md5
+    of the object, so they are not checked.
     """
-    get_chunk = partial(fileobj.read, 1024 * 1024)
-    m = hashlib.md5()
-    for chunk in iter(get_chunk, b''):
-        m.update(chunk)
-    if '-' not in etag:
-        if etag != m.hexdigest():
+    if not is_multipart_etag(etag):
+        if etag != md5_hexdigest:
             raise MD5Error
 
 
@@ -168,7 +293,10 @@ def check_error(response_data):
         if 'Errors' in response_data:
             errors = response_data['Errors']
             for error in errors:
-                raise Exception("Error: %s\n" % error['Message'])
+                message = "Error: %s\n" % error['Message']
+                if error.get('Code') in THROTTLING_ERROR_CODES:
+                    raise ThrottlingError(message)
+                raise Exception(message)
 
 
 def create_warning(path, error_message):
@@ -183,13 +311,35 @@ def create_warning(path, error_message):
     return warning_message
 
 
+# The operations of each service, by name.  Looking an operation up
+# builds it from the service model, which is too slow to do per request.
+_OPERATION_CACHE = weakref.WeakKeyDictionary()
+_OPERATION_CACHE_LOCK = threading.Lock()
+
+
+def get_operation(service, name):
+    """
+    Get an operation of a service, reusing the operation object from
+    earlier calls.  Operation objects do not change once they are built,
+    so they can be shared between threads.
+    """
+    try:
+        return _OPERATION_CACHE[service][name]
+    except KeyError:
+        with _OPERATION_CACHE_LOCK:
+            operations = _OPERATION_CACHE.setdefault(service, {})
+            if name not in operations:
+                operations[name] = service.get_operation(name)
+            return operations[name]
+
+
 def operate(service, cmd, kwargs):
     """
     A helper function that universally calls any command by taking in the
     service, name of the command, and any additional parameters required in
     the call.
     """
-    operation = service.get_operation(cmd)
+    operation = get_operation(service, cmd)
     http_response, response_data = operation.call(**kwargs)
     check_error(response_data)
     return response_data, http_response
@@ -223,24 +373,54 @@ class MultiCounter(object):
         self.count = 0
 
 
-def uni_print(statement):
+def uni_print(statement, out_file=None):
     """
     This function is used to properly write unicode to stdout.  It
     ensures that the proper encoding is used if the statement is
     not in a version type of string.  The initial check is to
-    allow if ``sys.stdout`` does not use an encoding
+    allow if ``sys.stdout`` does not use an encoding.  The statement
+    is written to ``out_file`` instead of stdout if one is provided.
     """
-    encoding = getattr(sys.stdout, 'encoding', None)
+    if out_file is None:
+        out_file = sys.stdout
+    encoding = getattr(out_file, 'encoding', None)
     if encoding is not None and not PY3:
-        sys.stdout.write(statement.encode(sys.stdout.encoding))
+        out_file.write(statement.encode(out_file.encoding))
     else:
         try:
-            sys.stdout.write(statement)
+            out_file.write(statement)
         except UnicodeEncodeError:
             # Some file like objects like cStringIO will
             # try to decode as ascii.  Interestingly enough
             # this works with a normal StringIO.
-            sys.stdout.write(statement.encode('utf-8'))
+            out_file.write(statement.encode('utf-8'))
+
+
+def get_binary_stdin():
+    # On python3 the binary stream is under sys.stdin.buffer.
+    return getattr(sys.stdin, 'buffer', sys.stdin)
+
+
+def get_binary_stdout():
+    return getattr(sys.stdout, 'buffer', sys.stdout)
+
+
+def read_stream_chunk(stream, size):
+    """Read ``size`` bytes from a stream, or fewer at the end of it.
+
+    Pipes can return less data than requested from a single read, so
+    this keeps reading until it has ``size`` bytes or the stream ends.
+
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
 
 
 def guess_content_type(filename):
@@ -327,6 +507,407 @@ class ReadFileChunk(object):
         return iter([])
 
 
+def replace_file(src, dest):
+    """Rename ``src`` to ``dest``, replacing ``dest`` if it exists."""
+    try:
+        replace = os.replace
+    except AttributeError:
+        # python2 has no os.replace, and os.rename will not overwrite
+        # an existing file on Windows.
+        if os.name == 'nt' and os.path.exists(dest):
+            os.remove(dest)
+        replace = os.rename
+    replace(src, dest)
+
+
+class OrderedStreamWriter(object):
+    """Write parts that complete in any order to a stream in part order.
+
+    Parts are numbered from 0.  A part that completes before the parts
+    ahead of it is held in memory until it can be written.  To bound the
+    memory used, a part may only start once it is within ``window`` parts
+    of the next part to be written (``wait_for_slot``), so at most
+    ``window`` parts are ever being downloaded or held.
+
+    This class is thread safe.
+
+    """
+    def __init__(self, stream, window):
+        self._stream = stream
+        self._window = window
+        self._next_part = 0
+        self._pending = {}
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def wait_for_slot(self, part_number):
+        """Wait until ``part_number`` is allowed to start.
+
+        :returns: False if the writer was cancelled, True otherwise.
+
+        """
+        with self._condition:
+            while part_number >= self._next_part + self._window and \
+                    not self._cancelled:
+                self._condition.wait(1)
+            return not self._cancelled
+
+    def write(self, part_number, data):
+        with self._condition:
+            if self._cancelled:
+                return
+            self._pending[part_number] = data
+            while self._next_part in self._pending:
+                self._stream.write(self._pending.pop(self._next_part))
+                self._next_part += 1
+            self._condition.notify_all()
+
+    def cancel(self):
+        with self._condition:
+            self._cancelled = True
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._stream.flush()
+
+
+class PositionalFileWriter(object):
+    """Write data at arbitrary offsets of a file from many threads at once.
+
+    The file is created (or truncated) and preallocated to ``size`` bytes
+    when the writer is created.  If ``truncate`` is False an existing
+    file is opened without discarding its contents, which is how a
+    partially downloaded file is resumed.  On platforms that provide
+    ``os.pwrite`` each ``write`` is a single positional write on the
+    shared file descriptor, so threads never wait on each other.
+    Elsewhere the writes are serialized with a lock around a seek and
+    write.
+
+    Nothing is flushed until ``sync()`` or ``close()``, which waits for
+    any in progress writes and optionally performs a single ``fsync``.
+
+    """
+    def __init__(self, filename, size=None, truncate=True):
+        self.filename = filename
+        if not truncate and os.path.exists(filename):
+            self._fileobj = open(filename, 'r+b')
+        else:
+            self._fileobj = open(filename, 'wb')
+        if size:
+            self._fileobj.truncate(size)
+        self._fileno = self._fileobj.fileno()
+        self._use_pwrite = hasattr(os, 'pwrite')
+        self._lock = threading.Lock()
+        self._writes_done = threading.Condition(self._lock)
+        self._active_writes = 0
+        self._closed = False
+
+    def write(self, offset, data):
+        if not self._use_pwrite:
+            with self._lock:
+                self._check_closed()
+                self._fileobj.seek(offset)
+                self._fileobj.write(data)
+            return
+        with self._lock:
+            self._check_closed()
+            self._active_writes += 1
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self._fileno, view, offset)
+                view = view[written:]
+                offset += written
+        finally:
+            with self._writes_done:
+                self._active_writes -= 1
+                if not self._active_writes:
+                    self._writes_done.notify_all()
+
+    def sync(self):
+        """Make sure the writes that have returned are on disk.
+
+        Writes may continue while the file is synced.  Nothing is done
+        once the file is closed.
+
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._fileobj.flush()
+            # Keeps close() from closing the file while it is synced.
+            self._active_writes += 1
+        try:
+            os.fsync(self._fileno)
+        finally:
+            with self._writes_done:
+                self._active_writes -= 1
+                if not self._active_writes:
+                    self._writes_done.notify_all()
+
+    def _check_closed(self):
+        if self._closed:
+            raise ValueError("Cannot write to closed file: %s"
+                             % self.filename)
+
+    def close(self, fsync=False):
+        with self._writes_done:
+            if self._closed:
+                return
+            self._closed = True
+            while self._active_writes:
+                self._writes_done.wait()
+        if fsync:
+            self._fileobj.flush()
+            os.fsync(self._fileno)
+        self._fileobj.close()
+
+
+def is_multipart_etag(etag):
+    return '-' in etag
+
+
+def calculate_multipart_etag(part_md5_digests):
+    """Calculate the ETag S3 assigns to a multipart object.
+
+    :param part_md5_digests: The binary md5 digest of each part, in part
+        number order.
+    :returns: The md5 of the concatenated part digests, followed by a
+        ``-`` and the number of parts.
+
+    """
+    md5 = hashlib.md5(b''.join(part_md5_digests))
+    return '%s-%s' % (md5.hexdigest(), len(part_md5_digests))
+
+
+def calculate_multipart_etag_from_parts(parts):
+    """Calculate a multipart ETag from a CompleteMultipartUpload parts list.
+
+    The part ETags must be the md5 of each part, which is what S3
+    returns for UploadPart and UploadPartCopy.
+
+    """
+    parts = sorted(parts, key=lambda part: part['PartNumber'])
+    return calculate_multipart_etag(
+        [binascii.unhexlify(part['ETag']) for part in parts])
+
+
+def infer_part_size(size, etag, preferred_part_size=None):
+    """Infer the part size an object was uploaded with from its ETag.
+
+    A multipart ETag only records the number of parts, so the part size
+    is narrowed down to the sizes that produce that number of parts
+    from an object of ``size`` bytes.  ``preferred_part_size`` (the part
+    size this command would have uploaded the object with) is used if
+    it is one of them.  Otherwise the part size is only inferred when a
+    single whole number of MiB fits, as uploaders use MiB sized parts.
+
+    The part size is only a guess.  S3 doesn't record it (and doesn't
+    require every part to be the same size), so an ETag calculated with
+    it that doesn't match the ETag of the object doesn't mean the data
+    is different, only that it can't be verified.
+
+    :returns: The part size, or None if it can not be inferred.
+
+    """
+    if etag is None or not is_multipart_etag(etag):
+        return None
+    try:
+        num_parts = int(etag.rsplit('-', 1)[1])
+    except ValueError:
+        return None
+    if num_parts < 2:
+        return None
+    # ceil(size / part_size) == num_parts holds for these part sizes.
+    smallest = max(int(math.ceil(size / float(num_parts))),
+                   MIN_UPLOAD_PART_SIZE)
+    largest = (size - 1) // (num_parts - 1)
+    if smallest > largest:
+        return None
+    if preferred_part_size is not None and \
+            smallest <= preferred_part_size <= largest:
+        return preferred_part_size
+    mib = 1024 ** 2
+    smallest_mib = int(math.ceil(smallest / float(mib)))
+    if smallest_mib == largest // mib:
+        return smallest_mib * mib
+    return None
+
+
+class HashingReader(object):
+    """Compute the md5 of a request body while it is being sent.
+
+    ``HashingReader`` wraps a file like object positioned at the start of
+    the body and exposes ``size`` bytes of it.  There are two modes:
+
+        * Streaming (the default): the md5 is updated as the HTTP layer
+          reads the body, so the data is only read from disk once.
+        * Buffered (after calling ``buffer()``): the body is read into
+          memory up front.  This is needed to send a ``Content-MD5``
+          header, which has to be known before the body is sent.
+
+    botocore rewinds the body with ``seek(0)`` when it retries a request,
+    which resets the md5 in streaming mode.
+
+    """
+    def __init__(self, fileobj, size):
+        self._fileobj = fileobj
+        self._start_byte = fileobj.tell()
+        self._size = size
+        self._md5 = hashlib.md5()
+        self._amount_read = 0
+        self._buffer = None
+
+    def buffer(self):
+        data = self._fileobj.read(self._size)
+        self._md5 = hashlib.md5(data)
+        self._amount_read = len(data)
+        self._size = len(data)
+        self._buffer = six.BytesIO(data)
+
+    def read(self, amount=None):
+        if self._buffer is not None:
+            if amount is None:
+                return self._buffer.read()
+            return self._buffer.read(amount)
+        remaining = self._size - self._amount_read
+        if amount is None or amount > remaining:
+            amount = remaining
+        data = self._fileobj.read(amount)
+        self._md5.update(data)
+        self._amount_read += len(data)
+        return data
+
+    def seek(self, where):
+        if where != 0:
+            raise ValueError("HashingReader can only be rewound to the "
+                             "start of the body, not to: %s" % where)
+        if self._buffer is not None:
+            self._buffer.seek(0)
+            return
+        self._fileobj.seek(self._start_byte)
+        self._md5 = hashlib.md5()
+        self._amount_read = 0
+
+    def tell(self):
+        if self._buffer is not None:
+            return self._buffer.tell()
+        return self._amount_read
+
+    def hexdigest(self):
+        """The md5 of the entire body.
+
+        If the body has not been completely read, the rest of it is
+        read to finish the digest.
+
+        """
+        if self._buffer is None:
+            while self.read(1024 * 1024):
+                pass
+        return self._md5.hexdigest()
+
+    def base64_digest(self):
+        """The md5 of the entire body, suitable for ``Content-MD5``."""
+        self.hexdigest()
+        return base64.b64encode(self._md5.digest()).decode('utf-8')
+
+    def close(self):
+        self._fileobj.close()
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        # See ReadFileChunk.__iter__.
+        return iter([])
+
+
+class StreamingBodyReader(object):
+    """Read the body of a response as the body of another request.
+
+    This lets the body of a GetObject response be sent as an upload
+    body, through a ``HashingReader``, as it is received.  The body can
+    only be read once, so it can only be rewound before any of it has
+    been read: a retried request that would need it again fails instead
+    of sending part of the body.
+
+    """
+    READ_TIMEOUT = 60
+
+    def __init__(self, body):
+        self._body = body
+        self._amount_read = 0
+        set_socket_timeout = getattr(body, 'set_socket_timeout', None)
+        if set_socket_timeout is not None:
+            set_socket_timeout(self.READ_TIMEOUT)
+
+    def read(self, amount=None):
+        data = self._body.read(amount)
+        self._amount_read += len(data)
+        return data
+
+    def seek(self, where):
+        if where != self._amount_read:
+            raise ValueError("The body of a response can't be rewound once "
+                             "it has been read, the request can't be "
+                             "retried.")
+
+    def tell(self):
+        return self._amount_read
+
+    def close(self):
+        close = getattr(self._body, 'close', None)
+        if close is not None:
+            close()
+
+
+def set_max_pool_connections(endpoint, max_connections):
+    """Keep up to ``max_connections`` connections to a host open.
+
+    The HTTP session of an endpoint only keeps 10 connections to each
+    host open.  When more threads make requests at once, the connections
+    over that are closed after each request, so most requests have to
+    make a new connection and TLS handshake.
+
+    """
+    for prefix in ('https://', 'http://'):
+        endpoint.http_session.mount(
+            prefix, HTTPAdapter(pool_maxsize=max_connections))
+
+
+def add_hashing_body(params, fileobj, size):
+    """Set ``fileobj`` as the body of an upload request.
+
+    The body is wrapped in a ``HashingReader`` so its md5 is computed as
+    it is sent.  Small bodies are buffered in memory so the md5 can also
+    be sent as ``Content-MD5``, letting S3 reject corrupted data.
+
+    :returns: The ``HashingReader`` used as the body.
+
+    """
+    body = HashingReader(fileobj, size)
+    if size <= MAX_IN_MEMORY_UPLOAD_SIZE:
+        body.buffer()
+        params['content_md5'] = body.base64_digest()
+    params['body'] = body
+    return body
+
+
+def buffered_body_size(size):
+    """The number of bytes ``add_hashing_body`` holds in memory.
+
+    Bodies larger than ``MAX_IN_MEMORY_UPLOAD_SIZE`` are streamed from
+    their file instead.
+
+    """
+    if size <= MAX_IN_MEMORY_UPLOAD_SIZE:
+        return size
+    return 0
+
+
 def _date_parser(date_string):
     return parse(date_string).astimezone(tzlocal())
 
@@ -354,14 +935,249 @@ class BucketLister(object):
             for response, page in pages:
                 contents = page['Contents']
                 for content in contents:
-                    source_path = bucket + '/' + content['Key']
-                    size = content['Size']
-                    last_update = self._date_parser(content['LastModified'])
-                    yield source_path, size, last_update
+                    yield self._make_entry(bucket, content)
+
+    def _make_entry(self, bucket, content):
+        source_path = bucket + '/' + content['Key']
+        size = content['Size']
+        last_update = self._date_parser(content['LastModified'])
+        etag = content.get('ETag')
+        if etag is not None:
+            etag = etag[1:-1]
+        return source_path, size, last_update, etag
 
     def _decode_keys(self, parsed, **kwargs):
         for content in parsed['Contents']:
             content['Key'] = unquote_str(content['Key'])
+        # When listing with a delimiter, the common prefixes and the
+        # pagination token are urlencoded as well.
+        for common_prefix in parsed.get('CommonPrefixes', []):
+            common_prefix['Prefix'] = unquote_str(common_prefix['Prefix'])
+        if parsed.get('NextMarker'):
+            parsed['NextMarker'] = unquote_str(parsed['NextMarker'])
+
+
+class ParallelBucketLister(BucketLister):
+    """List keys in a bucket, listing parts of the key space concurrently.
+
+    The key space is partitioned by listing with a ``/`` delimiter: each
+    common prefix is a partition that is listed on its own, and so on
+    recursively.  Besides the partition being read, up to
+    ``max_concurrency`` of the partitions that come next are listed ahead
+    in background threads.  Keys are yielded in the same sorted order as
+    ``BucketLister``.
+
+    Common prefixes for which ``excludes_prefix`` returns True are not
+    listed at all.
+
+    """
+    DELIMITER = '/'
+
+    def __init__(self, operation, endpoint, date_parser=_date_parser,
+                 max_concurrency=MAX_LIST_CONCURRENCY, excludes_prefix=None):
+        super(ParallelBucketLister, self).__init__(operation, endpoint,
+                                                   date_parser)
+        self._max_concurrency = max_concurrency
+        self._excludes_prefix = excludes_prefix
+
+    def list_objects(self, bucket, prefix=None):
+        if prefix is None:
+            prefix = ''
+        # Partitions that have been started ahead, keyed by prefix.
+        partitions = {}
+        with ScopedEventHandler(self._operation.session,
+                                'after-call.s3.ListObjects',
+                                self._decode_keys,
+                                'BucketListerDecodeKeys'):
+            try:
+                for entry in self._list_partition(bucket, prefix,
+                                                  partitions):
+                    yield entry
+            finally:
+                for partition in partitions.values():
+                    partition.cancel()
+
+    def _list_partition(self, bucket, prefix, partitions):
+        partition = partitions.pop(prefix, None)
+        if partition is None:
+            partition = self._start_partition(bucket, prefix)
+        try:
+            for page in partition.pages():
+                self._start_partitions_ahead(bucket, page, partitions)
+                for is_prefix, value in page:
+                    if is_prefix:
+                        if self._is_excluded(value):
+                            continue
+                        # All the keys under a common prefix sort together,
+                        # right where the prefix itself sorts.
+                        for entry in self._list_partition(bucket, value,
+                                                          partitions):
+                            yield entry
+                    else:
+                        yield self._make_entry(bucket, value)
+        finally:
+            partition.cancel()
+
+    def _start_partitions_ahead(self, bucket, page, partitions):
+        for is_prefix, value in page:
+            if len(partitions) >= self._max_concurrency:
+                return
+            if is_prefix and value not in partitions and \
+                    not self._is_excluded(value):
+                partitions[value] = self._start_partition(bucket, value)
+
+    def _is_excluded(self, prefix):
+        return self._excludes_prefix is not None and \
+            self._excludes_prefix(prefix)
+
+    def _start_partition(self, bucket, prefix):
+        partition = _PartitionListerThread(
+            self._operation, self._endpoint, bucket, prefix, self.DELIMITER)
+        partition.start()
+        return partition
+
+
+class _PartitionListerThread(threading.Thread):
+    """List the keys and common prefixes directly under a prefix.
+
+    Each page is queued as a sorted list of ``(is_prefix, value)`` pairs,
+    where ``value`` is either the common prefix or the ``Contents`` entry
+    of a key.  Only a few pages are queued ahead of the reader.
+
+    """
+    MAX_QUEUED_PAGES = 4
+
+    def __init__(self, operation, endpoint, bucket, prefix, delimiter):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._operation = operation
+        self._endpoint = endpoint
+        self._bucket = bucket
+        self._prefix = prefix
+        self._delimiter = delimiter
+        self._pages = queue.Queue(maxsize=self.MAX_QUEUED_PAGES)
+        self._cancelled = threading.Event()
+
+    def run(self):
+        kwargs = {'bucket': self._bucket, 'delimiter': self._delimiter,
+                  'encoding_type': 'url'}
+        if self._prefix:
+            kwargs['prefix'] = self._prefix
+        try:
+            for response, page in self._operation.paginate(self._endpoint,
+                                                           **kwargs):
+                entries = [(False, content) for content in
+                           page.get('Contents', [])]
+                entries.extend((True, common_prefix['Prefix']) for
+                               common_prefix in page.get('CommonPrefixes', []))
+                entries.sort(key=self._sort_key)
+                if not self._put(entries):
+                    return
+        except Exception as e:
+            self._put(e)
+        else:
+            self._put(None)
+
+    def _sort_key(self, entry):
+        is_prefix, value = entry
+        if is_prefix:
+            return value
+        return value['Key']
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def pages(self):
+        while True:
+            item = self._pages.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class BackgroundGenerator(object):
+    """Run the generator of a command component in its own thread.
+
+    ``BackgroundGenerator`` wraps a component (anything with a ``call``
+    method that returns an iterator, such as a ``FileGenerator``) and has
+    the same interface.  The wrapped generator is consumed by a thread
+    that stays up to ``max_size`` items ahead of the reader, so a stage
+    that blocks, on a ListObjects request or on a full task queue, does
+    not hold up the stages on the other side of it.  Items are yielded in
+    the order they were generated, and an exception raised by the wrapped
+    generator is raised again by the reader.
+
+    """
+    def __init__(self, component, max_size=MAX_PREFETCH_SIZE):
+        self._component = component
+        self._max_size = max_size
+
+    def call(self, *args):
+        thread = _GeneratorThread(self._component.call(*args),
+                                  self._max_size)
+        thread.start()
+        try:
+            for item in thread.items():
+                yield item
+        finally:
+            thread.cancel()
+
+
+class _GeneratorThread(threading.Thread):
+    _DONE = object()
+
+    def __init__(self, generator, max_size):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._generator = generator
+        self._items = queue.Queue(maxsize=max_size)
+        self._cancelled = threading.Event()
+
+    def run(self):
+        try:
+            for item in self._generator:
+                if not self._put((item, None)):
+                    return
+        except Exception:
+            self._put((self._DONE, sys.exc_info()))
+        else:
+            self._put((self._DONE, None))
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def items(self):
+        while True:
+            try:
+                # A timeout keeps the reader interruptible on python 2.
+                item, exc_info = self._items.get(timeout=1)
+            except queue.Empty:
+                continue
+            if exc_info is not None:
+                six.reraise(*exc_info)
+            if item is self._DONE:
+                return
+            yield item
+
+    def cancel(self):
+        self._cancelled.set()
 
 
 class ScopedEventHandler(object):
@@ -394,8 +1210,3 @@ class PrintTask(namedtuple('PrintTask',
         return super(PrintTask, cls).__new__(cls, message, error, total_parts,
                                              warning)
 
-
-IORequest = namedtuple('IORequest', ['filename', 'offset', 'data'])
-# Used to signal that IO for the filename is finished, and that
-# any associated resources may be cleaned up.
-IOCloseRequest = namedtuple('IOCloseRequest', ['filename'])
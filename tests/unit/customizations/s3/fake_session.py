@@ -118,6 +118,7 @@ class FakeOperation(object):
         op_dict = {'PutObject': self.put_object,
                    'CreateBucket': self.create_bucket,
                    'DeleteObject': self.delete_object,
+                   'DeleteObjects': self.delete_objects,
                    'DeleteBucket': self.delete_bucket,
                    'ListObjects': self.list_objects,
                    'ListBuckets': self.list_buckets,
@@ -221,6 +222,20 @@ class FakeOperation(object):
         response_data['ETag'] = '"%s"' % etag
         return FakeHttp(), response_data
 
+    def delete_objects(self, kwargs):
+        """
+        This operation deletes a list of s3 objects.  It sends an error
+        message if the specified bucket does not exist.
+        """
+        bucket = kwargs['bucket']
+        response_data = {}
+        if bucket in self.session.s3:
+            for obj in kwargs['delete']['Objects']:
+                self.session.s3[bucket].pop(obj['Key'], None)
+        else:
+            response_data['Errors'] = [{'Message': 'Bucket does not exist'}]
+        return FakeHttp(), response_data
+
     def copy_object(self, kwargs):
         """
         This operation copies one s3 object to another location in s3.
@@ -334,20 +349,28 @@ class FakeOperation(object):
             response_data['CommonPrefixes'] = []
         response_data['Contents'] = []
         objects = self.session.s3[bucket]
+        common_prefixes = set()
         for key in objects.keys():
             if key.startswith(prefix):
+                remainder = key[len(prefix):]
+                if delimiter and delimiter in remainder:
+                    # Keys past the delimiter are rolled up into a
+                    # common prefix, as S3 does.
+                    common_prefixes.add(
+                        prefix + remainder.split(delimiter)[0] + delimiter)
+                    continue
                 key_dict = {}
                 key_dict['Key'] = key
                 size = objects[key]['Size']
                 key_dict['Size'] = size
                 key_dict['LastModified'] = objects[key]['LastModified']
-                if key.endswith('/') and size == 0 and delimiter:
-                    prefix_dict = {}
-                    prefix_dict['Prefix'] = key
-                    response_data['CommonPrefixes'].append(prefix_dict)
                 response_data['Contents'].append(key_dict)
         response_data['Contents'] = sorted(response_data['Contents'],
                                            key=lambda k: k['Key'])
+        if delimiter:
+            response_data['CommonPrefixes'] = [
+                {'Prefix': common_prefix} for common_prefix
+                in sorted(common_prefixes)]
         response_data['ETag'] = '"%s"' % etag
         return FakeHttp(), response_data
 
@@ -0,0 +1,171 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import hashlib
+import os
+import shutil
+import tempfile
+
+import mock
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.checksums import calculate_checksums, \
+    HashCache, LocalChecksummer
+from awscli.customizations.s3.filegenerator import FileStat
+from awscli.customizations.s3.utils import calculate_multipart_etag
+
+
+class TestCalculateChecksums(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'file')
+        with open(self.filename, 'wb') as f:
+            f.write(b'abcdefghij')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_md5_only(self):
+        self.assertEqual(calculate_checksums(self.filename),
+                         (hashlib.md5(b'abcdefghij').hexdigest(), None))
+
+    def test_multipart_etag(self):
+        expected = calculate_multipart_etag(
+            [hashlib.md5(b'abcd').digest(), hashlib.md5(b'efgh').digest(),
+             hashlib.md5(b'ij').digest()])
+        md5_hexdigest, multipart_etag = calculate_checksums(self.filename, 4)
+        self.assertEqual(md5_hexdigest,
+                         hashlib.md5(b'abcdefghij').hexdigest())
+        self.assertEqual(multipart_etag, expected)
+
+
+class TestLocalChecksummer(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_filename = os.path.join(self.tempdir, 'cache.sqlite')
+        self.checksummer = LocalChecksummer(HashCache(self.cache_filename),
+                                            num_threads=2, lookahead=2)
+
+    def tearDown(self):
+        self.checksummer.close()
+        shutil.rmtree(self.tempdir)
+
+    def create_file_stat(self, name, contents, src_type='local'):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return FileStat(src=path, compare_key=name, size=len(contents),
+                        src_type=src_type)
+
+    def create_remote(self, file_stat, size=None):
+        if size is None:
+            size = file_stat.size
+        return FileStat(src='bucket/' + file_stat.compare_key,
+                        compare_key=file_stat.compare_key, size=size,
+                        src_type='s3', etag='etag')
+
+    def prefetch(self, src_files, dest_files):
+        src_files, dest_files = self.checksummer.prefetch(iter(src_files),
+                                                          iter(dest_files))
+        return list(src_files), list(dest_files)
+
+    def test_matched_local_files_are_yielded_in_order_with_md5(self):
+        contents = [('file%s' % i).encode('utf-8') for i in range(5)]
+        file_stats = [self.create_file_stat('file%s' % i, content)
+                      for i, content in enumerate(contents)]
+        remotes = [self.create_remote(file_stat) for file_stat in file_stats]
+        self.assertEqual(self.prefetch(file_stats, remotes),
+                         (file_stats, remotes))
+        self.assertEqual([file_stat.etag for file_stat in file_stats],
+                         [hashlib.md5(content).hexdigest()
+                          for content in contents])
+        self.assertEqual([remote.etag for remote in remotes],
+                         ['etag'] * 5)
+
+    def test_only_files_with_a_same_size_destination_are_hashed(self):
+        unmatched = self.create_file_stat('a', b'contents')
+        other_size = self.create_file_stat('b', b'contents')
+        same_size = self.create_file_stat('c', b'contents')
+        remotes = [self.create_remote(other_size, size=1),
+                   self.create_remote(same_size)]
+        src_files = [unmatched, other_size, same_size]
+        self.assertEqual(self.prefetch(src_files, remotes),
+                         (src_files, remotes))
+        self.assertIsNone(unmatched.etag)
+        self.assertIsNone(other_size.etag)
+        self.assertEqual(same_size.etag,
+                         hashlib.md5(b'contents').hexdigest())
+
+    def test_local_destinations_are_hashed(self):
+        file_stat = self.create_file_stat('file', b'contents')
+        remote = self.create_remote(file_stat)
+        self.assertEqual(self.prefetch([remote], [file_stat]),
+                         ([remote], [file_stat]))
+        self.assertEqual(file_stat.etag,
+                         hashlib.md5(b'contents').hexdigest())
+
+    def test_unreadable_files_have_no_checksum(self):
+        file_stat = self.create_file_stat('file', b'contents')
+        os.remove(file_stat.src)
+        self.prefetch([file_stat], [self.create_remote(file_stat)])
+        self.assertIsNone(file_stat.etag)
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        file_stat = self.create_file_stat('file', b'contents')
+        remote = self.create_remote(file_stat)
+        self.prefetch([file_stat], [remote])
+        self.checksummer.close()
+        self.checksummer = LocalChecksummer(HashCache(self.cache_filename))
+        file_stat.etag = None
+        with mock.patch('awscli.customizations.s3.checksums.'
+                        'calculate_checksums') as calculate:
+            self.prefetch([file_stat], [remote])
+        self.assertFalse(calculate.called)
+        self.assertEqual(file_stat.etag,
+                         hashlib.md5(b'contents').hexdigest())
+
+    def test_changed_files_are_hashed_again(self):
+        file_stat = self.create_file_stat('file', b'contents')
+        remote = self.create_remote(file_stat)
+        self.prefetch([file_stat], [remote])
+        self.create_file_stat('file', b'changed!')
+        self.prefetch([file_stat], [remote])
+        self.assertEqual(file_stat.etag,
+                         hashlib.md5(b'changed!').hexdigest())
+
+    def test_multipart_etag_is_cached(self):
+        file_stat = self.create_file_stat('file', b'abcdefghij')
+        etag = self.checksummer.multipart_etag(file_stat, 4)
+        self.assertTrue(etag.endswith('-3'))
+        with mock.patch('awscli.customizations.s3.checksums.'
+                        'calculate_checksums') as calculate:
+            self.assertEqual(self.checksummer.multipart_etag(file_stat, 4),
+                             etag)
+        self.assertFalse(calculate.called)
+
+    def test_only_the_latest_multipart_etags_are_kept(self):
+        file_stats = [self.create_file_stat('file%s' % i, b'abcdefghij')
+                      for i in range(3)]
+        for file_stat in file_stats:
+            self.checksummer.multipart_etag(file_stat, 4)
+        with mock.patch('awscli.customizations.s3.checksums.'
+                        'calculate_checksums') as calculate:
+            calculate.return_value = ('md5', 'etag-3')
+            self.checksummer.multipart_etag(file_stats[2], 4)
+            self.assertFalse(calculate.called)
+            # Only the lookahead of 2 files is kept.
+            self.checksummer.multipart_etag(file_stats[0], 4)
+            self.assertTrue(calculate.called)
+
+
+if __name__ == "__main__":
+    unittest.main()
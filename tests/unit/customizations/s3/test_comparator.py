@@ -187,7 +187,7 @@ class ComparatorTest(unittest.TestCase):
                              dest_type='local', operation_name='')
         src_files.append(src_file)
         dest_files.append(dest_file)
-        dest_file.operation = 'delete'
+        dest_file.operation_name = 'delete'
         ref_list.append(src_file)
         ref_list.append(dest_file)
         files = self.comparator.call(iter(src_files), iter(dest_files))
@@ -215,8 +215,8 @@ class ComparatorTest(unittest.TestCase):
                              dest_type='local', operation_name='')
         src_files.append(src_file)
         dest_files.append(dest_file)
-        src_file.operation = 'upload'
-        dest_file.operation = 'delete'
+        src_file.operation_name = 'upload'
+        dest_file.operation_name = 'delete'
         ref_list.append(dest_file)
         ref_list.append(src_file)
         files = self.comparator.call(iter(src_files), iter(dest_files))
@@ -239,7 +239,7 @@ class ComparatorTest(unittest.TestCase):
                              last_update=time, src_type='s3',
                              dest_type='local', operation_name='')
         dest_files.append(dest_file)
-        dest_file.operation = 'delete'
+        dest_file.operation_name = 'delete'
         ref_list.append(dest_file)
         files = self.comparator.call(iter(src_files), iter(dest_files))
         for filename in files:
@@ -420,5 +420,85 @@ class ComparatorExactTimestampsTest(unittest.TestCase):
         self.assertEqual(sum(1 for _ in files), 1)
 
 
+class FakeChecksummer(object):
+    def __init__(self, multipart_etags=None):
+        self.multipart_etags = multipart_etags or {}
+
+    def prefetch(self, src_files, dest_files):
+        return src_files, dest_files
+
+    def multipart_etag(self, file_stat, part_size):
+        return self.multipart_etags.get(part_size)
+
+
+class ComparatorChecksumTest(unittest.TestCase):
+    def setUp(self):
+        self.checksummer = FakeChecksummer()
+        self.comparator = Comparator({}, self.checksummer)
+        self.older = datetime.datetime.now()
+        self.newer = self.older + datetime.timedelta(hours=1)
+
+    def sync(self, src_etag, dest_etag, src_type='local', dest_type='s3',
+             size=10):
+        operation_name = {'locals3': 'upload', 's3s3': 'copy',
+                          's3local': 'download'}[src_type + dest_type]
+        src_file = FileStat(src='', dest='', compare_key='test.py',
+                            size=size, last_update=self.newer,
+                            src_type=src_type, dest_type=dest_type,
+                            operation_name=operation_name, etag=src_etag)
+        dest_file = FileStat(src='', dest='', compare_key='test.py',
+                             size=size, last_update=self.older,
+                             src_type=dest_type, dest_type=src_type,
+                             operation_name='', etag=dest_etag)
+        return list(self.comparator.call(iter([src_file]),
+                                          iter([dest_file])))
+
+    def test_same_md5_is_not_synced(self):
+        # The source is newer, but the contents are the same.
+        self.assertEqual(self.sync('abc', 'abc'), [])
+
+    def test_different_md5_is_synced(self):
+        self.assertEqual(len(self.sync('abc', 'def')), 1)
+
+    def test_falls_back_to_time_without_checksum(self):
+        self.assertEqual(len(self.sync(None, 'abc')), 1)
+
+    def test_different_sizes_are_synced(self):
+        src_file = FileStat(src='', dest='', compare_key='test.py',
+                            size=11, last_update=self.older,
+                            src_type='local', dest_type='s3',
+                            operation_name='upload', etag='abc')
+        dest_file = FileStat(src='', dest='', compare_key='test.py',
+                             size=10, last_update=self.newer,
+                             src_type='s3', dest_type='local',
+                             operation_name='', etag='abc')
+        files = self.comparator.call(iter([src_file]), iter([dest_file]))
+        self.assertEqual(len(list(files)), 1)
+
+    def test_multipart_etag_is_calculated_for_inferred_part_size(self):
+        size = 20 * 1024 * 1024
+        self.checksummer.multipart_etags[7 * 1024 * 1024] = 'abc-3'
+        self.assertEqual(self.sync('md5', 'abc-3', size=size), [])
+        self.assertEqual(len(self.sync('md5', 'def-3', size=size)), 1)
+
+    def test_multipart_etag_mismatch_falls_back_to_time(self):
+        # The object may have been uploaded with parts of another size
+        # than the inferred one, so the files may still be the same.
+        size = 20 * 1024 * 1024
+        self.checksummer.multipart_etags[7 * 1024 * 1024] = 'abc-3'
+        self.older, self.newer = self.newer, self.older
+        self.assertEqual(self.sync('md5', 'def-3', size=size), [])
+
+    def test_download_compares_local_destination(self):
+        self.assertEqual(self.sync('abc', 'abc', src_type='s3',
+                                   dest_type='local'), [])
+
+    def test_copy_with_different_multipart_etags_falls_back_to_time(self):
+        self.assertEqual(len(self.sync('abc-2', 'def-3', src_type='s3',
+                                       dest_type='s3')), 1)
+        self.assertEqual(self.sync('abc-2', 'abc-2', src_type='s3',
+                                   dest_type='s3'), [])
+
+
 if __name__ == "__main__":
     unittest.main()
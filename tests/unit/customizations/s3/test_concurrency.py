@@ -0,0 +1,169 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import mock
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.concurrency import \
+    AdaptiveConcurrencyController, RequestMonitor, is_throttling_response
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveConcurrencyController(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = AdaptiveConcurrencyController(
+            min_threads=2, max_threads=8, initial_threads=4,
+            clock=self.clock)
+        self.targets = []
+        self.controller.add_listener(self.targets.append)
+
+    def fill_window(self, latency=0.1, num_bytes=1024, throttled=False):
+        for i in range(self.controller.SAMPLE_WINDOW):
+            self.clock.now += 0.01
+            self.controller.record_request(latency, num_bytes,
+                                           throttled=throttled)
+
+    def test_invalid_ranges(self):
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyController(min_threads=0, max_threads=4)
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyController(min_threads=5, max_threads=4)
+
+    def test_initial_threads_is_clamped(self):
+        controller = AdaptiveConcurrencyController(
+            min_threads=2, max_threads=4, initial_threads=10)
+        self.assertEqual(controller.target, 4)
+
+    def test_additive_increase(self):
+        self.fill_window()
+        self.assertEqual(self.controller.target, 5)
+        self.fill_window()
+        self.assertEqual(self.controller.target, 6)
+        self.assertEqual(self.targets, [5, 6])
+
+    def test_multiplicative_decrease_on_throttle(self):
+        self.fill_window(throttled=True)
+        self.assertEqual(self.controller.target, 2)
+        self.assertEqual(self.controller.num_throttled,
+                         self.controller.SAMPLE_WINDOW)
+
+    def test_decrease_on_latency_inflation(self):
+        self.fill_window(latency=0.1)
+        self.assertEqual(self.controller.target, 5)
+        self.fill_window(latency=1.0)
+        self.assertEqual(self.controller.target, 2)
+
+    def test_mixed_request_sizes_are_not_congestion(self):
+        part_size = 8 * 1024 * 1024
+        # Small requests alone set a low latency for small requests.
+        self.fill_window(latency=0.01, num_bytes=0)
+        self.assertEqual(self.controller.target, 5)
+        # Then windows mix them with parts that take much longer, at the
+        # same throughput for each size.
+        for num_parts in [10, 15, 5, 20]:
+            for i in range(self.controller.SAMPLE_WINDOW):
+                self.clock.now += 0.01
+                if i < num_parts:
+                    self.controller.record_request(0.8, part_size)
+                else:
+                    self.controller.record_request(0.01, 0)
+        self.assertEqual(sorted(self.targets), self.targets)
+        self.assertGreater(self.controller.target, 5)
+
+    def test_latency_is_compared_by_request_size(self):
+        self.fill_window(latency=0.1, num_bytes=0)
+        self.fill_window(latency=1.0, num_bytes=8 * 1024 * 1024)
+        self.assertEqual(self.controller.target, 6)
+        # Small requests got slower.
+        self.fill_window(latency=0.5, num_bytes=0)
+        self.assertEqual(self.controller.target, 3)
+
+    def test_hold_when_throughput_stops_improving(self):
+        self.fill_window(num_bytes=1024 * 1024)
+        self.assertEqual(self.controller.target, 5)
+        self.fill_window(num_bytes=1024)
+        self.assertEqual(self.controller.target, 5)
+
+    def test_never_exceeds_ceiling(self):
+        for i in range(10):
+            self.fill_window()
+        self.assertEqual(self.controller.target, 8)
+        self.assertEqual(self.controller.peak_threads, 8)
+
+    def test_back_off_cuts_concurrency_at_once(self):
+        self.controller.back_off()
+        self.assertEqual(self.controller.target, 2)
+        self.assertEqual(self.targets, [2])
+        # It never goes below the floor.
+        self.controller.back_off()
+        self.assertEqual(self.controller.target, 2)
+        self.assertEqual(self.targets, [2])
+
+    def test_summary(self):
+        self.fill_window()
+        self.assertIn('5 thread(s)', self.controller.summary())
+
+
+class TestRequestMonitor(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = mock.Mock()
+        self.monitor = RequestMonitor(self.controller, clock=self.clock)
+
+    def create_response(self, status_code=200, parsed=None):
+        http_response = mock.Mock()
+        http_response.status_code = status_code
+        http_response.headers = {'content-length': '10'}
+        http_response.request.headers = {'Content-Length': '5'}
+        return http_response, parsed or {}
+
+    def test_records_latency_and_bytes(self):
+        self.monitor.on_before_call()
+        self.clock.now = 2.0
+        self.monitor.on_needs_retry(response=self.create_response())
+        self.controller.record_request.assert_called_with(
+            latency=2.0, num_bytes=15, throttled=False)
+
+    def test_records_throttled_attempts(self):
+        self.monitor.on_before_call()
+        self.clock.now = 1.0
+        self.monitor.on_needs_retry(response=self.create_response(503))
+        self.clock.now = 3.0
+        self.monitor.on_needs_retry(response=self.create_response())
+        self.assertEqual(self.controller.record_request.call_args_list, [
+            mock.call(latency=1.0, num_bytes=15, throttled=True),
+            mock.call(latency=2.0, num_bytes=15, throttled=False)])
+
+    def test_ignores_exceptions(self):
+        self.monitor.on_before_call()
+        self.monitor.on_needs_retry(response=None,
+                                    caught_exception=Exception())
+        self.assertFalse(self.controller.record_request.called)
+
+
+class TestIsThrottlingResponse(unittest.TestCase):
+    def test_slow_down_error_code(self):
+        http_response = mock.Mock(status_code=200)
+        parsed = {'Errors': [{'Code': 'SlowDown'}]}
+        self.assertTrue(is_throttling_response(http_response, parsed))
+
+    def test_success_is_not_throttled(self):
+        http_response = mock.Mock(status_code=200)
+        self.assertFalse(is_throttling_response(http_response, {}))
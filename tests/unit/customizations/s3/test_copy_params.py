@@ -17,21 +17,12 @@ import re
 import copy
 
 from awscli.testutils import BaseAWSCommandParamsTest
+from awscli.customizations.s3.utils import HashingReader
 
 if sys.version_info[:2] == (2, 6):
     from StringIO import StringIO
 
 
-# file is gone in python3, so instead IOBase must be used.
-# Given this test module is the only place that cares about
-# this type check, we do the check directly in this test module.
-try:
-    file_type = file
-except NameError:
-    import io
-    file_type = io.IOBase
-
-
 class TestGetObject(BaseAWSCommandParamsTest):
 
     prefix = 's3 cp '
@@ -47,10 +38,12 @@ class TestGetObject(BaseAWSCommandParamsTest):
         # automatically add this here so each test doesn't need to specify
         # this header.
         result['headers']['Expect'] = '100-continue'
+        # Small uploads are sent with the md5 of test_copy_params_data.
+        result['headers']['Content-MD5'] = 'Eg6ool5dSHv2i19wlkQAGQ=='
         self.assert_params_for_cmd(cmdline, result, expected_rc=0,
                                    ignore_params=['payload'])
         self.assertIsInstance(self.last_params['payload'].getvalue(),
-                              file_type)
+                              HashingReader)
 
     def test_simple(self):
         cmdline = self.prefix
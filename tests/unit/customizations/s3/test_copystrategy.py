@@ -0,0 +1,77 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from awscli.testutils import unittest
+from awscli.customizations.s3.copystrategy import LatencyModel, \
+    CopyStrategy
+from awscli.customizations.s3.constants import MAX_SINGLE_UPLOAD_SIZE
+
+
+MB = 1024 ** 2
+
+
+class TestLatencyModel(unittest.TestCase):
+    def test_no_estimate_without_samples(self):
+        self.assertIsNone(LatencyModel().estimate(100))
+
+    def test_fits_overhead_and_rate(self):
+        model = LatencyModel()
+        for num_bytes in [0, 100, 200, 400]:
+            model.add(num_bytes, 1 + num_bytes / 100.0)
+        self.assertAlmostEqual(model.estimate(1000), 11)
+
+    def test_samples_of_one_size_use_average_rate(self):
+        model = LatencyModel()
+        model.add(100, 1)
+        model.add(100, 3)
+        self.assertAlmostEqual(model.estimate(200), 4)
+
+
+class TestCopyStrategy(unittest.TestCase):
+    def setUp(self):
+        self.strategy = CopyStrategy(multipart_threshold=32 * MB)
+
+    def test_single_copy_up_to_threshold(self):
+        self.assertFalse(self.strategy.use_multipart(32 * MB, 8 * MB, 10))
+
+    def test_multipart_copy_over_single_copy_limit(self):
+        self.assertTrue(self.strategy.use_multipart(
+            MAX_SINGLE_UPLOAD_SIZE + 1, 8 * MB, 0))
+
+    def test_max_single_copy_size_is_capped(self):
+        strategy = CopyStrategy(0, max_single_copy_size=10 ** 12)
+        self.assertEqual(strategy.max_single_copy_size,
+                         MAX_SINGLE_UPLOAD_SIZE)
+
+    def test_multipart_copy_when_threads_are_free(self):
+        self.assertTrue(self.strategy.use_multipart(512 * MB, 8 * MB, 10))
+
+    def test_single_copy_when_threads_are_busy(self):
+        self.assertFalse(self.strategy.use_multipart(512 * MB, 8 * MB, 0))
+
+    def test_measured_latency_changes_choice(self):
+        # Every request takes a second, however much it copies, so the
+        # fewer requests the better.
+        for i in range(100):
+            self.strategy.record_copy(0, 1.0)
+            self.strategy.record_copy(8 * MB, 1.0)
+        self.assertFalse(self.strategy.use_multipart(512 * MB, 8 * MB, 10))
+
+    def test_counts_choices(self):
+        self.strategy.use_multipart(MB, MB, 10)
+        self.strategy.use_multipart(MAX_SINGLE_UPLOAD_SIZE + 1, MB, 10)
+        self.assertEqual(self.strategy.num_single_copies, 1)
+        self.assertEqual(self.strategy.num_multipart_copies, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
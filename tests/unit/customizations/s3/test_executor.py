@@ -10,85 +10,124 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
-import os
-import tempfile
-import shutil
 import six
 from six.moves import queue
 
 import mock
 
-from awscli.testutils import unittest, temporary_file
-from awscli.customizations.s3.executor import IOWriterThread
-from awscli.customizations.s3.executor import ShutdownThreadRequest
+from awscli.testutils import unittest
 from awscli.customizations.s3.executor import Executor, PrintThread
-from awscli.customizations.s3.utils import IORequest, IOCloseRequest, \
-    PrintTask
+from awscli.customizations.s3.utils import PrintTask, TaskDependency
+from awscli.customizations.s3.memory import MemoryBudget
 
 
-class TestIOWriterThread(unittest.TestCase):
-
+class TestExecutorDependencies(unittest.TestCase):
     def setUp(self):
-        self.queue = queue.Queue()
-        self.io_thread = IOWriterThread(self.queue)
-        self.temp_dir = tempfile.mkdtemp()
-        self.filename = os.path.join(self.temp_dir, 'foo')
-        # Create the file, since IOWriterThread expects
-        # files to exist, we need to first creat the file.
-        open(self.filename, 'w').close()
-
-    def tearDown(self):
-        shutil.rmtree(self.temp_dir)
-
-    def test_handles_io_request(self):
-        self.queue.put(IORequest(self.filename, 0, b'foobar'))
-        self.queue.put(IOCloseRequest(self.filename))
-        self.queue.put(ShutdownThreadRequest())
-        self.io_thread.run()
-        with open(self.filename, 'rb') as f:
-            self.assertEqual(f.read(), b'foobar')
-
-    def test_out_of_order_io_requests(self):
-        self.queue.put(IORequest(self.filename, 6, b'morestuff'))
-        self.queue.put(IORequest(self.filename, 0, b'foobar'))
-        self.queue.put(IOCloseRequest(self.filename))
-        self.queue.put(ShutdownThreadRequest())
-        self.io_thread.run()
-        with open(self.filename, 'rb') as f:
-            self.assertEqual(f.read(), b'foobarmorestuff')
-
-    def test_multiple_files_in_queue(self):
-        second_file = os.path.join(self.temp_dir, 'bar')
-        open(second_file, 'w').close()
-        self.queue.put(IORequest(self.filename, 0, b'foobar'))
-        self.queue.put(IORequest(second_file, 0, b'otherstuff'))
-        self.queue.put(IOCloseRequest(second_file))
-        self.queue.put(IOCloseRequest(self.filename))
-        self.queue.put(ShutdownThreadRequest())
-
-        self.io_thread.run()
-        with open(self.filename, 'rb') as f:
-            self.assertEqual(f.read(), b'foobar')
-        with open(second_file, 'rb') as f:
-            self.assertEqual(f.read(), b'otherstuff')
-
-
-class TestExecutor(unittest.TestCase):
-    def test_shutdown_does_not_hang(self):
-        executor = Executor(2, queue.Queue(), False,
-                            10, queue.Queue(maxsize=1))
-        with temporary_file('rb+') as f:
+        self.executor = Executor(2, queue.Queue(), False, 10)
+        self.dependency = TaskDependency()
+        self.calls = []
+
+    def task(self, name):
+        def task():
+            self.calls.append(name)
+        task.PRIORITY = 10
+        return task
+
+    def test_task_held_until_dependencies_done(self):
+        other = TaskDependency()
+        self.executor.submit(self.task('held'),
+                             dependencies=[self.dependency, other])
+        self.assertEqual(self.executor.queue.qsize(), 0)
+        self.dependency.set_done()
+        self.assertEqual(self.executor.queue.qsize(), 0)
+        other.set_done()
+        self.assertEqual(self.executor.queue.qsize(), 1)
+
+    def test_task_queued_if_dependencies_already_done(self):
+        self.dependency.set_done()
+        self.executor.submit(self.task('ready'),
+                             dependencies=[self.dependency])
+        self.assertEqual(self.executor.queue.qsize(), 1)
+
+    def test_shutdown_waits_for_held_tasks(self):
+        self.executor.start()
+        # The task that the held task depends on sets it done when it runs.
+        self.executor.submit(self.task('held'),
+                             dependencies=[self.dependency])
+        self.executor.submit(lambda: self.dependency.set_done())
+        self.executor.initiate_shutdown()
+        self.executor.wait_until_shutdown()
+        self.assertEqual(self.calls, ['held'])
+
+    def test_shutdown_is_deferred_while_tasks_are_held(self):
+        self.executor.start()
+        self.executor.submit(self.task('held'),
+                             dependencies=[self.dependency])
+        self.executor.initiate_shutdown()
+        # No worker has been told to shutdown yet.
+        for thread in self.executor.threads_list:
+            thread.join(timeout=0.01)
+            self.assertTrue(thread.is_alive())
+        self.dependency.set_done()
+        self.executor.wait_until_shutdown()
+        self.assertEqual(self.calls, ['held'])
+
+    def test_immediate_shutdown_does_not_wait_for_held_tasks(self):
+        self.executor.start()
+        self.executor.submit(self.task('held'),
+                             dependencies=[self.dependency])
+        self.executor.initiate_shutdown(
+            priority=self.executor.IMMEDIATE_PRIORITY)
+        self.executor.wait_until_shutdown()
+        self.assertEqual(self.calls, [])
+
+
+class TestExecutorMemoryBudget(unittest.TestCase):
+    def test_memory_acquired_while_task_runs(self):
+        budget = MemoryBudget(100)
+        executor = Executor(2, queue.Queue(), False, 10,
+                            memory_budget=budget)
+        bytes_in_use = []
+
+        class Task(object):
+            PRIORITY = 10
+
+            def memory_needed(self):
+                return 30
+
+            def __call__(self):
+                bytes_in_use.append(budget.bytes_in_use)
+
+        executor.start()
+        executor.submit(Task())
+        executor.initiate_shutdown()
+        executor.wait_until_shutdown()
+        self.assertEqual(bytes_in_use, [30])
+        self.assertEqual(budget.bytes_in_use, 0)
+
+
+class TestExecutorThreadStackSize(unittest.TestCase):
+    def test_workers_are_started_with_stack_size(self):
+        executor = Executor(3, queue.Queue(), False, 10,
+                            thread_stack_size=256 * 1024)
+        with mock.patch('threading.stack_size',
+                        return_value=0) as stack_size:
             executor.start()
-            class FloodIOQueueTask(object):
-                PRIORITY = 10
+        executor.initiate_shutdown()
+        executor.wait_until_shutdown()
+        # The stack size is set for each worker and then set back.
+        self.assertEqual(stack_size.call_args_list,
+                         [mock.call(256 * 1024), mock.call(0)] * 3)
+
+    def test_workers_are_started_if_stack_size_is_not_supported(self):
+        executor = Executor(2, queue.Queue(), False, 10,
+                            thread_stack_size=256 * 1024)
+        with mock.patch('threading.stack_size', side_effect=ValueError):
+            executor.start()
+        self.assertEqual(len(executor.threads_list), 2)
+        executor.initiate_shutdown()
+        executor.wait_until_shutdown()
 
-                def __call__(self):
-                    for i in range(50):
-                        executor.write_queue.put(IORequest(f.name, 0, b'foobar'))
-            executor.submit(FloodIOQueueTask())
-            executor.initiate_shutdown()
-            executor.wait_until_shutdown()
-            self.assertEqual(open(f.name, 'rb').read(), b'foobar')
 
 class TestPrintThread(unittest.TestCase):
     def test_print_warning(self):
@@ -99,3 +138,39 @@ class TestPrintThread(unittest.TestCase):
             thread._process_print_task(print_task)
             self.assertIn("Bad File.", mock_stdout.getvalue())
 
+
+
+class TestExecutorResize(unittest.TestCase):
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.controller.target = 2
+        self.executor = Executor(None, queue.Queue(), False, 10,
+                                 concurrency_controller=self.controller)
+
+    def test_starts_with_controller_target(self):
+        self.assertEqual(self.executor.num_threads, 2)
+        self.controller.add_listener.assert_called_with(self.executor.resize)
+
+    def test_grow_and_shrink(self):
+        self.executor.start()
+        self.executor.resize(4)
+        self.assertEqual(self.executor.num_threads, 4)
+        self.assertEqual(len(self.executor.threads_list), 4)
+        self.executor.resize(1)
+        # Workers retire after their next task.
+        for i in range(3):
+            self.executor.submit(lambda: None)
+        for thread in self.executor.threads_list:
+            thread.join(timeout=0.1)
+        self.assertEqual(self.executor.num_threads, 1)
+        self.executor.initiate_shutdown()
+        self.executor.wait_until_shutdown()
+        for thread in self.executor.threads_list:
+            self.assertFalse(thread.is_alive())
+
+    def test_no_resize_after_shutdown_initiated(self):
+        self.executor.start()
+        self.executor.initiate_shutdown()
+        self.executor.resize(8)
+        self.assertEqual(self.executor.num_threads, 2)
+        self.executor.wait_until_shutdown()
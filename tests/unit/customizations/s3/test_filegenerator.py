@@ -23,7 +23,10 @@ import mock
 
 from awscli.customizations.s3.filegenerator import FileGenerator, \
     FileDecodingError, FileStat, is_special_file, is_readable
+from awscli.customizations.s3.filters import Filter
+from awscli.customizations.s3.sharding import Shard
 from awscli.customizations.s3.utils import get_file_stat
+from awscli.customizations.s3 import filegenerator
 import botocore.session
 from tests.unit.customizations.s3 import make_loc_files, clean_loc_files, \
     make_s3_files, s3_cleanup, compare_files
@@ -421,6 +424,7 @@ class TestListFilesLocally(unittest.TestCase):
     def tearDown(self):
         shutil.rmtree(self.directory)
 
+    @mock.patch('awscli.customizations.s3.filegenerator.scandir', None)
     @mock.patch('os.listdir')
     def test_error_raised_on_decoding_error(self, listdir_mock):
         # On Python3, sys.getdefaultencoding
@@ -430,6 +434,126 @@ class TestListFilesLocally(unittest.TestCase):
         with self.assertRaises(FileDecodingError):
             list(file_generator.list_files(self.directory, dir_op=True))
 
+    @mock.patch('awscli.customizations.s3.filegenerator.scandir')
+    def test_error_raised_on_decoding_error_with_scandir(self, scandir_mock):
+        file_generator = FileGenerator(None, None, None)
+        entry = mock.Mock()
+        entry.name = b'\xe2\x9c\x93'
+        scandir_mock.return_value = [entry]
+        with self.assertRaises(FileDecodingError):
+            list(file_generator.list_files(self.directory, dir_op=True))
+
+    def test_listdir_fallback_matches_scandir(self):
+        p = os.path.join
+        open(p(self.directory, 'test-123.txt'), 'w').close()
+        open(p(self.directory, 'test123.txt'), 'w').close()
+        os.mkdir(p(self.directory, 'test'))
+        open(p(self.directory, 'test', 'foo.txt'), 'w').close()
+
+        file_generator = FileGenerator(None, None, None)
+        values = list(file_generator.list_files(self.directory, dir_op=True))
+        with mock.patch('awscli.customizations.s3.filegenerator.scandir',
+                        None):
+            fallback_values = list(file_generator.list_files(
+                self.directory, dir_op=True))
+        self.assertEqual(values, fallback_values)
+        self.assertEqual([el[0] for el in values],
+                         [p(self.directory, 'test-123.txt'),
+                          p(self.directory, 'test', 'foo.txt'),
+                          p(self.directory, 'test123.txt')])
+
+    @unittest.skipIf(platform.system() not in ['Darwin', 'Linux'],
+                     'Special files only supported on mac/linux')
+    def test_special_files_in_directory_are_warned_about(self):
+        open(os.path.join(self.directory, 'file'), 'w').close()
+        os.mkfifo(os.path.join(self.directory, 'fifo'))
+        file_generator = FileGenerator(None, None, None)
+        values = list(el[0] for el in file_generator.list_files(
+            self.directory, dir_op=True))
+        self.assertEqual(values, [os.path.join(self.directory, 'file')])
+        warning = file_generator.result_queue.get()
+        self.assertIn('FIFO', warning.message)
+
+    def test_excluded_directories_are_not_walked(self):
+        p = os.path.join
+        open(p(self.directory, 'file'), 'w').close()
+        os.mkdir(p(self.directory, 'build'))
+        open(p(self.directory, 'build', 'output'), 'w').close()
+        path_filter = Filter([('exclude', 'build/*')], self.directory,
+                             'bucket')
+        file_generator = FileGenerator(None, None, None,
+                                       path_filter=path_filter)
+        with mock.patch('awscli.customizations.s3.filegenerator.'
+                        '_scan_directory',
+                        wraps=filegenerator._scan_directory) as scan:
+            values = list(el[0] for el in file_generator.list_files(
+                self.directory + os.sep, dir_op=True))
+        self.assertEqual(values, [p(self.directory, 'file')])
+        self.assertEqual(scan.call_count, 1)
+
+    def test_directories_of_other_shards_are_not_walked(self):
+        p = os.path.join
+        shard = Shard(0, 2, by='prefix')
+        for i in range(4):
+            os.mkdir(p(self.directory, 'dir%s' % i))
+            open(p(self.directory, 'dir%s' % i, 'file'), 'w').close()
+        open(p(self.directory, 'file'), 'w').close()
+        file_generator = FileGenerator(None, None, None, shard=shard)
+        files = {'src': {'path': self.directory + os.sep, 'type': 'local'},
+                 'dest': {'path': 'bucket/', 'type': 's3'},
+                 'dir_op': True, 'use_src_name': True}
+        with mock.patch('awscli.customizations.s3.filegenerator.'
+                        '_scan_directory',
+                        wraps=filegenerator._scan_directory) as scan:
+            compare_keys = [file_stat.compare_key
+                            for file_stat in file_generator.call(files)]
+        owned = ['dir%s/file' % i for i in range(4)
+                 if shard.owns('dir%s' % i)]
+        # Files at the top are listed, and left to the shard to filter.
+        self.assertEqual(compare_keys, owned + ['file'])
+        self.assertEqual(scan.call_count, 1 + len(owned))
+
+    def test_threaded_walk_matches_sequential_walk(self):
+        p = os.path.join
+        for i in range(5):
+            directory = p(self.directory, 'dir%s' % i)
+            os.mkdir(directory)
+            os.mkdir(p(directory, 'sub'))
+            open(p(directory, 'sub', 'file'), 'w').close()
+            open(p(directory, 'file-%s' % i), 'w').close()
+            open(p(self.directory, 'dir%s.txt' % i), 'w').close()
+        values = list(FileGenerator(None, None, None).list_files(
+            self.directory, dir_op=True))
+        threaded_values = list(FileGenerator(
+            None, None, None, walk_threads=3).list_files(
+                self.directory, dir_op=True))
+        self.assertEqual(len(values), 15)
+        self.assertEqual(threaded_values, values)
+
+    @mock.patch('awscli.customizations.s3.filegenerator.scandir')
+    def test_threaded_walk_raises_errors_from_threads(self, scandir_mock):
+        sub_directory = mock.Mock(path=os.path.join(self.directory, 'sub'))
+        sub_directory.name = u'sub'
+        sub_directory.is_symlink.return_value = False
+        sub_directory.is_dir.return_value = True
+        bad_entry = mock.Mock()
+        bad_entry.name = b'\xe2\x9c\x93'
+        # The sub directory is scanned by one of the threads.
+        scandir_mock.side_effect = lambda path: {
+            self.directory: [sub_directory]}.get(path, [bad_entry])
+        file_generator = FileGenerator(None, None, None, walk_threads=2)
+        with self.assertRaises(FileDecodingError):
+            list(file_generator.list_files(self.directory, dir_op=True))
+
+    def test_files_are_not_opened_while_walking(self):
+        open(os.path.join(self.directory, 'file'), 'w').close()
+        file_generator = FileGenerator(None, None, None)
+        with mock.patch('awscli.customizations.s3.filegenerator.'
+                        'is_readable', return_value=True) as readable:
+            list(file_generator.list_files(self.directory, dir_op=True))
+        # Only the directory that is listed is checked up front.
+        readable.assert_called_once_with(self.directory)
+
     def test_list_files_is_in_sorted_order(self):
         p = os.path.join
         open(p(self.directory, 'test-123.txt'), 'w').close()
@@ -614,6 +738,29 @@ class S3FileGeneratorTest(unittest.TestCase):
         for i in range(len(result_list)):
             compare_files(self, result_list[i], ref_list[i])
 
+    def test_s3_directory_listed_concurrently(self):
+        input_s3_file = {'src': {'path': self.bucket + '/', 'type': 's3'},
+                         'dest': {'path': '', 'type': 'local'},
+                         'dir_op': True, 'use_src_name': True}
+        files = FileGenerator(self.service, self.endpoint,
+                              'delete').call(input_s3_file)
+        concurrent_files = FileGenerator(self.service, self.endpoint,
+                                         'delete', list_concurrency=2).call(
+                                             input_s3_file)
+        self.assertEqual([f.src for f in concurrent_files],
+                         [f.src for f in files])
+
+    def test_prefixes_are_not_listed_concurrently_by_default(self):
+        input_s3_file = {'src': {'path': self.bucket + '/', 'type': 's3'},
+                         'dest': {'path': '', 'type': 'local'},
+                         'dir_op': True, 'use_src_name': True}
+        with mock.patch.object(filegenerator,
+                               'ParallelBucketLister') as lister:
+            files = list(FileGenerator(self.service, self.endpoint,
+                                       '').call(input_s3_file))
+        self.assertFalse(lister.called)
+        self.assertEqual(len(files), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
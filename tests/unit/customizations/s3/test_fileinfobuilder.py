@@ -14,7 +14,7 @@ import mock
 
 from awscli.testutils import unittest
 from awscli.customizations.s3.filegenerator import FileStat
-from awscli.customizations.s3.fileinfo import FileInfo
+from awscli.customizations.s3.fileinfo import FileInfo, TaskInfo
 from awscli.customizations.s3.fileinfobuilder import FileInfoBuilder
 
 
@@ -26,10 +26,10 @@ class TestFileInfoBuilder(unittest.TestCase):
         files = [FileStat(src='src', dest='dest', compare_key='compare_key',
                           size='size', last_update='last_update',
                           src_type='src_type', dest_type='dest_type',
-                          operation_name='operation_name')]
+                          operation_name='operation_name', etag='etag')]
         file_infos = info_setter.call(files)
         for file_info in file_infos:
-            attributes = file_info.__dict__.keys()
+            attributes = FileInfo.__slots__ + TaskInfo.__slots__
             for key in attributes:
                 self.assertEqual(getattr(file_info, key), str(key))
 
@@ -173,6 +173,51 @@ class FiltersTest(unittest.TestCase):
         self.assertEqual(len(filtered), 1)
         self.assertEqual(filtered[0].src, p('/foo/bar/baz.txt'))
 
+    def test_excludes_all_under_directory(self):
+        p = platform_path
+        exclude_filter = self.create_filter([['exclude', 'build/*']],
+                                            root=p('/foo'))
+        self.assertTrue(exclude_filter.excludes_all_under(
+            p('/foo/build/'), 'local'))
+        self.assertTrue(exclude_filter.excludes_all_under(
+            p('/foo/build/sub/'), 'local'))
+        self.assertFalse(exclude_filter.excludes_all_under(
+            p('/foo/src/'), 'local'))
+
+    def test_excludes_all_under_nested_directories(self):
+        exclude_filter = self.create_filter(
+            [['exclude', '*/node_modules/*']], root='bucket')
+        self.assertTrue(exclude_filter.excludes_all_under(
+            'bucket/app/node_modules/', 's3'))
+        self.assertFalse(exclude_filter.excludes_all_under(
+            'bucket/app/', 's3'))
+
+    def test_later_include_prevents_exclusion(self):
+        exc_inc_filter = self.create_filter(
+            [['exclude', '*'], ['include', '*.txt']], root='bucket')
+        self.assertFalse(exc_inc_filter.excludes_all_under(
+            'bucket/dir/', 's3'))
+        inc_exc_filter = self.create_filter(
+            [['include', '*.txt'], ['exclude', '*']], root='bucket')
+        self.assertTrue(inc_exc_filter.excludes_all_under(
+            'bucket/dir/', 's3'))
+
+    def test_include_elsewhere_does_not_prevent_exclusion(self):
+        exc_inc_filter = self.create_filter(
+            [['exclude', 'dir/*'], ['include', 'other/*']], root='bucket')
+        self.assertTrue(exc_inc_filter.excludes_all_under(
+            'bucket/dir/', 's3'))
+
+    def test_partial_exclude_does_not_exclude_directory(self):
+        exclude_filter = self.create_filter([['exclude', 'dir/*.jpg']],
+                                            root='bucket')
+        self.assertFalse(exclude_filter.excludes_all_under(
+            'bucket/dir/', 's3'))
+
+    def test_no_filter_excludes_nothing(self):
+        self.assertFalse(Filter({}, None, None).excludes_all_under(
+            'bucket/dir/', 's3'))
+
 
 if __name__ == "__main__":
     unittest.main()
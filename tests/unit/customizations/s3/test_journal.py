@@ -0,0 +1,131 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import shutil
+import tempfile
+
+import mock
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.journal import TransferJournal, JournalEntry
+
+
+class TestTransferJournal(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tempdir, 'journal')
+        self.journal = TransferJournal(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_new_entry_is_empty(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        self.assertIsNone(entry.get('upload_id'))
+        self.assertEqual(entry.parts, {})
+
+    def test_entry_is_persisted(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.update(upload_id='upload_id')
+        entry.record_part(1, 'etag1')
+        entry.record_part(2, 'etag2')
+        entry.flush()
+
+        entry = TransferJournal(self.directory).get_entry('upload', 'foo', 10)
+        self.assertEqual(entry.get('upload_id'), 'upload_id')
+        self.assertEqual(entry.parts, {1: 'etag1', 2: 'etag2'})
+
+    def test_entries_are_keyed(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.update(upload_id='upload_id')
+        # A different size is a different transfer.
+        other_entry = self.journal.get_entry('upload', 'foo', 11)
+        self.assertIsNone(other_entry.get('upload_id'))
+
+    def test_retain_parts(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.record_part(1, 'etag1')
+        entry.record_part(2, 'etag2')
+        entry.retain_parts([2])
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        self.assertEqual(entry.parts, {2: 'etag2'})
+
+    def test_reset(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.update(upload_id='upload_id')
+        entry.record_part(1, 'etag1')
+        entry.reset(chunksize=5)
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        self.assertIsNone(entry.get('upload_id'))
+        self.assertEqual(entry.get('chunksize'), 5)
+        self.assertEqual(entry.parts, {})
+
+    def test_remove(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.update(upload_id='upload_id')
+        entry.remove()
+        self.assertEqual(os.listdir(self.directory), [])
+        # Removing twice is fine.
+        entry.remove()
+
+    def test_parts_are_saved_in_batches(self):
+        entry = self.journal.get_entry('download', 'foo', 10)
+        sync = mock.Mock()
+        with mock.patch.object(JournalEntry, 'SAVE_BATCH_SIZE', 3):
+            entry.record_part(0, None, sync=sync)
+            entry.record_part(1, None, sync=sync)
+            self.assertFalse(sync.called)
+            self.assertEqual(
+                self.journal.get_entry('download', 'foo', 10).parts, {})
+            entry.record_part(2, None, sync=sync)
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(
+            self.journal.get_entry('download', 'foo', 10).parts,
+            {0: None, 1: None, 2: None})
+
+    def test_parts_are_saved_after_interval(self):
+        clock = mock.Mock(return_value=0)
+        entry = JournalEntry(os.path.join(self.directory, 'entry.json'),
+                             'key', {}, clock=clock)
+        entry.record_part(0, 'etag0')
+        self.assertFalse(os.path.exists(self.directory))
+        clock.return_value = JournalEntry.SAVE_INTERVAL
+        entry.record_part(1, 'etag1')
+        self.assertEqual(os.listdir(self.directory), ['entry.json'])
+
+    def test_parts_are_synced_before_they_are_saved(self):
+        entry = self.journal.get_entry('download', 'foo', 10)
+
+        def sync():
+            # The entry is not written until the data is synced.
+            self.assertFalse(os.path.exists(self.directory))
+
+        sync = mock.Mock(side_effect=sync)
+        entry.record_part(0, None)
+        entry.flush(sync=sync)
+        self.assertTrue(sync.called)
+        self.assertEqual(
+            self.journal.get_entry('download', 'foo', 10).parts, {0: None})
+
+    def test_corrupt_entry_is_ignored(self):
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        entry.update(upload_id='upload_id')
+        filename = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(filename, 'w') as f:
+            f.write('{not json')
+        entry = self.journal.get_entry('upload', 'foo', 10)
+        self.assertIsNone(entry.get('upload_id'))
+
+
+if __name__ == "__main__":
+    unittest.main()
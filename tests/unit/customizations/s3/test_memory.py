@@ -0,0 +1,95 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import threading
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.memory import MemoryBudget, get_memory_needed
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.budget = MemoryBudget(10)
+
+    def acquire_in_thread(self, num_bytes):
+        acquired = threading.Event()
+
+        def acquire():
+            self.budget.acquire(num_bytes)
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        return acquired
+
+    def test_max_bytes_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            MemoryBudget(0)
+
+    def test_acquire_and_release(self):
+        self.budget.acquire(4)
+        self.budget.acquire(6)
+        self.assertEqual(self.budget.bytes_in_use, 10)
+        self.budget.release(4)
+        self.budget.release(6)
+        self.assertEqual(self.budget.bytes_in_use, 0)
+        self.assertEqual(self.budget.peak_bytes, 10)
+
+    def test_acquire_waits_for_release(self):
+        self.budget.acquire(8)
+        acquired = self.acquire_in_thread(4)
+        self.assertFalse(acquired.wait(0.1))
+        self.budget.release(8)
+        self.assertTrue(acquired.wait(5))
+        self.assertEqual(self.budget.bytes_in_use, 4)
+        self.assertEqual(self.budget.peak_bytes, 8)
+        self.assertEqual(self.budget.num_waits, 1)
+
+    def test_oversized_request_waits_until_nothing_is_held(self):
+        self.budget.acquire(1)
+        acquired = self.acquire_in_thread(20)
+        self.assertFalse(acquired.wait(0.1))
+        self.budget.release(1)
+        self.assertTrue(acquired.wait(5))
+        self.assertEqual(self.budget.peak_bytes, 20)
+
+    def test_reserve(self):
+        with self.budget.reserve(5):
+            self.assertEqual(self.budget.bytes_in_use, 5)
+        self.assertEqual(self.budget.bytes_in_use, 0)
+
+    def test_reservation_released_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.budget.reserve(5):
+                raise ValueError()
+        self.assertEqual(self.budget.bytes_in_use, 0)
+
+    def test_zero_bytes_never_waits(self):
+        self.budget.acquire(10)
+        self.budget.acquire(0)
+        self.assertEqual(self.budget.bytes_in_use, 10)
+
+
+class TestGetMemoryNeeded(unittest.TestCase):
+    def test_task_with_memory_needed(self):
+        class Task(object):
+            def memory_needed(self):
+                return 5
+        self.assertEqual(get_memory_needed(Task()), 5)
+
+    def test_task_without_memory_needed(self):
+        self.assertEqual(get_memory_needed(lambda: None), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
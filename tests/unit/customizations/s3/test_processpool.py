@@ -0,0 +1,114 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import shutil
+import tempfile
+
+import mock
+from six.moves import queue
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.filegenerator import FileStat
+from awscli.customizations.s3.fileinfobuilder import FileInfoBuilder
+from awscli.customizations.s3.processpool import ProcessPoolS3Handler, \
+    ResultForwarder, ShardPrintThread, ShardTotal
+from awscli.customizations.s3.utils import PrintTask
+
+
+def create_file_info_builder(session, parameters):
+    # The files are local files that are deleted, so they don't need an
+    # endpoint.
+    return FileInfoBuilder(None, None, parameters=parameters)
+
+
+class TestProcessPoolS3Handler(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.session = mock.Mock(profile=None)
+        self.params = {'region': 'us-east-1', 'quiet': True,
+                       'num_processes': 2}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def create_files(self, num_files):
+        filenames = []
+        for i in range(num_files):
+            filename = os.path.join(self.tempdir, 'file%s' % i)
+            with open(filename, 'w') as f:
+                f.write('foo')
+            filenames.append(filename)
+        return filenames
+
+    def delete(self, filenames):
+        handler = ProcessPoolS3Handler(self.session, self.params, 2,
+                                       create_file_info_builder)
+        return handler.call(
+            FileStat(src=filename, size=3, src_type='local',
+                     operation_name='delete')
+            for filename in filenames)
+
+    def test_files_are_shared_between_processes(self):
+        filenames = self.create_files(6)
+        result = self.delete(filenames)
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+    def test_errors_in_processes_are_counted(self):
+        filenames = self.create_files(2)
+        filenames.append(os.path.join(self.tempdir, 'missing'))
+        result = self.delete(filenames)
+        self.assertEqual(result.num_tasks_failed, 1)
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+
+class TestResultForwarder(unittest.TestCase):
+    def setUp(self):
+        self.forward_queue = queue.Queue()
+        self.forwarder = ResultForwarder(queue.Queue(), self.forward_queue)
+
+    def test_forwards_results(self):
+        task = PrintTask(message='upload failed: foo', error=True)
+        self.forwarder._process_print_task(task)
+        self.assertEqual(self.forward_queue.get_nowait(), task)
+        self.assertEqual(self.forwarder.num_errors_seen, 1)
+
+    def test_forwards_totals(self):
+        self.forwarder.set_total_files(2)
+        self.forwarder.set_total_parts(5)
+        self.assertEqual(self.forward_queue.get_nowait(),
+                         ShardTotal('files', 2))
+        self.assertEqual(self.forward_queue.get_nowait(),
+                         ShardTotal('parts', 5))
+
+
+class TestShardPrintThread(unittest.TestCase):
+    def test_totals_are_set_once_every_shard_sent_them(self):
+        print_thread = ShardPrintThread(queue.Queue(), True, 2)
+        print_thread._process_print_task(ShardTotal('files', 2))
+        self.assertEqual(print_thread._total_files, '...')
+        print_thread._process_print_task(ShardTotal('files', 3))
+        print_thread._process_print_task(ShardTotal('parts', 4))
+        print_thread._process_print_task(ShardTotal('parts', 6))
+        self.assertEqual(print_thread._total_files, 5)
+        self.assertEqual(print_thread._total_parts, 10)
+
+    def test_counts_errors(self):
+        print_thread = ShardPrintThread(queue.Queue(), True, 2)
+        print_thread._process_print_task(
+            PrintTask(message='upload failed: foo', error=True))
+        self.assertEqual(print_thread.num_errors_seen, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
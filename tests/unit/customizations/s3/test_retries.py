@@ -0,0 +1,128 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import errno
+import socket
+
+import mock
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.constants import RETRY_COST, \
+    THROTTLED_RETRY_COST
+from awscli.customizations.s3.retries import RetryBudget, RetryPolicy
+from awscli.customizations.s3.utils import ThrottlingError
+
+
+class TestRetryBudget(unittest.TestCase):
+    def test_acquire_until_spent(self):
+        budget = RetryBudget(capacity=10)
+        self.assertTrue(budget.acquire(5))
+        self.assertTrue(budget.acquire(5))
+        self.assertFalse(budget.acquire(1))
+        self.assertEqual(budget.available, 0)
+
+    def test_release_up_to_capacity(self):
+        budget = RetryBudget(capacity=10)
+        budget.acquire(5)
+        budget.release()
+        self.assertEqual(budget.available, 6)
+        for i in range(10):
+            budget.release()
+        self.assertEqual(budget.available, 10)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.func = mock.Mock()
+
+    def create_policy(self, **kwargs):
+        kwargs.setdefault('random', lambda: 1.0)
+        return RetryPolicy(base_delay=0.1, max_delay=1, sleep=self.sleep,
+                           **kwargs)
+
+    def test_success_is_returned(self):
+        self.func.return_value = 'foo'
+        self.assertEqual(self.create_policy().call(self.func), 'foo')
+        self.assertFalse(self.sleep.called)
+
+    def test_retries_with_exponential_backoff(self):
+        self.func.side_effect = [socket.timeout(), socket.timeout(),
+                                 socket.timeout(), 'foo']
+        self.assertEqual(self.create_policy().call(self.func), 'foo')
+        self.assertEqual(self.sleep.call_args_list,
+                         [mock.call(0.1), mock.call(0.2), mock.call(0.4)])
+
+    def test_backoff_is_capped(self):
+        policy = self.create_policy()
+        self.assertEqual(policy.delay(10), 1)
+
+    def test_backoff_has_full_jitter(self):
+        policy = self.create_policy(random=lambda: 0.25)
+        self.assertEqual(policy.delay(2), 0.05)
+
+    def test_last_error_is_raised(self):
+        self.func.side_effect = socket.error(errno.ECONNRESET, 'reset')
+        policy = self.create_policy(max_attempts=3)
+        with self.assertRaises(socket.error):
+            policy.call(self.func)
+        self.assertEqual(self.func.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        self.func.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            self.create_policy().call(self.func)
+        self.assertEqual(self.func.call_count, 1)
+
+    def test_local_errors_are_not_retried(self):
+        # socket.error is OSError on python 3, which is also raised by
+        # local file operations.
+        for error in [IOError(errno.ENOSPC, 'No space left on device'),
+                      OSError(errno.EACCES, 'Permission denied')]:
+            self.func.reset_mock()
+            self.func.side_effect = error
+            with self.assertRaises(EnvironmentError):
+                self.create_policy().call(self.func)
+            self.assertEqual(self.func.call_count, 1)
+
+    def test_cancelled_transfers_are_not_retried(self):
+        self.func.side_effect = socket.timeout()
+        with self.assertRaises(socket.timeout):
+            self.create_policy().call(self.func, is_cancelled=lambda: True)
+        self.assertEqual(self.func.call_count, 1)
+
+    def test_retries_are_paid_for_from_the_budget(self):
+        budget = RetryBudget(capacity=RETRY_COST + THROTTLED_RETRY_COST)
+        policy = self.create_policy(budget=budget)
+        self.func.side_effect = [socket.timeout(), ThrottlingError(), 'foo']
+        policy.call(self.func)
+        # The success gives one back.
+        self.assertEqual(budget.available, 1)
+
+    def test_no_retries_once_budget_is_spent(self):
+        budget = RetryBudget(capacity=RETRY_COST)
+        policy = self.create_policy(budget=budget)
+        self.func.side_effect = socket.timeout()
+        with self.assertRaises(socket.timeout):
+            policy.call(self.func)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_throttling_backs_off_concurrency(self):
+        controller = mock.Mock()
+        policy = self.create_policy(concurrency_controller=controller)
+        self.func.side_effect = [ThrottlingError(), socket.timeout(), 'foo']
+        policy.call(self.func)
+        self.assertEqual(controller.back_off.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
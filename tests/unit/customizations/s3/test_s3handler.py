@@ -11,14 +11,23 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 import datetime
+import hashlib
 import os
 import random
+import shutil
 import sys
+import tempfile
 from awscli.testutils import unittest
 
+import mock
+import six
+
 from awscli import EnvironmentVariables
 from awscli.customizations.s3.s3handler import S3Handler
+from awscli.customizations.s3.constants import WORKER_THREAD_STACK_SIZE
 from awscli.customizations.s3.fileinfo import FileInfo
+from awscli.customizations.s3.journal import TransferJournal
+from awscli.customizations.s3.utils import calculate_multipart_etag
 from tests.unit.customizations.s3.fake_session import FakeSession
 from tests.unit.customizations.s3 import make_loc_files, clean_loc_files, \
     make_s3_files, s3_cleanup, create_bucket, list_contents, list_buckets, \
@@ -81,6 +90,29 @@ class S3HandlerTestDeleteList(S3HandlerBaseTest):
         self.s3_handler.call(tasks)
         self.assertEqual(len(list_contents(self.bucket, self.session)), 0)
 
+    def test_s3_deletes_are_batched(self):
+        service = mock.Mock()
+        operation = service.get_operation.return_value
+        operation.call.return_value = (mock.Mock(status_code=200), {})
+        tasks = []
+        for i in range(5):
+            tasks.append(FileInfo(
+                src='bucket/key%s' % i, src_type='s3', dest_type='local',
+                operation_name='delete', size=0, service=service,
+                endpoint=self.endpoint, source_endpoint=self.endpoint))
+        with mock.patch('awscli.customizations.s3.s3handler.'
+                        'DELETE_BATCH_SIZE', 2):
+            result = self.s3_handler.call(tasks)
+        self.assertEqual(result.num_tasks_failed, 0)
+        service.get_operation.assert_called_with('DeleteObjects')
+        batches = sorted([call[1]['delete']['Objects']
+                          for call in operation.call.call_args_list],
+                         key=len)
+        self.assertEqual(batches, [
+            [{'Key': 'key4'}],
+            [{'Key': 'key0'}, {'Key': 'key1'}],
+            [{'Key': 'key2'}, {'Key': 'key3'}]])
+
     def test_list_objects(self):
         """
         Tests the ability to list objects, common prefixes, and buckets.
@@ -202,6 +234,18 @@ class S3HandlerTestUpload(S3HandlerBaseTest):
         # Confirm only one of the files was uploaded.
         self.assertEqual(len(list_contents(self.bucket, self.session)), 1)
 
+    def test_unreadable_file_is_skipped_with_warning(self):
+        task = FileInfo(src=self.loc_files[0], dest=self.s3_files[0],
+                        src_type='local', dest_type='s3',
+                        operation_name='upload', size=0,
+                        service=self.service, endpoint=self.endpoint)
+        with mock.patch('awscli.customizations.s3.s3handler.is_readable',
+                        return_value=False):
+            result = self.s3_handler.call([task])
+        self.assertEqual(result.num_tasks_warned, 1)
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(len(list_contents(self.bucket, self.session)), 0)
+
     def test_multi_upload(self):
         """
         This test only checks that the multipart upload process works.
@@ -224,6 +268,554 @@ class S3HandlerTestUpload(S3HandlerBaseTest):
             'text/plain')
 
 
+class S3HandlerTestResumeUpload(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestResumeUpload, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.journal_patch = mock.patch.object(
+            TransferJournal, 'DEFAULT_DIRECTORY',
+            os.path.join(self.tempdir, 'journal'))
+        self.journal_patch.start()
+        self.filename = os.path.join(self.tempdir, 'foo')
+        self.chunks = [b'aaaaa', b'bbbbb', b'ccccc']
+        with open(self.filename, 'wb') as f:
+            f.write(b''.join(self.chunks))
+        self.last_update = datetime.datetime.now()
+        self.service = mock.Mock()
+        self.operations = {}
+        self.service.get_operation.side_effect = self.get_operation
+        self.uploaded_parts = []
+        params = {'region': 'us-east-1', 'resume': True}
+        self.s3_handler = S3Handler(mock.Mock(), params, multi_threshold=10,
+                                    chunksize=5)
+
+    def tearDown(self):
+        super(S3HandlerTestResumeUpload, self).tearDown()
+        self.journal_patch.stop()
+        shutil.rmtree(self.tempdir)
+
+    def get_operation(self, name):
+        if name not in self.operations:
+            self.operations[name] = mock.Mock()
+        return self.operations[name]
+
+    def md5(self, data):
+        return hashlib.md5(data).hexdigest()
+
+    def upload_part(self, **kwargs):
+        self.uploaded_parts.append(kwargs['part_number'])
+        body = kwargs['body'].read()
+        return mock.Mock(), {'ETag': '"%s"' % self.md5(body)}
+
+    def journal_upload(self, upload_id, parts):
+        entry = TransferJournal().get_entry(
+            'upload', self.filename, 15, self.last_update.isoformat(),
+            'bucket/foo')
+        entry.update(upload_id=upload_id, chunksize=5)
+        for part_number, etag in parts.items():
+            entry.record_part(part_number, etag)
+        entry.flush()
+        return entry
+
+    def upload(self):
+        self.get_operation('UploadPart').call.side_effect = self.upload_part
+        self.get_operation('CreateMultipartUpload').call.return_value = (
+            mock.Mock(), {'UploadId': 'new_upload_id'})
+        multipart_etag = calculate_multipart_etag(
+            [hashlib.md5(chunk).digest() for chunk in self.chunks])
+        self.get_operation('CompleteMultipartUpload').call.return_value = (
+            mock.Mock(), {'ETag': '"%s"' % multipart_etag})
+        self.s3_handler.call([FileInfo(
+            src=self.filename, dest='bucket/foo', size=15,
+            last_update=self.last_update, operation_name='upload',
+            service=self.service, endpoint=mock.Mock())])
+
+    def test_only_missing_parts_are_uploaded(self):
+        self.journal_upload('upload_id', {
+            1: self.md5(self.chunks[0]), 2: self.md5(self.chunks[1])})
+        self.get_operation('ListParts').call.return_value = (mock.Mock(), {
+            'Parts': [
+                {'PartNumber': 1, 'Size': 5,
+                 'ETag': '"%s"' % self.md5(self.chunks[0])},
+                # S3 does not have the part the journal recorded.
+                {'PartNumber': 2, 'Size': 5, 'ETag': '"other"'}],
+            'IsTruncated': False})
+        self.upload()
+        self.assertFalse(self.get_operation('CreateMultipartUpload').called)
+        self.assertEqual(sorted(self.uploaded_parts), [2, 3])
+        complete_kwargs = \
+            self.get_operation('CompleteMultipartUpload').call.call_args[1]
+        self.assertEqual(complete_kwargs['upload_id'], 'upload_id')
+        self.assertEqual(
+            [part['PartNumber'] for part in
+             complete_kwargs['multipart_upload']['Parts']], [1, 2, 3])
+        # The journal entry is removed once the upload completes.
+        self.assertEqual(os.listdir(os.path.join(self.tempdir, 'journal')),
+                         [])
+
+    def test_new_upload_when_upload_id_is_gone(self):
+        self.journal_upload('upload_id', {1: self.md5(self.chunks[0])})
+        self.get_operation('ListParts').call.side_effect = \
+            Exception('NoSuchUpload')
+        self.upload()
+        self.assertEqual(sorted(self.uploaded_parts), [1, 2, 3])
+        complete_kwargs = \
+            self.get_operation('CompleteMultipartUpload').call.call_args[1]
+        self.assertEqual(complete_kwargs['upload_id'], 'new_upload_id')
+
+    def test_failed_upload_is_not_aborted(self):
+        self.get_operation('UploadPart').call.side_effect = \
+            Exception('Upload failed')
+        self.get_operation('CreateMultipartUpload').call.return_value = (
+            mock.Mock(), {'UploadId': 'new_upload_id'})
+        self.s3_handler.call([FileInfo(
+            src=self.filename, dest='bucket/foo', size=15,
+            last_update=self.last_update, operation_name='upload',
+            service=self.service, endpoint=mock.Mock())])
+        self.assertFalse(self.get_operation('AbortMultipartUpload').called)
+        entry = TransferJournal().get_entry(
+            'upload', self.filename, 15, self.last_update.isoformat(),
+            'bucket/foo')
+        self.assertEqual(entry.get('upload_id'), 'new_upload_id')
+
+
+class S3HandlerTestResumeDownload(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestResumeDownload, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.journal_patch = mock.patch.object(
+            TransferJournal, 'DEFAULT_DIRECTORY',
+            os.path.join(self.tempdir, 'journal'))
+        self.journal_patch.start()
+        self.filename = os.path.join(self.tempdir, 'foo')
+        self.partial_filename = self.filename + '.s3download'
+        self.content = b'aaaaabbbbbccccc'
+        self.service = mock.Mock()
+        self.get_object = self.service.get_operation.return_value
+        self.get_object.call.side_effect = self.fake_get_object
+        self.requested_ranges = []
+        params = {'region': 'us-east-1', 'resume': True}
+        self.s3_handler = S3Handler(mock.Mock(), params, multi_threshold=10,
+                                    chunksize=5)
+
+    def tearDown(self):
+        super(S3HandlerTestResumeDownload, self).tearDown()
+        self.journal_patch.stop()
+        shutil.rmtree(self.tempdir)
+
+    def fake_get_object(self, **kwargs):
+        self.requested_ranges.append(kwargs['range'])
+        self.assertEqual(kwargs['if_match'], '"etag"')
+        start, end = kwargs['range'][len('bytes='):].split('-')
+        end = int(end) + 1 if end else len(self.content)
+        body = mock.Mock()
+        body.read.side_effect = six.BytesIO(
+            self.content[int(start):end]).read
+        return mock.Mock(), {'Body': body}
+
+    def download(self):
+        self.s3_handler.call([FileInfo(
+            src='bucket/foo', dest=self.filename, size=15,
+            last_update=datetime.datetime.now(), operation_name='download',
+            src_type='s3', dest_type='local', etag='etag',
+            service=self.service, endpoint=mock.Mock())])
+
+    def test_only_missing_ranges_are_downloaded(self):
+        # The first part was downloaded by a previous run.
+        with open(self.partial_filename, 'wb') as f:
+            f.write(b'aaaaa' + b'\x00' * 10)
+        entry = TransferJournal().get_entry(
+            'download', 'bucket/foo', 15, 'etag', self.filename)
+        entry.update(chunksize=5)
+        entry.record_part(0, None)
+        entry.flush()
+        self.download()
+        self.assertEqual(sorted(self.requested_ranges),
+                         ['bytes=10-', 'bytes=5-9'])
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(self.partial_filename))
+        self.assertEqual(os.listdir(os.path.join(self.tempdir, 'journal')),
+                         [])
+
+    def test_missing_partial_file_is_downloaded_again(self):
+        entry = TransferJournal().get_entry(
+            'download', 'bucket/foo', 15, 'etag', self.filename)
+        entry.update(chunksize=5)
+        entry.record_part(0, None)
+        entry.flush()
+        self.download()
+        self.assertEqual(len(self.requested_ranges), 3)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_partial_file_is_kept_on_failure(self):
+        self.get_object.call.side_effect = Exception('Download failed')
+        self.download()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(os.path.exists(self.partial_filename))
+
+
+class S3HandlerTestStream(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestStream, self).setUp()
+        self.content = b'aaaaabbbbbccccc'
+        self.calls = []
+        self.uploaded_parts = {}
+        self.service = mock.Mock()
+        self.service.get_operation.side_effect = self.get_operation
+        params = {'region': 'us-east-1', 'is_stream': True}
+        self.s3_handler = S3Handler(mock.Mock(), params, multi_threshold=10,
+                                    chunksize=5)
+
+    def get_operation(self, name):
+        operation = mock.Mock()
+        operation.call.side_effect = getattr(self, 'fake_' + name.lower())
+        return operation
+
+    def fake_putobject(self, **kwargs):
+        body = kwargs['body'].read()
+        self.calls.append(('PutObject', body))
+        return mock.Mock(), {'ETag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+    def fake_createmultipartupload(self, **kwargs):
+        self.calls.append(('CreateMultipartUpload', None))
+        return mock.Mock(), {'UploadId': 'upload-id'}
+
+    def fake_uploadpart(self, **kwargs):
+        body = kwargs['body'].read()
+        self.uploaded_parts[kwargs['part_number']] = body
+        return mock.Mock(), {'ETag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+    def fake_completemultipartupload(self, **kwargs):
+        self.calls.append(('CompleteMultipartUpload',
+                           kwargs['multipart_upload']['Parts']))
+        return mock.Mock(), {}
+
+    def fake_headobject(self, **kwargs):
+        return mock.Mock(), {'ContentLength': str(len(self.content)),
+                             'ETag': '"etag"'}
+
+    def fake_getobject(self, **kwargs):
+        start, end = kwargs['range'][len('bytes='):].split('-')
+        end = int(end) + 1 if end else len(self.content)
+        body = mock.Mock()
+        body.read.side_effect = six.BytesIO(
+            self.content[int(start):end]).read
+        return mock.Mock(), {'Body': body}
+
+    def upload(self, data):
+        stdin = six.BytesIO(data)
+        with mock.patch('awscli.customizations.s3.s3handler.'
+                        'get_binary_stdin', return_value=stdin):
+            return self.s3_handler.call([FileInfo(
+                src='-', dest='bucket/foo', operation_name='upload',
+                src_type='local', dest_type='s3', service=self.service,
+                endpoint=mock.Mock())])
+
+    def download(self):
+        stdout = six.BytesIO()
+        with mock.patch('awscli.customizations.s3.s3handler.'
+                        'get_binary_stdout', return_value=stdout):
+            result = self.s3_handler.call([FileInfo(
+                src='bucket/foo', dest='-', operation_name='download',
+                src_type='s3', dest_type='local', service=self.service,
+                endpoint=mock.Mock())])
+        return result, stdout.getvalue()
+
+    def test_small_stream_is_uploaded_with_put_object(self):
+        result = self.upload(b'abc')
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(self.calls, [('PutObject', b'abc')])
+
+    def test_large_stream_is_uploaded_in_parts(self):
+        result = self.upload(self.content + b'dd')
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(self.uploaded_parts, {
+            1: b'aaaaa', 2: b'bbbbb', 3: b'ccccc', 4: b'dd'})
+        self.assertEqual(self.calls[-1][0], 'CompleteMultipartUpload')
+        self.assertEqual([part['PartNumber'] for part in self.calls[-1][1]],
+                         [1, 2, 3, 4])
+
+    def test_object_is_downloaded_to_stdout_in_order(self):
+        result, output = self.download()
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(output, self.content)
+
+    def test_empty_object_is_downloaded_to_stdout(self):
+        self.content = b''
+        result, output = self.download()
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(output, b'')
+
+    def use_memory_budget(self, max_memory):
+        params = {'region': 'us-east-1', 'is_stream': True, 'quiet': True,
+                  'max_memory': max_memory}
+        self.s3_handler = S3Handler(mock.Mock(), params, multi_threshold=10,
+                                    chunksize=5)
+        return self.s3_handler._memory_budget
+
+    def test_stream_upload_within_small_memory_budget(self):
+        budget = self.use_memory_budget(5)
+        result = self.upload(self.content + b'dd')
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(self.uploaded_parts, {
+            1: b'aaaaa', 2: b'bbbbb', 3: b'ccccc', 4: b'dd'})
+        self.assertEqual(budget.bytes_in_use, 0)
+        # One part in flight and one part read ahead.
+        self.assertEqual(budget.peak_bytes, 10)
+
+    def test_stream_download_within_small_memory_budget(self):
+        budget = self.use_memory_budget(5)
+        result, output = self.download()
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(output, self.content)
+        self.assertEqual(budget.bytes_in_use, 0)
+        self.assertEqual(budget.peak_bytes, 5)
+
+
+class S3HandlerTestCopyStrategy(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestCopyStrategy, self).setUp()
+        self.calls = []
+        self.service = mock.Mock()
+        self.service.get_operation.side_effect = self.get_operation
+
+    def get_operation(self, name):
+        operation = mock.Mock()
+        operation.call.side_effect = getattr(self, 'fake_' + name.lower())
+        return operation
+
+    def fake_copyobject(self, **kwargs):
+        self.calls.append('CopyObject')
+        return mock.Mock(), {}
+
+    def fake_createmultipartupload(self, **kwargs):
+        self.calls.append('CreateMultipartUpload')
+        return mock.Mock(), {'UploadId': 'upload-id'}
+
+    def fake_uploadpartcopy(self, **kwargs):
+        self.calls.append('UploadPartCopy')
+        return mock.Mock(), {'CopyPartResult': {'ETag': '"etag"'}}
+
+    def fake_completemultipartupload(self, **kwargs):
+        self.calls.append('CompleteMultipartUpload')
+        return mock.Mock(), {}
+
+    def copy(self, size, **params):
+        params['region'] = 'us-east-1'
+        params['quiet'] = True
+        s3_handler = S3Handler(mock.Mock(), params, chunksize=5)
+        result = s3_handler.call([FileInfo(
+            src='bucket/foo', dest='bucket2/foo', size=size,
+            operation_name='copy', src_type='s3', dest_type='s3',
+            service=self.service, endpoint=mock.Mock())])
+        self.assertEqual(result.num_tasks_failed, 0)
+        return s3_handler._copy_strategy
+
+    def test_copy_up_to_threshold_uses_copy_object(self):
+        strategy = self.copy(15, multipart_copy_threshold=15)
+        self.assertEqual(self.calls, ['CopyObject'])
+        self.assertEqual(strategy.num_single_copies, 1)
+
+    def test_copy_over_max_single_copy_size_is_multipart(self):
+        self.copy(15, multipart_copy_threshold=5, max_single_copy_size=10)
+        self.assertEqual(self.calls[0], 'CreateMultipartUpload')
+        self.assertEqual(self.calls.count('UploadPartCopy'), 3)
+        self.assertEqual(self.calls[-1], 'CompleteMultipartUpload')
+
+
+class S3HandlerTestRelay(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestRelay, self).setUp()
+        self.data = b'0123456789abcde'
+        self.source_endpoint = mock.Mock()
+        self.endpoint = mock.Mock()
+        self.calls = []
+        self.uploaded = {}
+        self.service = mock.Mock()
+        self.service.get_operation.side_effect = self.get_operation
+
+    def get_operation(self, name):
+        operation = mock.Mock()
+        operation.call.side_effect = getattr(self, 'fake_' + name.lower())
+        return operation
+
+    def fake_getobject(self, endpoint, **kwargs):
+        self.assertIs(endpoint, self.source_endpoint)
+        self.calls.append('GetObject')
+        data = self.data
+        if 'range' in kwargs:
+            start, end = kwargs['range'][len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+        return mock.Mock(), {'Body': six.BytesIO(data)}
+
+    def fake_putobject(self, endpoint, **kwargs):
+        self.assertIs(endpoint, self.endpoint)
+        self.calls.append('PutObject')
+        data = kwargs['body'].read()
+        self.uploaded[0] = data
+        return mock.Mock(), {
+            'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+
+    def fake_createmultipartupload(self, endpoint, **kwargs):
+        self.calls.append('CreateMultipartUpload')
+        return mock.Mock(), {'UploadId': 'upload-id'}
+
+    def fake_uploadpart(self, endpoint, **kwargs):
+        self.assertIs(endpoint, self.endpoint)
+        self.calls.append('UploadPart')
+        data = kwargs['body'].read()
+        self.uploaded[kwargs['part_number']] = data
+        return mock.Mock(), {
+            'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+
+    def fake_completemultipartupload(self, endpoint, **kwargs):
+        self.calls.append('CompleteMultipartUpload')
+        return mock.Mock(), {}
+
+    def fake_deleteobject(self, endpoint, **kwargs):
+        self.assertIs(endpoint, self.source_endpoint)
+        self.calls.append('DeleteObject')
+        return mock.Mock(), {}
+
+    def relay(self, operation_name='copy', multipart_threshold=20):
+        params = {'region': 'us-east-1', 'quiet': True,
+                  'copy_mode': 'relay'}
+        s3_handler = S3Handler(mock.Mock(), params, chunksize=5,
+                               multi_threshold=multipart_threshold)
+        result = s3_handler.call([FileInfo(
+            src='bucket/foo', dest='bucket2/foo', size=len(self.data),
+            operation_name=operation_name, src_type='s3', dest_type='s3',
+            service=self.service, endpoint=self.endpoint,
+            source_endpoint=self.source_endpoint)])
+        self.assertEqual(result.num_tasks_failed, 0)
+
+    def test_relay_object(self):
+        self.relay()
+        self.assertEqual(self.calls, ['GetObject', 'PutObject'])
+        self.assertEqual(self.uploaded, {0: self.data})
+
+    def test_relay_parts(self):
+        self.relay(multipart_threshold=10)
+        self.assertEqual(self.calls.count('GetObject'), 3)
+        self.assertEqual(self.calls.count('UploadPart'), 3)
+        self.assertNotIn('UploadPartCopy', self.calls)
+        self.assertEqual(self.calls[-1], 'CompleteMultipartUpload')
+        self.assertEqual(
+            self.uploaded,
+            {1: b'01234', 2: b'56789', 3: b'abcde'})
+
+    def test_move_deletes_from_source_endpoint(self):
+        self.relay(operation_name='move')
+        self.assertEqual(self.calls,
+                         ['GetObject', 'PutObject', 'DeleteObject'])
+
+    def test_multipart_move_deletes_from_source_endpoint(self):
+        self.relay(operation_name='move', multipart_threshold=10)
+        self.assertEqual(self.calls[-1], 'DeleteObject')
+
+
+class S3HandlerTestMaxConcurrentRequests(S3HandlerBaseTest):
+    def create_handler(self, **params):
+        params['region'] = 'us-east-1'
+        return S3Handler(mock.Mock(), params)
+
+    def test_thread_per_request(self):
+        s3_handler = self.create_handler(max_concurrent_requests=200)
+        self.assertEqual(s3_handler.executor.num_threads, 200)
+        self.assertEqual(s3_handler.executor._thread_stack_size,
+                         WORKER_THREAD_STACK_SIZE)
+
+    def test_connection_pools_are_sized_for_threads(self):
+        s3_handler = self.create_handler(max_concurrent_requests=200)
+        endpoint = mock.Mock()
+        source_endpoint = mock.Mock()
+        for i in range(3):
+            s3_handler._size_connection_pools(FileInfo(
+                src='bucket/key%s' % i, dest='bucket2/key%s' % i,
+                endpoint=endpoint, source_endpoint=source_endpoint))
+        for pooled in (endpoint, source_endpoint):
+            # Each endpoint is only sized once, for http and https.
+            self.assertEqual(pooled.http_session.mount.call_count, 2)
+            adapter = pooled.http_session.mount.call_args[0][1]
+            self.assertEqual(adapter._pool_maxsize, 200)
+
+    def test_default_connection_pools_are_kept(self):
+        s3_handler = self.create_handler()
+        self.assertEqual(s3_handler.executor._thread_stack_size, None)
+        endpoint = mock.Mock()
+        s3_handler._size_connection_pools(FileInfo(
+            src='bucket/key', dest='bucket2/key', endpoint=endpoint))
+        self.assertFalse(endpoint.http_session.mount.called)
+
+
+class S3HandlerTestRetries(S3HandlerBaseTest):
+    def setUp(self):
+        super(S3HandlerTestRetries, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'foo')
+        self.chunks = [b'aaaaa', b'bbbbb', b'ccccc']
+        with open(self.filename, 'wb') as f:
+            f.write(b''.join(self.chunks))
+        self.service = mock.Mock()
+        self.operations = {}
+        self.service.get_operation.side_effect = self.get_operation
+        self.part_errors = []
+        self.uploaded_parts = []
+
+    def tearDown(self):
+        super(S3HandlerTestRetries, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def get_operation(self, name):
+        if name not in self.operations:
+            self.operations[name] = mock.Mock()
+        return self.operations[name]
+
+    def upload_part(self, **kwargs):
+        body = kwargs['body'].read()
+        if kwargs['part_number'] == 2 and self.part_errors:
+            return self.part_errors.pop(0)
+        self.uploaded_parts.append(kwargs['part_number'])
+        return mock.Mock(), {'ETag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+    def upload(self, **params):
+        params['region'] = 'us-east-1'
+        s3_handler = S3Handler(mock.Mock(), params, multi_threshold=10,
+                               chunksize=5)
+        self.get_operation('UploadPart').call.side_effect = self.upload_part
+        self.get_operation('CreateMultipartUpload').call.return_value = (
+            mock.Mock(), {'UploadId': 'upload_id'})
+        self.get_operation('CompleteMultipartUpload').call.return_value = (
+            mock.Mock(), {})
+        result = s3_handler.call([FileInfo(
+            src=self.filename, dest='bucket/foo', size=15,
+            last_update=datetime.datetime.now(), operation_name='upload',
+            service=self.service, endpoint=mock.Mock())])
+        return s3_handler, result
+
+    def test_failed_part_is_retried(self):
+        self.part_errors = [
+            (mock.Mock(status_code=503),
+             {'Errors': [{'Code': 'SlowDown', 'Message': 'Slow Down'}]}),
+            (mock.Mock(status_code=200), {'ETag': '"corrupted"'})]
+        s3_handler, result = self.upload()
+        self.assertEqual(result.num_tasks_failed, 0)
+        self.assertEqual(sorted(self.uploaded_parts), [1, 2, 3])
+        self.assertFalse(self.get_operation('AbortMultipartUpload').called)
+
+    def test_throttling_backs_off_adaptive_concurrency(self):
+        self.part_errors = [
+            (mock.Mock(status_code=503),
+             {'Errors': [{'Code': 'SlowDown', 'Message': 'Slow Down'}]})]
+        s3_handler, result = self.upload(adaptive_concurrency=True,
+                                         min_concurrency=1)
+        self.assertEqual(result.num_tasks_failed, 0)
+        # It started at the default number of threads.
+        self.assertEqual(s3_handler._concurrency_controller.target, 5)
+
+
 class S3HandlerExceptionSingleTaskTest(S3HandlerBaseTest):
     """
     This tests the ability to handle connection and md5 exceptions.
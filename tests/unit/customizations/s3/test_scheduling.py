@@ -0,0 +1,138 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from awscli.testutils import unittest
+from awscli.customizations.s3.executor import ShutdownThreadRequest
+from awscli.customizations.s3.scheduling import create_scheduling_policy, \
+    ScheduleInfo, RoundRobinPolicy, SmallestFirstPolicy
+from awscli.customizations.s3.utils import StablePriorityQueue
+
+
+class FakeTask(object):
+    PRIORITY = 10
+
+    def __init__(self, name, file, file_size=100, num_bytes=10):
+        self.name = name
+        self._schedule_info = ScheduleInfo(file, file_size, num_bytes)
+
+    def schedule_info(self):
+        return self._schedule_info
+
+
+class BaseSchedulingTest(unittest.TestCase):
+    def create_queue(self, name=None, max_file_bytes_in_flight=None):
+        return StablePriorityQueue(
+            maxsize=100, policy=create_scheduling_policy(
+                name, max_file_bytes_in_flight=max_file_bytes_in_flight))
+
+    def get_names(self, q, count):
+        return [q.get().name for i in range(count)]
+
+
+class TestCreateSchedulingPolicy(unittest.TestCase):
+    def test_create_by_name(self):
+        self.assertIsInstance(create_scheduling_policy('round-robin'),
+                              RoundRobinPolicy)
+        self.assertIsInstance(create_scheduling_policy('smallest-first'),
+                              SmallestFirstPolicy)
+
+    def test_unknown_name(self):
+        with self.assertRaises(ValueError):
+            create_scheduling_policy('random')
+
+
+class TestFifoPolicy(BaseSchedulingTest):
+    def test_queued_order(self):
+        q = self.create_queue()
+        for name in ['a1', 'a2', 'b1']:
+            q.put(FakeTask(name, name[0]))
+        self.assertEqual(self.get_names(q, 3), ['a1', 'a2', 'b1'])
+
+
+class TestRoundRobinPolicy(BaseSchedulingTest):
+    def test_takes_turns_between_files(self):
+        q = self.create_queue('round-robin')
+        for name in ['a1', 'a2', 'a3', 'b1', 'b2', 'c1']:
+            q.put(FakeTask(name, name[0]))
+        self.assertEqual(self.get_names(q, 6),
+                         ['a1', 'b1', 'c1', 'a2', 'b2', 'a3'])
+
+    def test_new_file_starts_at_current_round(self):
+        q = self.create_queue('round-robin')
+        for name in ['a1', 'a2', 'a3']:
+            q.put(FakeTask(name, 'a'))
+        self.assertEqual(self.get_names(q, 2), ['a1', 'a2'])
+        # A file queued later joins in at the round of a2, rather than
+        # getting the rounds that have already been handed out to itself.
+        q.put(FakeTask('b1', 'b'))
+        q.put(FakeTask('b2', 'b'))
+        q.put(FakeTask('b3', 'b'))
+        self.assertEqual(self.get_names(q, 4), ['b1', 'a3', 'b2', 'b3'])
+
+    def test_priority_comes_first(self):
+        q = self.create_queue('round-robin')
+        q.put(FakeTask('a1', 'a'))
+        q.put(ShutdownThreadRequest())
+        q.put(FakeTask('a2', 'a'))
+        self.assertEqual(self.get_names(q, 2), ['a1', 'a2'])
+        self.assertIsInstance(q.get(), ShutdownThreadRequest)
+
+
+class TestSmallestFirstPolicy(BaseSchedulingTest):
+    def test_smallest_files_first(self):
+        q = self.create_queue('smallest-first')
+        q.put(FakeTask('large1', 'large', file_size=1000))
+        q.put(FakeTask('large2', 'large', file_size=1000))
+        q.put(FakeTask('small', 'small', file_size=1))
+        q.put(FakeTask('medium', 'medium', file_size=10))
+        self.assertEqual(self.get_names(q, 4),
+                         ['small', 'medium', 'large1', 'large2'])
+
+
+class TestMaxFileBytesInFlight(BaseSchedulingTest):
+    def test_file_over_limit_is_held_back(self):
+        q = self.create_queue(max_file_bytes_in_flight=20)
+        for name in ['a1', 'a2', 'a3', 'b1']:
+            q.put(FakeTask(name, name[0], num_bytes=10))
+        # a3 would put 30 bytes of a in flight.
+        self.assertEqual(self.get_names(q, 3), ['a1', 'a2', 'b1'])
+        self.assertEqual(q.qsize(), 1)
+
+    def test_held_back_task_released_when_task_finishes(self):
+        q = self.create_queue(max_file_bytes_in_flight=10)
+        a1 = FakeTask('a1', 'a')
+        q.put(a1)
+        q.put(FakeTask('a2', 'a'))
+        q.put(FakeTask('b1', 'b'))
+        q.put(FakeTask('b2', 'b'))
+        self.assertEqual(self.get_names(q, 2), ['a1', 'b1'])
+        q.task_finished(a1)
+        self.assertEqual(self.get_names(q, 1), ['a2'])
+
+    def test_held_back_task_handed_out_if_nothing_else_waits(self):
+        q = self.create_queue(max_file_bytes_in_flight=10)
+        q.put(FakeTask('a1', 'a'))
+        q.put(FakeTask('a2', 'a'))
+        self.assertEqual(self.get_names(q, 2), ['a1', 'a2'])
+        self.assertEqual(q.qsize(), 0)
+
+    def test_shutdown_not_handed_out_before_held_back_task(self):
+        q = self.create_queue(max_file_bytes_in_flight=10)
+        q.put(FakeTask('a1', 'a'))
+        q.put(FakeTask('a2', 'a'))
+        q.put(ShutdownThreadRequest())
+        self.assertEqual(self.get_names(q, 2), ['a1', 'a2'])
+        self.assertIsInstance(q.get(), ShutdownThreadRequest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from awscli.testutils import unittest
+from awscli.customizations.s3.filegenerator import FileStat
+from awscli.customizations.s3.sharding import Shard, parse_shard
+
+
+class TestParseShard(unittest.TestCase):
+    def test_parse_shard(self):
+        shard = parse_shard('1/4', by='prefix')
+        self.assertEqual(shard.index, 1)
+        self.assertEqual(shard.count, 4)
+        self.assertEqual(shard.by, 'prefix')
+        self.assertEqual(str(shard), '1/4')
+
+    def test_invalid_shards(self):
+        for value in ['1', '1/2/3', 'a/4', '4/4', '-1/4', '0/0']:
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_invalid_shard_type(self):
+        with self.assertRaises(ValueError):
+            parse_shard('0/4', by='size')
+
+
+class TestShard(unittest.TestCase):
+    def setUp(self):
+        self.keys = ['dir%s/file%s' % (i % 7, i) for i in range(200)]
+
+    def test_every_key_belongs_to_one_shard(self):
+        shards = [Shard(i, 4) for i in range(4)]
+        for key in self.keys:
+            owners = [shard for shard in shards if shard.owns(key)]
+            self.assertEqual(len(owners), 1)
+        # The keys are spread out between the shards.
+        for shard in shards:
+            self.assertTrue(any(shard.owns(key) for key in self.keys))
+
+    def test_shards_are_stable(self):
+        # The shard of a key must not change between hosts or releases.
+        self.assertTrue(Shard(0, 4).owns('foo'))
+        self.assertTrue(Shard(1, 3).owns(u'\u00e6/bar'))
+
+    def test_prefix_shards_keep_directories_together(self):
+        shards = [Shard(i, 3, by='prefix') for i in range(3)]
+        for key in self.keys:
+            directory = key.split('/')[0]
+            for shard in shards:
+                self.assertEqual(shard.owns(key),
+                                 shard.owns(directory + '/other'))
+
+    def test_excludes_directories_of_other_shards(self):
+        shard = Shard(0, 2, by='prefix')
+        for i in range(10):
+            directory = 'dir%s/' % i
+            self.assertEqual(shard.excludes_all_under(directory),
+                             not shard.owns(directory + 'file'))
+            self.assertEqual(shard.excludes_all_under(directory + 'sub/'),
+                             not shard.owns(directory + 'file'))
+
+    def test_key_shards_exclude_nothing(self):
+        shard = Shard(0, 2)
+        for i in range(10):
+            self.assertFalse(shard.excludes_all_under('dir%s/' % i))
+
+    def test_call_yields_owned_files(self):
+        shard = Shard(1, 3)
+        files = [FileStat(src=key, compare_key=key) for key in self.keys]
+        self.assertEqual(
+            [file_stat.compare_key for file_stat in shard.call(files)],
+            [key for key in self.keys if shard.owns(key)])
+
+
+if __name__ == "__main__":
+    unittest.main()
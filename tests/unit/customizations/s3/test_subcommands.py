@@ -12,8 +12,10 @@
 # language governing permissions and limitations under the License.
 import argparse
 import os
+import shutil
 from six import StringIO
 import sys
+import tempfile
 
 import mock
 from mock import patch, MagicMock
@@ -22,6 +24,8 @@ import botocore.session
 from awscli.customizations.s3.s3 import S3
 from awscli.customizations.s3.subcommands import CommandParameters, \
     CommandArchitecture, CpCommand, SyncCommand, ListCommand, get_endpoint
+from awscli.customizations.s3.filegenerator import FileGenerator
+from awscli.customizations.s3.syncindex import SyncIndex
 from awscli.testutils import unittest, BaseAWSHelpOutputTest
 from tests.unit.customizations.s3 import make_loc_files, clean_loc_files, \
     make_s3_files, s3_cleanup, S3HandlerBaseTest
@@ -147,6 +151,29 @@ class CommandArchitectureTest(S3HandlerBaseTest):
         self.assertEqual(endpoint.region_name, 'us-west-1')
         self.assertEqual(source_endpoint.region_name, 'us-west-2')
 
+    def test_set_endpoint_with_source_endpoint_url_relays_copies(self):
+        params = {'region': 'us-west-1', 'endpoint_url': None,
+                  'verify_ssl': None, 'paths_type': 's3s3',
+                  'source_region': None,
+                  'source_endpoint_url': 'https://storage.example.com',
+                  'copy_mode': None}
+        cmd_arc = CommandArchitecture(self.session, 'cp', params)
+        cmd_arc.set_endpoints()
+        self.assertEqual(cmd_arc._source_endpoint.endpoint_url,
+                         'https://storage.example.com')
+        self.assertEqual(cmd_arc._endpoint.region_name, 'us-west-1')
+        self.assertEqual(params['copy_mode'], 'relay')
+
+    def test_set_endpoint_keeps_explicit_copy_mode(self):
+        params = {'region': 'us-west-1', 'endpoint_url': None,
+                  'verify_ssl': None, 'paths_type': 's3s3',
+                  'source_region': None,
+                  'source_endpoint_url': 'https://storage.example.com',
+                  'copy_mode': 'server'}
+        cmd_arc = CommandArchitecture(self.session, 'cp', params)
+        cmd_arc.set_endpoints()
+        self.assertEqual(params['copy_mode'], 'server')
+
     def test_create_instructions(self):
         """
         This tests to make sure the instructions for any command is generated
@@ -182,6 +209,44 @@ class CommandArchitectureTest(S3HandlerBaseTest):
                                                 'file_info_builder',
                                                 's3_handler'])
 
+    def test_create_instructions_for_stream(self):
+        cmd_arc = CommandArchitecture(self.session, 'cp',
+                                      {'region': 'us-east-1',
+                                       'endpoint_url': None,
+                                       'verify_ssl': None,
+                                       'filters': True,
+                                       'is_stream': True})
+        cmd_arc.create_instructions()
+        self.assertEqual(cmd_arc.instructions, ['s3_handler'])
+
+    def test_create_instructions_with_processes(self):
+        # The processes build their own FileInfo objects.
+        params = {'region': 'us-east-1', 'endpoint_url': None,
+                  'verify_ssl': None, 'num_processes': 4}
+        cmd_arc = CommandArchitecture(self.session, 'sync', params)
+        cmd_arc.create_instructions()
+        self.assertEqual(cmd_arc.instructions,
+                         ['file_generator', 'comparator', 's3_handler'])
+        cmd_arc = CommandArchitecture(self.session, 'mb', params)
+        cmd_arc.create_instructions()
+        self.assertEqual(cmd_arc.instructions, ['s3_handler'])
+
+    def test_create_instructions_with_shard(self):
+        params = {'region': 'us-east-1', 'endpoint_url': None,
+                  'verify_ssl': None, 'shard': '0/2',
+                  'use_sync_index': True, 'paths_type': 'locals3'}
+        cmd_arc = CommandArchitecture(self.session, 'sync', params)
+        cmd_arc.create_instructions()
+        # Files are sharded after they are compared.
+        self.assertEqual(cmd_arc.instructions,
+                         ['file_generator', 'comparator', 'shard',
+                          'sync_index', 'file_info_builder', 's3_handler'])
+        cmd_arc = CommandArchitecture(self.session, 'cp', params)
+        cmd_arc.create_instructions()
+        self.assertEqual(cmd_arc.instructions,
+                         ['file_generator', 'shard', 'file_info_builder',
+                          's3_handler'])
+
     def test_run_cp_put(self):
         # This ensures that the architecture sets up correctly for a ``cp`` put
         # command.  It is just just a dry run, but all of the components need
@@ -312,6 +377,37 @@ class CommandArchitectureTest(S3HandlerBaseTest):
         output_str = "(dryrun) upload: %s to %s" % (rel_local_file, s3_file)
         self.assertIn(output_str, self.output.getvalue())
 
+    def test_run_sync_with_index(self):
+        local_dir = self.loc_files[3]
+        s3_prefix = 's3://' + self.bucket + '/'
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir)
+
+        def sync(**kwargs):
+            params = {'dir_op': True, 'dryrun': False, 'quiet': True,
+                      'src': local_dir, 'dest': s3_prefix, 'filters': None,
+                      'paths_type': 'locals3', 'region': 'us-east-1',
+                      'endpoint_url': None, 'verify_ssl': None,
+                      'follow_symlinks': True, 'use_sync_index': True}
+            params.update(kwargs)
+            cmd_arc = CommandArchitecture(self.session, 'sync', params)
+            cmd_arc.create_instructions()
+            self.assertIn('sync_index', cmd_arc.instructions)
+            return cmd_arc.run()
+
+        with patch.object(SyncIndex, 'DEFAULT_DIRECTORY', index_dir):
+            self.assertEqual(sync(), 0)
+            # Anything changed at the destination behind the index's back
+            # isn't seen while the index is fresh.
+            del self.session.s3[self.bucket]['text1.txt']
+            with patch.object(FileGenerator, 'list_objects') as list_objects:
+                self.assertEqual(sync(), 0)
+                self.assertFalse(list_objects.called)
+            self.assertNotIn('text1.txt', self.session.s3[self.bucket])
+            # Until the destination is reconciled again.
+            self.assertEqual(sync(full_reconcile=True), 0)
+            self.assertIn('text1.txt', self.session.s3[self.bucket])
+
     def test_run_mb(self):
         # This ensures that the architecture sets up correctly for a ``rb``
         # command.  It is just just a dry run, but all of the components need
@@ -454,6 +550,40 @@ class CommandParametersTest(unittest.TestCase):
             cmd_parameter.add_region(mock.Mock())
             cmd_parameter.check_src_path(filename[0])
 
+    def test_stream_paths(self):
+        s3_file = 's3://' + self.bucket + '/' + 'text1.txt'
+        for paths in (['-', s3_file], [s3_file, '-']):
+            cmd_param = CommandParameters(self.session, 'cp', {}, '')
+            cmd_param.add_paths(paths)
+            self.assertTrue(cmd_param.parameters['is_stream'])
+        cmd_param = CommandParameters(self.session, 'cp', {}, '')
+        cmd_param.add_paths([self.loc_files[0], s3_file])
+        self.assertNotIn('is_stream', cmd_param.parameters)
+
+    def test_invalid_stream_paths(self):
+        s3_file = 's3://' + self.bucket + '/' + 'text1.txt'
+        s3_prefix = 's3://' + self.bucket + '/'
+        invalid = [('mv', {}, ['-', s3_file]),
+                   ('sync', {}, ['-', s3_prefix]),
+                   ('cp', {'dir_op': True}, [s3_prefix, '-']),
+                   ('cp', {}, ['-', s3_prefix]),
+                   ('cp', {}, ['-', '-']),
+                   ('cp', {}, ['-', self.loc_files[0]])]
+        for cmd, parameters, paths in invalid:
+            cmd_param = CommandParameters(self.session, cmd, parameters, '')
+            with self.assertRaises(ValueError):
+                cmd_param.add_paths(paths)
+
+    def test_invalid_shards(self):
+        s3_file = 's3://' + self.bucket + '/' + 'text1.txt'
+        s3_prefix = 's3://' + self.bucket + '/'
+        invalid = [({'shard': '4/4'}, [self.loc_files[0], s3_prefix]),
+                   ({'shard': '0/2'}, ['-', s3_file])]
+        for parameters, paths in invalid:
+            cmd_param = CommandParameters(self.session, 'cp', parameters, '')
+            with self.assertRaises(ValueError):
+                cmd_param.add_paths(paths)
+
     def test_check_force(self):
         # This checks to make sure that the force parameter is run. If
         # successful. The delete command will fail as the bucket is empty
@@ -0,0 +1,122 @@
+# Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import datetime
+import os
+import shutil
+import tempfile
+
+from dateutil.tz import tzutc
+
+from awscli.testutils import unittest
+from awscli.customizations.s3.filegenerator import FileStat
+from awscli.customizations.s3.sharding import Shard
+from awscli.customizations.s3.syncindex import SyncIndex
+
+
+class FakeFileGenerator(object):
+    def __init__(self, file_stats):
+        self.file_stats = file_stats
+
+    def call(self, files):
+        for file_stat in self.file_stats:
+            yield file_stat
+
+
+class TestSyncIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.index = SyncIndex('src/', 'bucket/', self.tempdir)
+        self.now = datetime.datetime(2014, 9, 1, 12, 0, 0, tzinfo=tzutc())
+        self.files = {'src': {'path': 'bucket/', 'type': 's3'},
+                      'dest': {'path': 'src/', 'type': 'local'}}
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tempdir)
+
+    def file_stat(self, compare_key, size=1, operation_name=''):
+        return FileStat(src='bucket/' + compare_key, compare_key=compare_key,
+                        size=size, last_update=self.now, src_type='s3',
+                        operation_name=operation_name, etag='etag')
+
+    def record_listing(self, compare_keys):
+        recorder = self.index.recorder(FakeFileGenerator(
+            [self.file_stat(compare_key) for compare_key in compare_keys]))
+        return list(recorder.call(self.files))
+
+    def indexed_keys(self):
+        return [(file_stat.compare_key, file_stat.size) for file_stat
+                in self.index.call(self.files)]
+
+    def test_new_index_is_not_fresh(self):
+        self.assertFalse(self.index.is_fresh(60))
+
+    def test_listing_is_recorded(self):
+        listed = self.record_listing(['a', 'b/c'])
+        self.assertEqual(len(listed), 2)
+        self.index.commit()
+        self.assertTrue(self.index.is_fresh(60))
+        file_stats = list(self.index.call(self.files))
+        self.assertEqual([file_stat.compare_key for file_stat in file_stats],
+                         ['a', 'b/c'])
+        file_stat = file_stats[1]
+        self.assertEqual(file_stat.src, 'bucket/b/c')
+        self.assertEqual(file_stat.dest, 'src' + os.sep + 'b' + os.sep + 'c')
+        self.assertEqual(file_stat.last_update, self.now)
+        self.assertEqual(file_stat.etag, 'etag')
+
+    def test_index_is_kept_between_runs(self):
+        self.record_listing(['a'])
+        self.index.commit()
+        self.index.close()
+        self.index = SyncIndex('src/', 'bucket/', self.tempdir)
+        self.assertTrue(self.index.is_fresh(60))
+        self.assertEqual(self.indexed_keys(), [('a', 1)])
+
+    def test_staged_changes_are_applied_on_commit(self):
+        self.record_listing(['a', 'b', 'c'])
+        self.index.commit()
+        tracker = self.index.tracker()
+        list(tracker.call([self.file_stat('b', size=5),
+                           self.file_stat('c', operation_name='delete'),
+                           self.file_stat('d', size=7)]))
+        self.index.commit()
+        self.assertEqual(self.indexed_keys(),
+                         [('a', 1), ('b', 5), ('d', 7)])
+
+    def test_invalidate_discards_changes(self):
+        self.record_listing(['a'])
+        self.index.commit()
+        list(self.index.tracker().call([self.file_stat('b')]))
+        self.index.invalidate()
+        self.assertFalse(self.index.is_fresh(60))
+        self.assertEqual(self.indexed_keys(), [('a', 1)])
+
+    def test_indexes_are_separate_per_source_and_destination(self):
+        self.record_listing(['a'])
+        self.index.commit()
+        other = SyncIndex('other/', 'bucket/', self.tempdir)
+        self.assertFalse(other.is_fresh(60))
+        other.close()
+
+    def test_indexes_are_separate_per_shard(self):
+        self.record_listing(['a'])
+        self.index.commit()
+        for shard in [Shard(0, 2), Shard(1, 2), Shard(0, 2, by='prefix')]:
+            other = SyncIndex('src/', 'bucket/', self.tempdir, shard=shard)
+            self.assertFalse(other.is_fresh(60))
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,7 +10,11 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
-from awscli.testutils import unittest
+from awscli.testutils import unittest, temporary_file
+import datetime
+import errno
+import hashlib
+import os
 import random
 import threading
 import mock
@@ -21,12 +25,21 @@ from botocore.exceptions import IncompleteReadError
 from awscli.customizations.s3.tasks import CreateLocalFileTask
 from awscli.customizations.s3.tasks import CompleteDownloadTask
 from awscli.customizations.s3.tasks import DownloadPartTask
+from awscli.customizations.s3.tasks import DeleteObjectsTask
+from awscli.customizations.s3.tasks import UploadPartTask
+from awscli.customizations.s3.tasks import UploadStreamPartTask
+from awscli.customizations.s3.tasks import DownloadStreamPartTask
 from awscli.customizations.s3.tasks import MultipartUploadContext
+from awscli.customizations.s3.tasks import CompleteMultipartUploadTask
+from awscli.customizations.s3.tasks import MultipartDownloadContext
 from awscli.customizations.s3.tasks import UploadCancelledError
 from awscli.customizations.s3.tasks import print_operation
 from awscli.customizations.s3.tasks import RetriesExeededError
 from awscli.customizations.s3.executor import ShutdownThreadRequest
 from awscli.customizations.s3.utils import StablePriorityQueue
+from awscli.customizations.s3.utils import calculate_multipart_etag
+from awscli.customizations.s3.utils import PrintTask
+from awscli.customizations.s3.retries import RetryPolicy
 
 
 class TestMultipartUploadContext(unittest.TestCase):
@@ -111,6 +124,43 @@ class TestMultipartUploadContext(unittest.TestCase):
         # This will return right away since we've already announced completion.
         self.assertIsNone(context.wait_for_completion())
 
+    def test_total_parts_can_be_announced_later(self):
+        context = MultipartUploadContext(expected_parts=None)
+        context.announce_upload_id('my_upload_id')
+        context.announce_finished_part(etag='etag1', part_number=1)
+        context.announce_total_parts(1)
+        self.assertEqual(context.wait_for_parts_to_finish(),
+                         [{'ETag': 'etag1', 'PartNumber': 1}])
+
+    def test_dependencies_done_as_upload_progresses(self):
+        context = MultipartUploadContext(expected_parts=None)
+        self.assertFalse(context.upload_id_available.is_done())
+        context.announce_upload_id('my_upload_id')
+        self.assertTrue(context.upload_id_available.is_done())
+        context.announce_finished_part(etag='etag1', part_number=1)
+        # The number of parts isn't known yet.
+        self.assertFalse(context.parts_finished.is_done())
+        context.announce_total_parts(1)
+        self.assertTrue(context.parts_finished.is_done())
+        self.assertFalse(context.upload_finished.is_done())
+        context.announce_completed()
+        self.assertTrue(context.upload_finished.is_done())
+
+    def test_dependencies_done_when_cancelled(self):
+        self.context.cancel_upload()
+        self.assertTrue(self.context.upload_id_available.is_done())
+        self.assertTrue(self.context.parts_finished.is_done())
+        self.assertTrue(self.context.upload_finished.is_done())
+
+    def test_dependencies_done_for_journaled_upload(self):
+        journal_entry = mock.Mock()
+        journal_entry.get.return_value = 'my_upload_id'
+        journal_entry.parts = {1: 'etag1'}
+        context = MultipartUploadContext(expected_parts=1,
+                                         journal_entry=journal_entry)
+        self.assertTrue(context.upload_id_available.is_done())
+        self.assertTrue(context.parts_finished.is_done())
+
     def test_basic_threaded_parts(self):
         # Now while test_normal_non_threaded showed the conceptual idea,
         # the real strength of MultipartUploadContext is that it works
@@ -258,6 +308,135 @@ class TestMultipartUploadContext(unittest.TestCase):
         self.assertIsInstance(self.caught_exception, UploadCancelledError)
 
 
+class TestMultipartDownloadContext(unittest.TestCase):
+    def setUp(self):
+        self.context = MultipartDownloadContext(num_parts=2)
+        self.file_writer = mock.Mock()
+
+    def test_wait_for_file_created_returns_writer(self):
+        self.context.announce_file_created(self.file_writer)
+        self.assertIs(self.context.wait_for_file_created(), self.file_writer)
+
+    def test_close_file_only_closes_once(self):
+        self.context.announce_file_created(self.file_writer)
+        self.context.close_file(fsync=True)
+        self.context.close_file()
+        self.file_writer.close.assert_called_once_with(fsync=True)
+
+    def test_close_file_before_created(self):
+        # Nothing to close, this should not raise.
+        self.context.close_file()
+
+    def test_journaled_parts_are_finished(self):
+        journal_entry = mock.Mock()
+        journal_entry.parts = {0: None, 1: None}
+        context = MultipartDownloadContext(num_parts=2,
+                                           journal_entry=journal_entry)
+        context.announce_file_created(self.file_writer)
+        # All the parts were downloaded previously, so this won't block.
+        context.wait_for_completion()
+
+    def test_finished_parts_are_journaled(self):
+        journal_entry = mock.Mock()
+        journal_entry.parts = {}
+        context = MultipartDownloadContext(num_parts=2,
+                                           journal_entry=journal_entry)
+        context.announce_completed_part(1)
+        journal_entry.record_part.assert_called_with(1, None,
+                                                     sync=mock.ANY)
+
+    def test_file_is_synced_before_parts_are_saved(self):
+        journal_entry = mock.Mock()
+        journal_entry.parts = {}
+        context = MultipartDownloadContext(num_parts=2,
+                                           journal_entry=journal_entry)
+        context.announce_file_created(self.file_writer)
+        context.announce_completed_part(1)
+        sync = journal_entry.record_part.call_args[1]['sync']
+        sync()
+        self.file_writer.sync.assert_called_with()
+
+    def test_dependencies_done_when_file_created_and_parts_finished(self):
+        self.assertFalse(self.context.file_created.is_done())
+        self.context.announce_file_created(self.file_writer)
+        self.assertTrue(self.context.file_created.is_done())
+        self.context.announce_completed_part(0)
+        self.assertFalse(self.context.download_finished.is_done())
+        self.context.announce_completed_part(1)
+        self.assertTrue(self.context.download_finished.is_done())
+
+    def test_dependencies_done_when_cancelled(self):
+        self.context.cancel()
+        self.assertTrue(self.context.file_created.is_done())
+        self.assertTrue(self.context.download_finished.is_done())
+
+
+class TestCompleteDownloadTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.filename = mock.Mock()
+        self.filename.operation_name = 'download'
+        self.filename.src = 'bucket/key'
+        self.filename.src_type = 's3'
+        self.filename.dest_type = 'local'
+        self.filename.last_update = datetime.datetime(2014, 1, 1)
+
+    def test_download_is_completed(self):
+        context = MultipartDownloadContext(num_parts=2)
+        for part_number in range(2):
+            context.announce_completed_part(part_number)
+        with temporary_file('wb') as f:
+            f.write(b'foobar')
+            f.flush()
+            self.filename.dest = f.name
+            task = CompleteDownloadTask(context, self.filename,
+                                        self.result_queue, {'dryrun': False})
+            task()
+            self.assertEqual(
+                datetime.datetime.fromtimestamp(os.path.getmtime(f.name)),
+                self.filename.last_update)
+        print_task = self.result_queue.put.call_args[0][0]
+        self.assertFalse(print_task.error)
+
+
+class TestCompleteMultipartUploadTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.filename = mock.Mock()
+        self.filename.operation_name = 'upload'
+        self.filename.src = 'local/file'
+        self.filename.src_type = 'local'
+        self.filename.dest = 'bucket/key'
+        self.filename.dest_type = 's3'
+        self.upload_context = mock.Mock()
+        self.upload_context.wait_for_parts_to_finish.return_value = [
+            {'ETag': hashlib.md5(b'foo').hexdigest(), 'PartNumber': 1},
+            {'ETag': hashlib.md5(b'bar').hexdigest(), 'PartNumber': 2}]
+
+    def complete_upload(self, etag):
+        self.filename.service.get_operation.return_value.call.return_value = (
+            mock.Mock(status_code=200), {'ETag': '"%s"' % etag})
+        task = CompleteMultipartUploadTask(
+            mock.Mock(), self.filename, {'dryrun': False}, self.result_queue,
+            self.upload_context)
+        task()
+        return self.result_queue.put.call_args[0][0]
+
+    def test_multipart_etag_matches(self):
+        etag = calculate_multipart_etag([hashlib.md5(b'foo').digest(),
+                                         hashlib.md5(b'bar').digest()])
+        print_task = self.complete_upload(etag)
+        self.assertFalse(print_task.error)
+        self.assertTrue(self.upload_context.announce_completed.called)
+
+    def test_multipart_etag_mismatch(self):
+        print_task = self.complete_upload('abcd-2')
+        self.assertTrue(print_task.error)
+        self.assertFalse(self.upload_context.announce_completed.called)
+        # Tasks that depend on the upload finishing must see it failed.
+        self.assertTrue(self.upload_context.cancel_upload.called)
+
+
 class TestPrintOperation(unittest.TestCase):
     def test_print_operation(self):
         filename = mock.Mock()
@@ -270,10 +449,231 @@ class TestPrintOperation(unittest.TestCase):
         self.assertIn(r'e:\foo', message)
 
 
+class TestUploadPartTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.service = mock.Mock()
+        self.upload_context = mock.Mock()
+        self.upload_context.wait_for_upload_id.return_value = 'upload_id'
+        self.filename = mock.Mock()
+        self.filename.size = 6
+        self.filename.dest = 'bucket/key'
+        self.filename.service = self.service
+        self.filename.operation_name = 'upload'
+        self.upload_context.is_cancelled.return_value = False
+        self.retry_policy = RetryPolicy(sleep=mock.Mock())
+
+    def upload_part(self, etag, errors=()):
+        operation = self.service.get_operation.return_value
+        operation.call.side_effect = list(errors) + [
+            (mock.Mock(status_code=200), {'ETag': '"%s"' % etag})]
+        with temporary_file('wb') as f:
+            f.write(b'foobar')
+            f.flush()
+            self.filename.src = f.name
+            task = UploadPartTask(1, 6, self.result_queue,
+                                  self.upload_context, self.filename,
+                                  retry_policy=self.retry_policy)
+            task()
+        return operation.call.call_args
+
+    def test_part_is_sent_with_content_md5(self):
+        call_args = self.upload_part('3858f62230ac3c915f300c664312c63f')
+        self.assertEqual(call_args[1]['content_md5'],
+                         'OFj2IjCsPJFfMAxmQxLGPw==')
+        self.upload_context.announce_finished_part.assert_called_with(
+            etag='3858f62230ac3c915f300c664312c63f', part_number=1)
+
+    def test_etag_mismatch_cancels_upload(self):
+        mismatch = (mock.Mock(status_code=200),
+                    {'ETag': '"d41d8cd98f00b204e9800998ecf8427e"'})
+        self.upload_part('d41d8cd98f00b204e9800998ecf8427e',
+                         errors=[mismatch] * 4)
+        # The part was sent again before the upload was given up on.
+        self.assertEqual(
+            self.service.get_operation.return_value.call.call_count,
+            self.retry_policy.max_attempts)
+        self.assertFalse(self.upload_context.announce_finished_part.called)
+        self.assertTrue(self.upload_context.cancel_upload.called)
+
+    def test_failed_part_is_retried(self):
+        reset = socket.error(errno.ECONNRESET, 'reset')
+        call_args = self.upload_part('3858f62230ac3c915f300c664312c63f',
+                                     errors=[reset])
+        self.assertEqual(
+            self.service.get_operation.return_value.call.call_count, 2)
+        # The retry is sent with a body of its own.
+        self.assertEqual(call_args[1]['body'].read(), b'foobar')
+        self.upload_context.announce_finished_part.assert_called_with(
+            etag='3858f62230ac3c915f300c664312c63f', part_number=1)
+        self.assertFalse(self.upload_context.cancel_upload.called)
+
+    def test_part_of_cancelled_upload_is_not_retried(self):
+        self.upload_context.is_cancelled.return_value = True
+        reset = socket.error(errno.ECONNRESET, 'reset')
+        self.upload_part('3858f62230ac3c915f300c664312c63f',
+                         errors=[reset])
+        self.assertEqual(
+            self.service.get_operation.return_value.call.call_count, 1)
+        self.assertFalse(self.upload_context.announce_finished_part.called)
+
+    def test_memory_needed_by_buffered_part(self):
+        task = UploadPartTask(1, 6, self.result_queue,
+                              self.upload_context, self.filename)
+        self.assertEqual(task.memory_needed(), 6)
+
+    def test_streamed_part_needs_no_memory(self):
+        chunk_size = 64 * 1024 * 1024
+        task = UploadPartTask(1, chunk_size, self.result_queue,
+                              self.upload_context, self.filename)
+        self.assertEqual(task.memory_needed(), 0)
+
+
+class TestDeleteObjectsTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.service = mock.Mock()
+        self.operation = self.service.get_operation.return_value
+        self.filenames = []
+        for key in ('foo', 'bar'):
+            filename = mock.Mock()
+            filename.src = 'bucket/' + key
+            filename.src_type = 's3'
+            filename.operation_name = 'delete'
+            filename.service = self.service
+            self.filenames.append(filename)
+        self.task = DeleteObjectsTask(self.filenames, {'dryrun': False},
+                                      self.result_queue)
+
+    def results(self):
+        return [call[0][0] for call in self.result_queue.put.call_args_list]
+
+    def test_objects_are_deleted_in_one_request(self):
+        self.operation.call.return_value = (mock.Mock(status_code=200), {})
+        self.task()
+        self.assertEqual(self.operation.call.call_count, 1)
+        self.assertEqual(self.operation.call.call_args[1]['delete'], {
+            'Objects': [{'Key': 'foo'}, {'Key': 'bar'}], 'Quiet': True})
+        self.assertEqual([result.error for result in self.results()],
+                         [False, False])
+
+    def test_key_errors_are_reported(self):
+        self.operation.call.return_value = (
+            mock.Mock(status_code=200),
+            {'Errors': [{'Key': 'bar', 'Code': 'AccessDenied',
+                         'Message': 'Access Denied'}]})
+        self.task()
+        results = self.results()
+        self.assertEqual([result.error for result in results],
+                         [False, True])
+        self.assertIn('AccessDenied: Access Denied', results[1].message)
+
+    def test_request_error_fails_every_key(self):
+        self.operation.call.return_value = (
+            mock.Mock(status_code=404),
+            {'Errors': [{'Message': 'Bucket does not exist'}]})
+        self.task()
+        results = self.results()
+        self.assertEqual([result.error for result in results],
+                         [True, True])
+        self.assertIn('Bucket does not exist', results[0].message)
+
+    def test_only_errors_are_queued_when_quiet(self):
+        self.operation.call.return_value = (mock.Mock(status_code=200), {
+            'Errors': [{'Key': 'bar', 'Code': 'AccessDenied',
+                        'Message': 'Access Denied'}]})
+        task = DeleteObjectsTask(self.filenames,
+                                 {'dryrun': False, 'quiet': True},
+                                 self.result_queue)
+        task()
+        self.assertEqual(self.results(), [PrintTask(message='', error=True)])
+
+
+class TestUploadStreamPartTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.service = mock.Mock()
+        self.upload_context = mock.Mock()
+        self.upload_context.wait_for_upload_id.return_value = 'upload_id'
+        self.filename = mock.Mock()
+        self.filename.src = '-'
+        self.filename.dest = 'bucket/key'
+        self.filename.service = self.service
+        self.filename.operation_name = 'upload'
+        self.on_done = mock.Mock()
+
+    def test_part_is_uploaded_from_memory(self):
+        self.service.get_operation.return_value.call.return_value = (
+            mock.Mock(), {'ETag': '"3858f62230ac3c915f300c664312c63f"'})
+        task = UploadStreamPartTask(2, 6, self.result_queue,
+                                    self.upload_context, self.filename,
+                                    b'foobar', self.on_done)
+        task()
+        self.upload_context.announce_finished_part.assert_called_with(
+            etag='3858f62230ac3c915f300c664312c63f', part_number=2)
+        self.on_done.assert_called_with()
+
+    def test_on_done_is_called_on_failure(self):
+        self.service.get_operation.return_value.call.side_effect = \
+            Exception('Upload failed')
+        task = UploadStreamPartTask(2, 6, self.result_queue,
+                                    self.upload_context, self.filename,
+                                    b'foobar', self.on_done)
+        task()
+        self.assertTrue(self.upload_context.cancel_upload.called)
+        self.on_done.assert_called_with()
+
+
+class TestDownloadStreamPartTask(unittest.TestCase):
+    def setUp(self):
+        self.result_queue = mock.Mock()
+        self.service = mock.Mock()
+        self.filename = mock.Mock()
+        self.filename.size = 12
+        self.filename.src = 'bucket/key'
+        self.filename.dest = '-'
+        self.filename.service = self.service
+        self.filename.operation_name = 'download'
+        self.context = mock.Mock()
+        self.context.is_cancelled.return_value = False
+        self.stream_writer = mock.Mock()
+        self.stream_writer.wait_for_slot.return_value = True
+
+    def test_part_is_handed_to_the_writer_whole(self):
+        body = mock.Mock()
+        body.read.side_effect = [b'foo', b'bar', b'']
+        self.service.get_operation.return_value.call.return_value = (
+            mock.Mock(), {'Body': body})
+        task = DownloadStreamPartTask(1, 6, self.result_queue, self.service,
+                                      self.filename, self.context,
+                                      self.stream_writer)
+        task()
+        self.stream_writer.wait_for_slot.assert_called_with(1)
+        self.stream_writer.write.assert_called_with(1, b'foobar')
+
+    def test_failure_cancels_the_writer(self):
+        self.service.get_operation.return_value.call.side_effect = \
+            Exception('Download failed')
+        task = DownloadStreamPartTask(1, 6, self.result_queue, self.service,
+                                      self.filename, self.context,
+                                      self.stream_writer)
+        with self.assertRaises(Exception):
+            task()
+        self.context.cancel.assert_called_with()
+        self.stream_writer.cancel.assert_called_with()
+
+    def test_part_is_skipped_when_writer_is_cancelled(self):
+        self.stream_writer.wait_for_slot.return_value = False
+        task = DownloadStreamPartTask(1, 6, self.result_queue, self.service,
+                                      self.filename, self.context,
+                                      self.stream_writer)
+        task()
+        self.assertFalse(self.service.get_operation.called)
+
+
 class TestDownloadPartTask(unittest.TestCase):
     def setUp(self):
         self.result_queue = mock.Mock()
-        self.io_queue = mock.Mock()
         self.service = mock.Mock()
         self.filename = mock.Mock()
         self.filename.size = 10 * 1024 * 1024
@@ -282,64 +682,85 @@ class TestDownloadPartTask(unittest.TestCase):
         self.filename.service = self.service
         self.filename.operation_name = 'download'
         self.context = mock.Mock()
+        self.context.is_cancelled.return_value = False
         self.open = mock.MagicMock()
+        self.retry_policy = RetryPolicy(sleep=mock.Mock())
 
     def test_socket_timeout_is_retried(self):
-        self.service.get_operation.return_value.call.side_effect = socket.error
+        operation = self.service.get_operation.return_value
+        operation.call.side_effect = socket.timeout
         task = DownloadPartTask(0, 1024 * 1024, self.result_queue,
                                 self.service, self.filename, self.context,
-                                self.io_queue)
-        # The mock is configured to keep raising a socket.error
+                                retry_policy=self.retry_policy)
+        # The mock is configured to keep raising a socket.timeout
         # so we should cancel the download.
         with self.assertRaises(RetriesExeededError):
             task()
         self.context.cancel.assert_called_with()
         # And we retried the request multiple times.
-        self.assertEqual(DownloadPartTask.TOTAL_ATTEMPTS,
-                         self.service.get_operation.call_count)
+        self.assertEqual(self.retry_policy.max_attempts,
+                         operation.call.call_count)
+
+    def test_local_errors_are_not_retried(self):
+        body = mock.Mock()
+        body.read.return_value = b'foobar'
+        operation = self.service.get_operation.return_value
+        operation.call.return_value = (mock.Mock(), {'Body': body})
+        file_writer = self.context.wait_for_file_created.return_value
+        file_writer.write.side_effect = IOError(errno.ENOSPC,
+                                                'No space left on device')
+        task = DownloadPartTask(0, 1024 * 1024, self.result_queue,
+                                self.service, self.filename, self.context,
+                                retry_policy=self.retry_policy)
+        with self.assertRaises(IOError):
+            task()
+        self.context.cancel.assert_called_with()
+        self.assertEqual(operation.call.call_count, 1)
 
     def test_download_succeeds(self):
         body = mock.Mock()
         body.read.return_value = b''
         self.service.get_operation.return_value.call.side_effect = [
-            socket.error, (mock.Mock(), {'Body': body})]
+            socket.timeout, (mock.Mock(), {'Body': body})]
         task = DownloadPartTask(0, 1024 * 1024, self.result_queue,
                                 self.service, self.filename, self.context,
-                                self.io_queue)
+                                retry_policy=self.retry_policy)
         task()
         self.assertEqual(self.result_queue.put.call_count, 1)
         # And we tried twice, the first one failed, the second one
         # succeeded.
-        self.assertEqual(self.service.get_operation.call_count, 2)
+        operation = self.service.get_operation.return_value
+        self.assertEqual(operation.call.call_count, 2)
 
-    def test_download_queues_io_properly(self):
+    def test_download_writes_at_part_offsets(self):
         body = mock.Mock()
         body.read.side_effect = [b'foobar', b'morefoobar', b'']
         self.service.get_operation.return_value.call.side_effect = [
             (mock.Mock(), {'Body': body}),
         ]
-        task = DownloadPartTask(0, 1024 * 1024, self.result_queue,
-                                self.service, self.filename, self.context,
-                                self.io_queue)
+        file_writer = self.context.wait_for_file_created.return_value
+        task = DownloadPartTask(1, 1024 * 1024, self.result_queue,
+                                self.service, self.filename, self.context)
         task()
-        call_args_list = self.io_queue.put.call_args_list
+        call_args_list = file_writer.write.call_args_list
         self.assertEqual(len(call_args_list), 2)
         self.assertEqual(call_args_list[0],
-                         mock.call(('local/file', 0, b'foobar')))
+                         mock.call(1024 * 1024, b'foobar'))
         self.assertEqual(call_args_list[1],
-                         mock.call(('local/file', 6, b'morefoobar')))
+                         mock.call(1024 * 1024 + 6, b'morefoobar'))
 
     def test_incomplete_read_is_retried(self):
         self.service.get_operation.return_value.call.side_effect = \
                 IncompleteReadError(actual_bytes=1, expected_bytes=2)
         task = DownloadPartTask(0, 1024 * 1024, self.result_queue,
                                 self.service, self.filename,
-                                self.context, self.io_queue)
+                                self.context, retry_policy=self.retry_policy)
         with self.assertRaises(RetriesExeededError):
             task()
         self.context.cancel.assert_called_with()
-        self.assertEqual(DownloadPartTask.TOTAL_ATTEMPTS,
-                         self.service.get_operation.call_count)
+        operation = self.service.get_operation.return_value
+        self.assertEqual(self.retry_policy.max_attempts,
+                         operation.call.call_count)
 
 
 class TestTaskOrdering(unittest.TestCase):
@@ -352,10 +773,10 @@ class TestTaskOrdering(unittest.TestCase):
         return CreateLocalFileTask(None, None)
 
     def complete_task(self):
-        return CompleteDownloadTask(None, None, None, None, None)
+        return CompleteDownloadTask(None, None, None, None)
 
     def download_task(self):
-        return DownloadPartTask(None, None, None, None, mock.Mock(), None, None)
+        return DownloadPartTask(None, None, None, None, mock.Mock(), None)
 
     def shutdown_task(self, priority=None):
         return ShutdownThreadRequest(priority)
@@ -1,21 +1,38 @@
 from awscli.testutils import unittest, temporary_file
 import argparse
+import hashlib
 import os
 import tempfile
 import shutil
 import ntpath
+import threading
 import time
 import datetime
 
 import mock
+import six
 from dateutil.tz import tzlocal
 
 from botocore.hooks import HierarchicalEmitter
 from awscli.customizations.s3.utils import find_bucket_key, find_chunksize
 from awscli.customizations.s3.utils import ReadFileChunk
+from awscli.customizations.s3.utils import PositionalFileWriter
+from awscli.customizations.s3.utils import OrderedStreamWriter
+from awscli.customizations.s3.utils import read_stream_chunk
+from awscli.customizations.s3.utils import HashingReader
+from awscli.customizations.s3.utils import add_hashing_body
+from awscli.customizations.s3.utils import StreamingBodyReader
+from awscli.customizations.s3.utils import check_md5_etag, MD5Error
+from awscli.customizations.s3.utils import check_error, ThrottlingError
+from awscli.customizations.s3.utils import calculate_multipart_etag
+from awscli.customizations.s3.utils import calculate_multipart_etag_from_parts
+from awscli.customizations.s3.utils import infer_part_size
 from awscli.customizations.s3.utils import relative_path
 from awscli.customizations.s3.utils import StablePriorityQueue
+from awscli.customizations.s3.utils import TaskDependency
 from awscli.customizations.s3.utils import BucketLister
+from awscli.customizations.s3.utils import ParallelBucketLister
+from awscli.customizations.s3.utils import BackgroundGenerator
 from awscli.customizations.s3.utils import ScopedEventHandler
 from awscli.customizations.s3.utils import get_file_stat
 from awscli.customizations.s3.utils import AppendFilter
@@ -154,6 +171,220 @@ class TestReadFileChunk(unittest.TestCase):
         self.assertEqual(chunk.tell(), 0)
 
 
+class TestPositionalFileWriter(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'foo')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_file_is_preallocated(self):
+        writer = PositionalFileWriter(self.filename, size=10)
+        writer.close()
+        self.assertEqual(os.path.getsize(self.filename), 10)
+
+    def test_out_of_order_writes(self):
+        writer = PositionalFileWriter(self.filename, size=15)
+        writer.write(6, b'morestuff')
+        writer.write(0, b'foobar')
+        writer.close(fsync=True)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'foobarmorestuff')
+
+    def test_seek_and_write_fallback(self):
+        writer = PositionalFileWriter(self.filename, size=15)
+        writer._use_pwrite = False
+        writer.write(6, b'morestuff')
+        writer.write(0, b'foobar')
+        writer.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'foobarmorestuff')
+
+    def test_truncates_existing_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'old contents of the file')
+        writer = PositionalFileWriter(self.filename, size=3)
+        writer.write(0, b'new')
+        writer.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+
+    def test_write_after_close(self):
+        writer = PositionalFileWriter(self.filename)
+        writer.close()
+        # Closing more than once is fine.
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.write(0, b'foo')
+
+    def test_sync(self):
+        writer = PositionalFileWriter(self.filename, size=3)
+        writer._use_pwrite = False
+        writer.write(0, b'foo')
+        with mock.patch('os.fsync') as fsync:
+            writer.sync()
+            fsync.assert_called_with(writer._fileno)
+        # The buffered write was flushed.
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'foo')
+        writer.close()
+        # Syncing a closed file does nothing.
+        writer.sync()
+
+
+class TestHashingReader(unittest.TestCase):
+    # md5 of b'foobar'
+    FOOBAR_MD5 = '3858f62230ac3c915f300c664312c63f'
+
+    def test_hashes_while_streaming(self):
+        reader = HashingReader(six.BytesIO(b'foobar'), 6)
+        self.assertEqual(len(reader), 6)
+        self.assertEqual(reader.read(3), b'foo')
+        self.assertEqual(reader.read(), b'bar')
+        self.assertEqual(reader.tell(), 6)
+        self.assertEqual(reader.hexdigest(), self.FOOBAR_MD5)
+
+    def test_seek_resets_digest(self):
+        reader = HashingReader(six.BytesIO(b'foobar'), 6)
+        reader.read()
+        reader.seek(0)
+        self.assertEqual(reader.read(), b'foobar')
+        self.assertEqual(reader.hexdigest(), self.FOOBAR_MD5)
+
+    def test_reads_rest_of_body_for_digest(self):
+        reader = HashingReader(six.BytesIO(b'foobar'), 6)
+        reader.read(2)
+        self.assertEqual(reader.hexdigest(), self.FOOBAR_MD5)
+
+    def test_only_reads_size_bytes(self):
+        fileobj = six.BytesIO(b'xxfoobarxx')
+        fileobj.seek(2)
+        reader = HashingReader(fileobj, 6)
+        self.assertEqual(reader.read(), b'foobar')
+        reader.seek(0)
+        self.assertEqual(reader.read(100), b'foobar')
+        self.assertEqual(reader.hexdigest(), self.FOOBAR_MD5)
+
+    def test_buffered(self):
+        reader = HashingReader(six.BytesIO(b'foobar'), 6)
+        reader.buffer()
+        self.assertEqual(reader.base64_digest(), 'OFj2IjCsPJFfMAxmQxLGPw==')
+        self.assertEqual(reader.read(), b'foobar')
+        reader.seek(0)
+        self.assertEqual(reader.read(), b'foobar')
+        self.assertEqual(reader.hexdigest(), self.FOOBAR_MD5)
+
+    def test_add_hashing_body_sends_content_md5(self):
+        params = {}
+        body = add_hashing_body(params, six.BytesIO(b'foobar'), 6)
+        self.assertIs(params['body'], body)
+        self.assertEqual(params['content_md5'], 'OFj2IjCsPJFfMAxmQxLGPw==')
+
+    def test_add_hashing_body_streams_large_bodies(self):
+        params = {}
+        with mock.patch('awscli.customizations.s3.utils.'
+                        'MAX_IN_MEMORY_UPLOAD_SIZE', 3):
+            body = add_hashing_body(params, six.BytesIO(b'foobar'), 6)
+        self.assertNotIn('content_md5', params)
+        self.assertEqual(body.read(), b'foobar')
+
+    def test_check_md5_etag(self):
+        check_md5_etag(self.FOOBAR_MD5, self.FOOBAR_MD5)
+        # Multipart etags are not checked.
+        check_md5_etag('abcd-2', self.FOOBAR_MD5)
+        with self.assertRaises(MD5Error):
+            check_md5_etag('abcd', self.FOOBAR_MD5)
+
+
+class TestCheckError(unittest.TestCase):
+    def test_no_errors(self):
+        check_error({'ETag': '"foo"'})
+
+    def test_error_message_is_raised(self):
+        with self.assertRaisesRegexp(Exception, 'Access Denied'):
+            check_error({'Errors': [{'Code': 'AccessDenied',
+                                     'Message': 'Access Denied'}]})
+
+    def test_throttling_error(self):
+        with self.assertRaises(ThrottlingError):
+            check_error({'Errors': [{'Code': 'SlowDown',
+                                     'Message': 'Please reduce your '
+                                                'request rate.'}]})
+
+
+class TestStreamingBodyReader(unittest.TestCase):
+    def test_streams_through_hashing_reader(self):
+        body = StreamingBodyReader(six.BytesIO(b'foobar'))
+        reader = HashingReader(body, 6)
+        self.assertEqual(reader.read(3), b'foo')
+        self.assertEqual(reader.read(), b'bar')
+        self.assertEqual(reader.hexdigest(),
+                         hashlib.md5(b'foobar').hexdigest())
+        self.assertEqual(body.tell(), 6)
+
+    def test_can_rewind_before_reading(self):
+        body = StreamingBodyReader(six.BytesIO(b'foobar'))
+        body.seek(0)
+        self.assertEqual(body.read(), b'foobar')
+
+    def test_cannot_rewind_after_reading(self):
+        body = StreamingBodyReader(six.BytesIO(b'foobar'))
+        body.read(3)
+        with self.assertRaises(ValueError):
+            body.seek(0)
+
+    def test_sets_socket_timeout(self):
+        response_body = mock.Mock()
+        StreamingBodyReader(response_body)
+        response_body.set_socket_timeout.assert_called_with(
+            StreamingBodyReader.READ_TIMEOUT)
+
+
+class TestMultipartETag(unittest.TestCase):
+    def test_calculate_multipart_etag(self):
+        digests = [hashlib.md5(b'foo').digest(), hashlib.md5(b'bar').digest()]
+        expected = hashlib.md5(b''.join(digests)).hexdigest() + '-2'
+        self.assertEqual(calculate_multipart_etag(digests), expected)
+
+    def test_calculate_from_parts_list(self):
+        parts = [{'ETag': hashlib.md5(b'bar').hexdigest(), 'PartNumber': 2},
+                 {'ETag': hashlib.md5(b'foo').hexdigest(), 'PartNumber': 1}]
+        digests = [hashlib.md5(b'foo').digest(), hashlib.md5(b'bar').digest()]
+        self.assertEqual(calculate_multipart_etag_from_parts(parts),
+                         calculate_multipart_etag(digests))
+
+
+class TestInferPartSize(unittest.TestCase):
+    MB = 1024 ** 2
+
+    def test_not_multipart(self):
+        self.assertIsNone(infer_part_size(100 * self.MB, 'abcd'))
+        self.assertIsNone(infer_part_size(100 * self.MB, None))
+        self.assertIsNone(infer_part_size(100 * self.MB, 'abcd-1'))
+        self.assertIsNone(infer_part_size(100 * self.MB, 'abcd-foo'))
+
+    def test_preferred_part_size(self):
+        # 7MB parts and 8MB parts would both create 10 parts.
+        self.assertEqual(
+            infer_part_size(70 * self.MB, 'abcd-10', 7 * self.MB),
+            7 * self.MB)
+
+    def test_unique_mb_part_size(self):
+        # Only 8MB parts create 13 parts from a 100MB object.
+        self.assertEqual(
+            infer_part_size(100 * self.MB, 'abcd-13', 7 * self.MB),
+            8 * self.MB)
+
+    def test_ambiguous_part_size(self):
+        # Anything from 8MB to 16MB creates 2 parts.
+        self.assertIsNone(
+            infer_part_size(16 * self.MB, 'abcd-2', 7 * self.MB))
+
+    def test_impossible_part_count(self):
+        self.assertIsNone(infer_part_size(10 * self.MB, 'abcd-100'))
+
+
 class TestRelativePath(unittest.TestCase):
     def test_relpath_normal(self):
         self.assertEqual(relative_path('/tmp/foo/bar', '/tmp/foo'),
@@ -225,6 +456,44 @@ class TestStablePriorityQueue(unittest.TestCase):
         self.assertIs(q.get(), b)
         self.assertIs(q.get(), a)
 
+    def test_put_unbounded_ignores_maxsize(self):
+        q = StablePriorityQueue(maxsize=1, max_priority=20)
+        a = mock.Mock()
+        a.PRIORITY = 5
+        b = mock.Mock()
+        b.PRIORITY = 1
+        q.put(a)
+        q.put_unbounded(b)
+        self.assertEqual(q.qsize(), 2)
+        self.assertIs(q.get(), b)
+        self.assertIs(q.get(), a)
+
+
+class TestTaskDependency(unittest.TestCase):
+    def test_callbacks_called_when_done(self):
+        dependency = TaskDependency()
+        callback = mock.Mock()
+        dependency.add_done_callback(callback)
+        self.assertFalse(callback.called)
+        dependency.set_done()
+        self.assertTrue(dependency.is_done())
+        callback.assert_called_once_with()
+
+    def test_callbacks_only_called_once(self):
+        dependency = TaskDependency()
+        callback = mock.Mock()
+        dependency.add_done_callback(callback)
+        dependency.set_done()
+        dependency.set_done()
+        self.assertEqual(callback.call_count, 1)
+
+    def test_callback_called_right_away_if_done(self):
+        dependency = TaskDependency()
+        dependency.set_done()
+        callback = mock.Mock()
+        dependency.add_done_callback(callback)
+        callback.assert_called_once_with()
+
 
 class TestBucketList(unittest.TestCase):
     def setUp(self):
@@ -248,7 +517,7 @@ class TestBucketList(unittest.TestCase):
         self.responses = [
             (None, {'Contents': [
                 {'LastModified': '2014-02-27T04:20:38.000Z',
-                 'Key': 'a', 'Size': 1},
+                 'Key': 'a', 'Size': 1, 'ETag': '"etag"'},
                 {'LastModified': '2014-02-27T04:20:38.000Z',
                  'Key': 'b', 'Size': 2},]}),
             (None, {'Contents': [
@@ -258,8 +527,9 @@ class TestBucketList(unittest.TestCase):
         ]
         lister = BucketLister(self.operation, self.endpoint, self.date_parser)
         objects = list(lister.list_objects(bucket='foo'))
-        self.assertEqual(objects, [('foo/a', 1, now), ('foo/b', 2, now),
-                                   ('foo/c', 3, now)])
+        self.assertEqual(objects, [('foo/a', 1, now, 'etag'),
+                                   ('foo/b', 2, now, None),
+                                   ('foo/c', 3, now, None)])
 
     def test_urlencoded_keys(self):
         # In order to workaround control chars being in key names,
@@ -276,7 +546,7 @@ class TestBucketList(unittest.TestCase):
         lister = BucketLister(self.operation, self.endpoint, self.date_parser)
         objects = list(lister.list_objects(bucket='foo'))
         # And note how it's been converted to '\r'.
-        self.assertEqual(objects, [('foo/bar\r.txt', 1, now)])
+        self.assertEqual(objects, [('foo/bar\r.txt', 1, now, None)])
 
     def test_urlencoded_with_unicode_keys(self):
         now = mock.sentinel.now
@@ -289,7 +559,141 @@ class TestBucketList(unittest.TestCase):
         lister = BucketLister(self.operation, self.endpoint, self.date_parser)
         objects = list(lister.list_objects(bucket='foo'))
         # And note how it's been converted to '\r'.
-        self.assertEqual(objects, [(u'foo/\u2713', 1, now)])
+        self.assertEqual(objects, [(u'foo/\u2713', 1, now, None)])
+
+
+class TestParallelBucketLister(unittest.TestCase):
+    def setUp(self):
+        self.operation = mock.Mock()
+        self.emitter = HierarchicalEmitter()
+        self.operation.session.register = self.emitter.register
+        self.operation.session.unregister = self.emitter.unregister
+        self.operation.paginate = self.fake_paginate
+        self.endpoint = mock.sentinel.endpoint
+        self.date_parser = mock.Mock()
+        self.date_parser.return_value = mock.sentinel.now
+        self.requested_prefixes = []
+        self.lock = threading.Lock()
+        # Pages of the listing of each prefix.
+        self.listings = {}
+
+    def fake_paginate(self, endpoint, bucket, delimiter, encoding_type,
+                      prefix=''):
+        self.assertEqual(delimiter, '/')
+        with self.lock:
+            self.requested_prefixes.append(prefix)
+        pages = []
+        for page in self.listings[prefix]:
+            if isinstance(page, Exception):
+                raise page
+            response = {
+                'Contents': [{'Key': key, 'Size': 1,
+                              'LastModified': '2014-02-27T04:20:38.000Z'}
+                             for key in page if not key.endswith('/')],
+                'CommonPrefixes': [{'Prefix': key} for key in page
+                                   if key.endswith('/')]}
+            self.emitter.emit('after-call.s3.ListObjects', parsed=response)
+            pages.append((None, response))
+        return pages
+
+    def list_keys(self, prefix=None, max_concurrency=10):
+        lister = ParallelBucketLister(self.operation, self.endpoint,
+                                      self.date_parser,
+                                      max_concurrency=max_concurrency)
+        return [entry[0] for entry in lister.list_objects(bucket='foo',
+                                                          prefix=prefix)]
+
+    def test_partitions_are_merged_in_key_order(self):
+        self.listings = {
+            '': [['a/', 'a.txt'], ['b', 'c/']],
+            'a/': [['a/b.txt', 'a/b/', 'a/c']],
+            'a/b/': [['a/b/d']],
+            'c/': [['c/e']],
+        }
+        expected = ['foo/a.txt', 'foo/a/b.txt', 'foo/a/b/d', 'foo/a/c',
+                    'foo/b', 'foo/c/e']
+        self.assertEqual(self.list_keys(), expected)
+        self.assertEqual(sorted(expected), expected)
+        self.assertEqual(sorted(self.requested_prefixes),
+                         ['', 'a/', 'a/b/', 'c/'])
+
+    def test_listing_with_limited_concurrency(self):
+        self.listings = {'': [['%s/' % i for i in range(10)]]}
+        for i in range(10):
+            self.listings['%s/' % i] = [['%s/key' % i]]
+        self.assertEqual(self.list_keys(max_concurrency=1),
+                         ['foo/%s/key' % i for i in range(10)])
+
+    def test_listing_under_prefix(self):
+        self.listings = {'dir/': [['dir/a', 'dir/sub/']],
+                         'dir/sub/': [['dir/sub/b']]}
+        self.assertEqual(self.list_keys(prefix='dir/'),
+                         ['foo/dir/a', 'foo/dir/sub/b'])
+
+    def test_common_prefixes_are_urldecoded(self):
+        self.listings = {'': [['%E2%9C%93/']],
+                         u'\u2713/': [[u'%E2%9C%93/bar%0D.txt']]}
+        self.assertEqual(self.list_keys(), [u'foo/\u2713/bar\r.txt'])
+
+    def test_partition_errors_are_raised(self):
+        self.listings = {'': [['a/']], 'a/': [Exception('Access Denied')]}
+        with self.assertRaises(Exception):
+            self.list_keys()
+
+    def test_excluded_prefixes_are_not_listed(self):
+        self.listings = {'': [['a/', 'b/', 'c']],
+                         'a/': [['a/d']], 'b/': [['b/e']]}
+        lister = ParallelBucketLister(
+            self.operation, self.endpoint, self.date_parser,
+            excludes_prefix=lambda prefix: prefix == 'a/')
+        keys = [entry[0] for entry in lister.list_objects(bucket='foo')]
+        self.assertEqual(keys, ['foo/b/e', 'foo/c'])
+        self.assertNotIn('a/', self.requested_prefixes)
+
+
+class FakeComponent(object):
+    def __init__(self, items, error=None):
+        self.items = items
+        self.error = error
+        self.thread = None
+
+    def call(self, prefix):
+        self.thread = threading.current_thread()
+        for item in self.items:
+            yield prefix + item
+        if self.error is not None:
+            raise self.error
+
+
+class TestBackgroundGenerator(unittest.TestCase):
+    def test_items_are_yielded_in_order(self):
+        component = FakeComponent([str(i) for i in range(50)])
+        generator = BackgroundGenerator(component, max_size=3)
+        self.assertEqual(list(generator.call('item')),
+                         ['item%s' % i for i in range(50)])
+        self.assertIsNot(component.thread, threading.current_thread())
+
+    def test_errors_are_raised_by_the_reader(self):
+        component = FakeComponent(['a'], error=ValueError('listing failed'))
+        items = BackgroundGenerator(component).call('')
+        self.assertEqual(next(items), 'a')
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_closing_the_reader_stops_the_thread(self):
+        threads = []
+
+        class EndlessComponent(object):
+            def call(self):
+                threads.append(threading.current_thread())
+                while True:
+                    yield 'item'
+
+        items = BackgroundGenerator(EndlessComponent(), max_size=1).call()
+        next(items)
+        items.close()
+        threads[0].join(5)
+        self.assertFalse(threads[0].is_alive())
 
 
 class TestScopedEventHandler(unittest.TestCase):
@@ -335,3 +739,46 @@ class TestGetFileStat(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestReadStreamChunk(unittest.TestCase):
+    def test_reads_until_size(self):
+        stream = mock.Mock()
+        stream.read.side_effect = [b'ab', b'c', b'd']
+        self.assertEqual(read_stream_chunk(stream, 4), b'abcd')
+
+    def test_stops_at_end_of_stream(self):
+        stream = six.BytesIO(b'abc')
+        self.assertEqual(read_stream_chunk(stream, 5), b'abc')
+        self.assertEqual(read_stream_chunk(stream, 5), b'')
+
+
+class TestOrderedStreamWriter(unittest.TestCase):
+    def setUp(self):
+        self.stream = six.BytesIO()
+        self.writer = OrderedStreamWriter(self.stream, window=2)
+
+    def test_parts_are_written_in_order(self):
+        self.writer.write(1, b'bb')
+        self.assertEqual(self.stream.getvalue(), b'')
+        self.writer.write(0, b'aa')
+        self.writer.write(2, b'cc')
+        self.writer.close()
+        self.assertEqual(self.stream.getvalue(), b'aabbcc')
+
+    def test_parts_wait_for_a_slot_in_the_window(self):
+        started = []
+        thread = threading.Thread(
+            target=lambda: started.append(self.writer.wait_for_slot(2)))
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual(started, [])
+        self.writer.write(0, b'aa')
+        thread.join(5)
+        self.assertEqual(started, [True])
+
+    def test_cancel_releases_waiting_parts(self):
+        self.writer.cancel()
+        self.assertFalse(self.writer.wait_for_slot(5))
+        self.writer.write(0, b'aa')
+        self.assertEqual(self.stream.getvalue(), b'')